@@ -0,0 +1,203 @@
+"""
+Buffered writer for BotDownloadActivationLog.
+
+Bot restart storms produce a burst of download and activation events. Rather
+than an INSERT per event on the request path, each worker collects events in
+memory and writes them with one bulk_create once ACTIVATION_LOG_BATCH_SIZE
+events are waiting or the oldest has waited ACTIVATION_LOG_FLUSH_INTERVAL
+seconds. Flushes run on a background thread, so a request's transaction never
+carries other requests' events.
+
+With ACTIVATION_LOG_SPILL_DIR set, every event is also appended to a segment
+file in that directory before it is buffered, and a segment is removed only
+once its events are in the database. Segments left behind by a crashed worker
+are replayed by the next writer to start, or by `manage.py compact_activation_logs`.
+Replay is at-least-once: a crash between the insert and the unlink writes a
+segment's events twice.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.db import IntegrityError, connection
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from api.models import BotDownloadActivationLog, BotLicense
+
+logger = logging.getLogger(__name__)
+
+def spill_dir():
+    path = getattr(settings, 'ACTIVATION_LOG_SPILL_DIR', None)
+    return Path(path) if path else None
+
+
+def write_events(events):
+    """Insert event dicts; events whose license has been deleted since are dropped."""
+    rows = [BotDownloadActivationLog(**event) for event in events]
+    try:
+        BotDownloadActivationLog.objects.bulk_create(rows)
+    except IntegrityError:
+        existing = set(BotLicense.objects.filter(
+            id__in={row.bot_license_id for row in rows}
+        ).values_list('id', flat=True))
+        rows = BotDownloadActivationLog.objects.bulk_create([row for row in rows if row.bot_license_id in existing])
+    return len(rows)
+
+
+def read_segment(path):
+    events = []
+    with open(path) as segment:
+        for line in segment:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                # A torn last line from a crash mid-write
+                continue
+            event['log_timestamp'] = parse_datetime(event['log_timestamp'])
+            events.append(event)
+    return events
+
+
+def replay_segments(directory=None, older_than=None):
+    """
+    Write the events of segments no live writer owns and remove them. A segment
+    counts as abandoned once it has not been touched for `older_than` seconds,
+    by default a few flush intervals.
+    """
+    directory = directory or spill_dir()
+    if directory is None or not directory.exists():
+        return 0
+    if older_than is None:
+        older_than = 5 * getattr(settings, 'ACTIVATION_LOG_FLUSH_INTERVAL', 2.0)
+    replayed = 0
+    for path in sorted(directory.glob('activation-log-*.jsonl')):
+        try:
+            if time.time() - path.stat().st_mtime < older_than:
+                continue
+            replayed += write_events(read_segment(path))
+            path.unlink()
+        except FileNotFoundError:
+            # Another process replayed it first
+            continue
+    return replayed
+
+
+class ActivationLogWriter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._reset()
+        atexit.register(self.flush)
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._events = []
+        self._oldest = None
+        self._segment = None
+        self._thread = None
+
+    def record(self, bot_license_id, user_id, action_type, ip_address='', device_info=None, bot_file_id=None):
+        event = {
+            'bot_license_id': bot_license_id, 'user_id': user_id, 'bot_file_id': bot_file_id,
+            'action_type': action_type, 'ip_address': ip_address or '', 'device_info': device_info,
+            'log_timestamp': timezone.now(),
+        }
+        background = getattr(settings, 'ACTIVATION_LOG_BACKGROUND_FLUSH', True)
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked after events were buffered: those belong to the parent
+                self._reset()
+            if self._segment is None and spill_dir() is not None:
+                self._open_segment()
+            if self._segment is not None:
+                self._segment.write(json.dumps({**event, 'log_timestamp': event['log_timestamp'].isoformat()}) + '\n')
+                self._segment.flush()
+            self._events.append(event)
+            self._oldest = self._oldest or time.monotonic()
+            due = self._due()
+            if background and self._thread is None:
+                self._start_thread()
+        if due:
+            if background:
+                self._wakeup.set()
+            else:
+                self.flush()
+
+    def flush(self):
+        """Write everything buffered so far; returns the number of events written."""
+        with self._lock:
+            if self._pid != os.getpid() or not self._events:
+                return 0
+            events, segment = self._events, self._segment
+            self._events, self._oldest, self._segment = [], None, None
+        if segment is not None:
+            segment.close()
+        try:
+            written = write_events(events)
+        except Exception:
+            if segment is None:
+                logger.exception('Dropped %s activation log events', len(events))
+            else:
+                logger.exception('Activation log flush failed; %s events kept in %s', len(events), segment.name)
+            return 0
+        if segment is not None:
+            os.unlink(segment.name)
+        return written
+
+    def discard(self):
+        """Forget buffered events without writing them; a spill segment is left for replay."""
+        with self._lock:
+            if self._segment is not None:
+                self._segment.close()
+            self._events, self._oldest, self._segment = [], None, None
+
+    def pending(self):
+        return len(self._events)
+
+    def _due(self):
+        interval = getattr(settings, 'ACTIVATION_LOG_FLUSH_INTERVAL', 2.0)
+        return (
+            len(self._events) >= getattr(settings, 'ACTIVATION_LOG_BATCH_SIZE', 500)
+            or time.monotonic() - self._oldest >= interval
+        )
+
+    def _open_segment(self):
+        directory = spill_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        name = f'activation-log-{os.getpid()}-{uuid.uuid4().hex[:12]}.jsonl'
+        self._segment = open(directory / name, 'a')
+
+    def _start_thread(self):
+        self._thread = threading.Thread(target=self._run, name='activation-log', daemon=True)
+        self._thread.start()
+        if spill_dir() is not None:
+            threading.Thread(target=self._replay, name='activation-log-replay', daemon=True).start()
+
+    def _run(self):
+        interval = getattr(settings, 'ACTIVATION_LOG_FLUSH_INTERVAL', 2.0)
+        while True:
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+            with self._lock:
+                due = bool(self._events) and self._due()
+            if due:
+                self.flush()
+                connection.close()
+
+    def _replay(self):
+        try:
+            replay_segments()
+        except Exception:
+            logger.exception('Replaying spilled activation log segments failed')
+        finally:
+            connection.close()
+
+
+activation_log = ActivationLogWriter()
@@ -0,0 +1,248 @@
+"""
+Async counterparts of the read-heavy API views, used when the project is served
+by uvicorn workers through core.asgi (see core.urls_async).
+
+DRF 3.14 views are synchronous, so these are plain Django async views that reuse
+the DRF views' querysets, paginators and serializers. Every database read goes
+through the async ORM and is finished before serialization starts; serializers
+only ever see prefetched data.
+"""
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import parse_etags
+from django.views import View
+from rest_framework import exceptions, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from api.cache import catalog_response_digest
+from api.models import Product
+from api.pagination import KeysetPagination
+from api.signal_stream import SlowConsumer, resolve_stream, signal_frames
+from api.snapshot import catalog_snapshot
+from api.views import (
+    CategoryListView, CategoryDetailView, ProductListView, ProductDetailView, OrderListView, OrderDetailView
+)
+
+
+class AsyncJWTAuthentication(JWTAuthentication):
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        raw_token = self.get_raw_token(header) if header is not None else None
+        if raw_token is None:
+            raise exceptions.NotAuthenticated()
+        return await self.aauthenticate_token(raw_token)
+
+    async def aauthenticate_token(self, raw_token):
+        if not raw_token:
+            raise exceptions.NotAuthenticated()
+        validated_token = self.get_validated_token(raw_token)
+        try:
+            user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise exceptions.AuthenticationFailed('Token contained no recognizable user identification')
+        user = await self.user_model.objects.filter(**{jwt_settings.USER_ID_FIELD: user_id}).afirst()
+        if user is None:
+            raise exceptions.AuthenticationFailed('User not found', code='user_not_found')
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed('User is inactive', code='user_inactive')
+        return user
+
+
+class AsyncAPIView(View):
+    """
+    Read-only async JSON view. `sync_view` is the DRF view this one stands in for:
+    its get_queryset() and serializer are reused, and methods other than GET are
+    handed to it unchanged. Authenticated views accept JWT bearer tokens only.
+    """
+    sync_view = None
+    authenticated = False
+    catalog_cache = False
+    renderer = JSONRenderer()
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            handler = self.sync_view.as_view()
+            return await sync_to_async(handler)(request, *args, **kwargs)
+
+        drf_request = Request(request, authenticators=[])
+        try:
+            if self.authenticated:
+                drf_request.user = await AsyncJWTAuthentication().aauthenticate(drf_request)
+            if self.catalog_cache:
+                return await self.cached_get(drf_request, *args, **kwargs)
+            return self.render(await self.get(drf_request, *args, **kwargs))
+        except Http404:
+            return self.render_error(exceptions.NotFound())
+        except exceptions.APIException as exc:
+            return self.render_error(exc)
+
+    async def get(self, request, *args, **kwargs):
+        raise NotImplementedError
+
+    async def cached_get(self, request, *args, **kwargs):
+        # Same keys and ETags as CatalogCacheMixin, so both stacks share entries
+        snapshot = await catalog_snapshot.aget()
+        digest = catalog_response_digest(snapshot.version, request)
+        etag = f'"{digest}"'
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+
+        cache_key = f'catalog:response:{digest}'
+        cache_response = getattr(self.sync_view, 'cache_response', True)
+        data = await cache.aget(cache_key) if cache_response else None
+        if data is None:
+            data = await self.get(request, *args, **kwargs)
+            if cache_response:
+                await cache.aset(cache_key, data, self.sync_view.cache_timeout)
+        response = self.render(data)
+        response['ETag'] = etag
+        return response
+
+    def sync_view_for(self, request, **kwargs):
+        return self.sync_view(request=request, args=(), kwargs=kwargs, format_kwarg=None)
+
+    def render(self, data, status_code=status.HTTP_200_OK):
+        return HttpResponse(
+            self.renderer.render(data), status=status_code, content_type=self.renderer.media_type
+        )
+
+    def render_error(self, exc):
+        detail = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+        response = self.render(detail, exc.status_code)
+        if exc.status_code == status.HTTP_401_UNAUTHORIZED:
+            response['WWW-Authenticate'] = AsyncJWTAuthentication().authenticate_header(None)
+        return response
+
+
+class AsyncCategoryListView(AsyncAPIView):
+    sync_view = CategoryListView
+    catalog_cache = True
+
+    async def get(self, request, *args, **kwargs):
+        return (await catalog_snapshot.aget()).category_tree
+
+
+class AsyncCategoryDetailView(AsyncAPIView):
+    sync_view = CategoryDetailView
+    catalog_cache = True
+
+    async def get(self, request, slug):
+        category = (await catalog_snapshot.aget()).categories.get(slug)
+        if category is None:
+            raise Http404
+        return category
+
+
+class AsyncProductListView(AsyncAPIView):
+    sync_view = ProductListView
+    catalog_cache = True
+
+    async def get(self, request, *args, **kwargs):
+        view = self.sync_view_for(request)
+        page = view.snapshot_page(await catalog_snapshot.aget())
+        if page is not None:
+            return page
+
+        queryset = view.get_queryset()
+        paginator = view.paginator
+        if isinstance(paginator, KeysetPagination):
+            products = await paginator.apaginate_queryset(queryset, request, view=view)
+        else:
+            # Search and rating pages count their results, which has no async path
+            products = await sync_to_async(paginator.paginate_queryset)(queryset, request, view=view)
+        data = view.get_serializer(products, many=True).data
+        return paginator.get_paginated_response(data).data
+
+
+class AsyncProductDetailView(AsyncAPIView):
+    sync_view = ProductDetailView
+    catalog_cache = True
+
+    async def get(self, request, slug):
+        view = self.sync_view_for(request, slug=slug)
+        try:
+            product = await view.get_queryset().aget(slug=slug)
+        except Product.DoesNotExist:
+            raise Http404
+        context = {'request': request, 'view': view, 'subscription_plans': (await catalog_snapshot.aget()).plans}
+        return view.get_serializer_class()(product, context=context).data
+
+
+class AsyncOrderListView(AsyncAPIView):
+    sync_view = OrderListView
+    authenticated = True
+
+    async def get(self, request, *args, **kwargs):
+        view = self.sync_view_for(request)
+        paginator = view.paginator
+        orders = await paginator.apaginate_queryset(view.get_queryset(), request, view=view)
+        data = view.get_serializer(orders, many=True).data
+        return paginator.get_paginated_response(data).data
+
+
+class AsyncOrderDetailView(AsyncAPIView):
+    sync_view = OrderDetailView
+    authenticated = True
+
+    async def get(self, request, order_number):
+        view = self.sync_view_for(request, order_number=order_number)
+        order = await view.get_queryset().filter(order_number=order_number).afirst()
+        if order is None:
+            raise Http404
+        return view.get_serializer(order).data
+
+
+class SignalStreamView(AsyncAPIView):
+    """
+    Live signals of a product as Server-Sent Events. EventSource cannot set
+    headers, so the access token may also be passed as `?token=`. Clients
+    resume with Last-Event-ID (or `?last_id=`); the stream ends when the
+    connection falls behind, access runs out or SIGNAL_STREAM_MAX_AGE passes,
+    and EventSource reconnects.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method != 'GET':
+            return self.render_error(exceptions.MethodNotAllowed(request.method))
+        drf_request = Request(request, authenticators=[])
+        authentication = AsyncJWTAuthentication()
+        try:
+            if 'token' in request.GET:
+                user = await authentication.aauthenticate_token(request.GET['token'].encode())
+            else:
+                user = await authentication.aauthenticate(drf_request)
+            product = await resolve_stream(user, kwargs['slug'])
+            last_id = request.headers.get('Last-Event-ID') or request.GET.get('last_id')
+            try:
+                last_id = int(last_id) if last_id else None
+            except ValueError:
+                raise exceptions.ValidationError({'last_id': 'Must be a signal id.'})
+        except exceptions.APIException as exc:
+            return self.render_error(exc)
+
+        response = StreamingHttpResponse(self.events(user, product, last_id), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Keep nginx from buffering the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def events(self, user, product, last_id):
+        # Tells EventSource how long to wait before reconnecting
+        yield b'retry: 2000\n\n'
+        # Django 4.2 does not tell a streaming response its client has gone; the
+        # stream still ends after SIGNAL_STREAM_MAX_AGE and EventSource reconnects
+        frames = signal_frames(user.pk, product.pk, last_id)
+        try:
+            async for frame in frames:
+                # Comments keep proxies from closing an idle connection
+                yield b': ping\n\n' if frame is None else frame.event
+        except (SlowConsumer, exceptions.PermissionDenied):
+            pass
+        finally:
+            await frames.aclose()
@@ -0,0 +1,180 @@
+"""
+Content-addressed blob store for uploaded files.
+
+A blob lives at BLOB_STORE_ROOT/ab/cd/abcd... under the SHA-256 of its content,
+so identical uploads share one file. Uploads are streamed to a temporary file in
+the store while they are hashed (BlobUploadHandler plugs this into Django's
+multipart parsing), then renamed into place, or dropped when the blob already
+exists. Rows referencing a blob keep Blob.refcount up to date through signals;
+`manage.py gc_blobs` removes what nobody references.
+"""
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.http.multipartparser import MultiPartParser as DjangoMultiPartParser, MultiPartParserError
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import DataAndFiles, MultiPartParser
+
+from api.models import Blob
+
+CHUNK_SIZE = 64 * 1024
+
+
+def store_root():
+    return Path(settings.BLOB_STORE_ROOT)
+
+
+def blob_name(sha256):
+    return f'{sha256[:2]}/{sha256[2:4]}/{sha256}'
+
+
+def blob_path(sha256):
+    return store_root() / blob_name(sha256)
+
+
+class BlobWriter:
+    """Writes a stream to a temporary file inside the store, hashing it on the way."""
+
+    def __init__(self):
+        directory = store_root() / 'tmp'
+        directory.mkdir(parents=True, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(dir=directory, suffix='.part')
+        self.file = os.fdopen(fd, 'wb')
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.file.write(data)
+        self.digest.update(data)
+        self.size += len(data)
+
+    def close(self):
+        self.file.close()
+        return self.digest.hexdigest()
+
+    def abort(self):
+        self.file.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def commit(writer):
+    """
+    Move a finished BlobWriter's file into the store and return its Blob row.
+    When the content is already stored, the temporary file is discarded.
+
+    The row stays locked until the caller's transaction ends, so call this in the
+    transaction that saves the row referencing the blob: `gc_blobs` cannot remove
+    a reused, unreferenced blob before that reference is counted.
+    """
+    sha256 = writer.close()
+    path = blob_path(sha256)
+    with transaction.atomic():
+        blob = Blob.objects.select_for_update().filter(pk=sha256).first()
+        if blob is not None and path.exists():
+            writer.abort()
+            return blob
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(writer.path, path)
+        if blob is None:
+            try:
+                with transaction.atomic():
+                    blob = Blob.objects.create(sha256=sha256, size=writer.size)
+            except IntegrityError:
+                # Stored concurrently by another upload of the same content
+                blob = Blob.objects.select_for_update().get(pk=sha256)
+    return blob
+
+
+def store_file(fileobj):
+    """Stream any readable file object into the store."""
+    writer = BlobWriter()
+    try:
+        for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b''):
+            writer.write(chunk)
+    except BaseException:
+        writer.abort()
+        raise
+    return commit(writer)
+
+
+def store_upload(upload):
+    """The Blob for an uploaded file, without copying it again when BlobUploadHandler staged it."""
+    if isinstance(upload, StagedBlobUpload):
+        return commit(upload.writer)
+    return store_file(upload)
+
+
+def retain(sha256):
+    Blob.objects.filter(pk=sha256).update(refcount=F('refcount') + 1)
+
+
+def release(sha256):
+    Blob.objects.filter(pk=sha256, refcount__gt=0).update(refcount=F('refcount') - 1)
+
+
+class StagedBlobUpload(UploadedFile):
+    """An uploaded file already written and hashed into the store's temporary area."""
+
+    def __init__(self, writer, name, content_type, charset, content_type_extra):
+        self.writer = writer
+        writer.close()
+        super().__init__(open(writer.path, 'rb'), name, content_type, writer.size, charset, content_type_extra)
+
+    def close(self):
+        # Django closes uploads when the request is done: whatever commit() did not
+        # move into the store by then is dropped
+        self.file.close()
+        self.writer.abort()
+
+    @property
+    def sha256(self):
+        return self.writer.digest.hexdigest()
+
+
+class BlobUploadHandler(FileUploadHandler):
+    """
+    Upload handler streaming each file straight into the blob store's temporary
+    area, so uploads are never held in memory and are hashed in the same pass.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.writer = BlobWriter()
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.writer.size + len(raw_data) > getattr(settings, 'BLOB_MAX_UPLOAD_SIZE', 2 ** 30):
+            self.writer.abort()
+            raise SkipFile
+        self.writer.write(raw_data)
+
+    def file_complete(self, file_size):
+        return StagedBlobUpload(
+            self.writer, self.file_name, self.content_type, self.charset, self.content_type_extra
+        )
+
+    def upload_interrupted(self):
+        self.writer.abort()
+
+
+class BlobMultiPartParser(MultiPartParser):
+    """DRF multipart parser that stages uploaded files in the blob store."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        meta = parser_context['request'].META.copy()
+        meta['CONTENT_TYPE'] = media_type
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            data, files = DjangoMultiPartParser(meta, stream, [BlobUploadHandler()], encoding).parse()
+            return DataAndFiles(data, files)
+        except MultiPartParserError as exc:
+            raise ParseError('Multipart form parse error - %s' % str(exc))
@@ -0,0 +1,133 @@
+import fcntl
+import hashlib
+import logging
+import time
+from pathlib import Path
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+logger = logging.getLogger(__name__)
+
+
+def get_catalog_version():
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # Seeded from the clock for the same reason as in bump_catalog_version()
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def read_version_file(setting):
+    """The counter in the file named by `setting`, or None when there is none to read."""
+    path = getattr(settings, setting, None)
+    if not path:
+        return None
+    try:
+        return int(Path(path).read_text() or 0)
+    except (OSError, ValueError):
+        return None
+
+
+def bump_version_file(setting):
+    """
+    Increment the counter in the file named by `setting`, which lets workers on
+    one host see each other's invalidations with a per-process cache. A counter
+    rather than the mtime, so two bumps within one timestamp tick still read as
+    two; workers bumping at once take turns under an exclusive lock.
+    """
+    path = getattr(settings, setting, None)
+    if not path:
+        return
+    try:
+        with open(path, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            try:
+                counter = int(f.read() or 0)
+            except ValueError:
+                counter = 0
+            f.seek(0)
+            f.truncate()
+            f.write(str(counter + 1))
+    except OSError:
+        # Runs after the write committed; failing here would turn a saved change into a 500
+        logger.warning('Could not update %s %s', setting, path, exc_info=True)
+
+
+def read_catalog_version_file():
+    return read_version_file('CATALOG_VERSION_FILE')
+
+
+def bump_catalog_version_file():
+    bump_version_file('CATALOG_VERSION_FILE')
+
+
+def current_version():
+    """The shared catalog version as this worker sees it, plus the version file's counter."""
+    return get_catalog_version(), read_catalog_version_file()
+
+
+def bump_catalog_version():
+    bump_catalog_version_file()
+    try:
+        return cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        # Key was evicted. Restarting from 1 could land on a version readers still have
+        # responses and snapshots cached under, so restart from the clock, which is past
+        # any count reached since
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+        return cache.incr(CATALOG_VERSION_KEY)
+
+
+def normalize_request(request):
+    params = sorted(
+        (key, sorted(value for value in values if value))
+        for key, values in request.query_params.lists()
+    )
+    return f'{request.path}?{urlencode([p for p in params if p[1]], doseq=True)}'
+
+
+def catalog_response_digest(version, request):
+    return hashlib.md5(f'{version}:{normalize_request(request)}'.encode()).hexdigest()
+
+
+class CatalogCacheMixin:
+    """
+    Caches serialized GET responses of public catalog views under the current
+    catalog version, so any catalog write invalidates every entry at once.
+    Views answering from the in-memory snapshot set `cache_response = False`
+    and only get the ETag handling.
+    """
+    cache_timeout = getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300)
+    cache_response = True
+
+    def get(self, request, *args, **kwargs):
+        # Keyed by the worker's snapshot version rather than the live counter, so data
+        # read from a stale snapshot is never stored under a newer version
+        from api.snapshot import catalog_snapshot
+        version = catalog_snapshot.get().version
+        digest = catalog_response_digest(version, request)
+        etag = f'"{digest}"'
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        cache_key = f'catalog:response:{digest}'
+        data = cache.get(cache_key) if self.cache_response else None
+        if data is not None:
+            response = Response(data)
+        else:
+            response = super().get(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            if self.cache_response:
+                cache.set(cache_key, response.data, self.cache_timeout)
+        response['ETag'] = etag
+        return response
@@ -0,0 +1,16 @@
+"""Calendar arithmetic shared by billing, fulfilment and the monthly rollups."""
+import calendar
+
+from django.utils import timezone
+
+
+def add_months(value, months):
+    """`value` moved by whole months, the day clamped to the target month's last day."""
+    month = value.month - 1 + months
+    year, month = value.year + month // 12, month % 12 + 1
+    return value.replace(year=year, month=month, day=min(value.day, calendar.monthrange(year, month)[1]))
+
+
+def month_start(value):
+    """Midnight on the first of `value`'s month, in the current time zone."""
+    return timezone.localtime(value).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
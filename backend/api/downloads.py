@@ -0,0 +1,190 @@
+"""
+Bot file downloads.
+
+BotFile.file_path is relative to BOT_FILES_ROOT. Responses carry a strong ETag
+made from the precomputed SHA-256 of the content and honour single byte
+ranges, so interrupted downloads resume where they stopped. With
+BOT_FILES_ACCEL_REDIRECT set, the transfer is handed to nginx through
+X-Accel-Redirect and no worker holds the file open. Files uploaded into the
+blob store (api.blobs) are read from there instead, and handed to nginx
+through BLOB_STORE_ACCEL_REDIRECT.
+"""
+import hashlib
+import mimetypes
+import re
+from pathlib import Path
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db.models import Q
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import content_disposition_header, parse_etags
+
+from api.blobs import blob_name, blob_path
+from api.models import BotLicense
+
+CHUNK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def resolve_path(file_path):
+    root = Path(settings.BOT_FILES_ROOT).resolve()
+    path = (root / file_path).resolve()
+    if root not in path.parents:
+        raise SuspiciousFileOperation(f'{file_path} is outside BOT_FILES_ROOT')
+    return path
+
+
+def bot_file_path(bot_file):
+    if getattr(bot_file, 'blob_id', None):
+        return blob_path(bot_file.blob_id)
+    return resolve_path(bot_file.file_path)
+
+
+def accel_redirect_path(bot_file):
+    """Internal nginx location serving the file, or None when Django has to send it."""
+    if getattr(bot_file, 'blob_id', None):
+        prefix, name = getattr(settings, 'BLOB_STORE_ACCEL_REDIRECT', None), blob_name(bot_file.blob_id)
+    else:
+        prefix, name = getattr(settings, 'BOT_FILES_ACCEL_REDIRECT', None), None
+    if not prefix:
+        return None
+    if name is None:
+        # Held to BOT_FILES_ROOT like the files Django sends
+        root = Path(settings.BOT_FILES_ROOT).resolve()
+        name = resolve_path(bot_file.file_path).relative_to(root).as_posix()
+    return f"{prefix.rstrip('/')}/{quote(name)}"
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def update_file_metadata(bot_file):
+    """Fill in sha256 and file_size from the file on disk; returns False when it is missing."""
+    if bot_file.blob_id:
+        bot_file.sha256, bot_file.file_size = bot_file.blob_id, bot_file.blob.size
+        return True
+    path = bot_file_path(bot_file)
+    if not path.is_file():
+        return False
+    bot_file.sha256 = file_sha256(path)
+    bot_file.file_size = path.stat().st_size
+    return True
+
+
+def download_license(user, bot_file):
+    """The user's usable license for the bot a file belongs to, or None."""
+    now = timezone.now()
+    return (
+        BotLicense.objects.filter(user=user, product__bot_detail__files=bot_file, status='active')
+        .filter(Q(expiry_date__isnull=True) | Q(expiry_date__gt=now))
+        .order_by('id').first()
+    )
+
+
+def parse_range(header, size):
+    """
+    (start, end) of a single `bytes=` range, end inclusive, or None when the
+    whole file should be sent. Multiple ranges are answered with the whole file,
+    which RFC 9110 allows.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise RangeNotSatisfiable
+    return start, end
+
+
+class FileRange:
+    """`length` bytes of an open file from `start`; the response closes the file when it is done."""
+
+    def __init__(self, file, start, length):
+        self.file, self.start, self.length = file, start, length
+
+    def __iter__(self):
+        self.file.seek(self.start)
+        remaining = self.length
+        while remaining > 0:
+            chunk = self.file.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+    def close(self):
+        self.file.close()
+
+
+def file_response(request, bot_file):
+    """
+    Serve a bot file, or anything with the same file fields such as a BotFilePatch,
+    honouring If-None-Match, If-Range and Range. Returns (response, first byte sent).
+    Raises FileNotFoundError before building a response Django would have to send
+    from a file that is not on disk.
+    """
+    path = bot_file_path(bot_file)
+    size = bot_file.file_size
+    etag = f'"{bot_file.sha256}"'
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response, None
+
+    byte_range = None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range is None or if_range == etag:
+        try:
+            byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response, None
+
+    content_type = bot_file.file_type if '/' in bot_file.file_type else (
+        mimetypes.guess_type(bot_file.file_name)[0] or 'application/octet-stream'
+    )
+    accel_path = accel_redirect_path(bot_file)
+    if accel_path:
+        # nginx serves the bytes, ranges included, from an internal location
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = accel_path
+        start = byte_range[0] if byte_range else 0
+    else:
+        # Opened up front: once the headers are out, a missing file can only break the body
+        file = open(path, 'rb')
+        if byte_range is None:
+            response = FileResponse(file, content_type=content_type)
+            response['Content-Length'] = size
+            start = 0
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                FileRange(file, start, end - start + 1), status=206, content_type=content_type
+            )
+            response['Content-Length'] = end - start + 1
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['ETag'] = etag
+    response['Accept-Ranges'] = 'bytes'
+    response['Content-Disposition'] = content_disposition_header(True, bot_file.file_name)
+    return response, start
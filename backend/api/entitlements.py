@@ -0,0 +1,125 @@
+"""
+What a user currently has access to.
+
+Bots are reached through active, unexpired licenses; signal and subscription
+products through active subscriptions until their end date; courses and other
+one-off products through completed orders, bought alone or in a bundle. A
+user's entitlements are resolved in three queries, one per source, with bundles
+expanded by a join, and cached per user. Signals on the source models drop a
+user's entry when their rows change, and changes to bundle contents move every
+user to a new cache version. An entry never outlives the earliest expiry in it.
+
+With a per-process cache, dropping an entry only reaches the worker that made
+the change, so invalidations also bump the counter in ENTITLEMENT_VERSION_FILE,
+which is part of every key: other workers on the host then recompute all their
+entries. With Redis the entry is deleted for everyone and the file can be unset.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from api.cache import bump_version_file, read_version_file
+from api.models import BotLicense, OrderItem, UserSubscription
+
+ENTITLEMENT_VERSION_KEY = 'entitlements:version'
+# Product types granted for good by a completed order; the rest come from licenses and subscriptions
+ORDER_PRODUCT_TYPES = {'course', 'other'}
+PRODUCT_FIELDS = ('id', 'slug', 'name', 'product_type')
+
+
+def get_entitlement_version():
+    version = cache.get(ENTITLEMENT_VERSION_KEY)
+    if version is None:
+        cache.add(ENTITLEMENT_VERSION_KEY, 1, timeout=None)
+        version = cache.get(ENTITLEMENT_VERSION_KEY, 1)
+    return version
+
+
+def bump_entitlement_version():
+    bump_version_file('ENTITLEMENT_VERSION_FILE')
+    try:
+        return cache.incr(ENTITLEMENT_VERSION_KEY)
+    except ValueError:
+        cache.add(ENTITLEMENT_VERSION_KEY, 1, timeout=None)
+        return cache.incr(ENTITLEMENT_VERSION_KEY)
+
+
+def entitlement_cache_key(user_id, version=None):
+    file_version = read_version_file('ENTITLEMENT_VERSION_FILE')
+    return f'entitlements:{version or get_entitlement_version()}:{file_version}:{user_id}'
+
+
+def invalidate_entitlements(*user_ids):
+    version = get_entitlement_version()
+    cache.delete_many([entitlement_cache_key(user_id, version) for user_id in user_ids])
+    bump_version_file('ENTITLEMENT_VERSION_FILE')
+
+
+def grant(entitlements, product, source, expires_at=None):
+    product_id, slug, name, product_type = product
+    entry = entitlements.setdefault(product_id, {
+        'product_id': product_id, 'slug': slug, 'name': name, 'product_type': product_type,
+        'sources': [], 'expires_at': expires_at,
+    })
+    if source not in entry['sources']:
+        entry['sources'].append(source)
+    # Unlimited (None) beats any date, a later date beats an earlier one
+    if entry['expires_at'] is not None and (expires_at is None or expires_at > entry['expires_at']):
+        entry['expires_at'] = expires_at
+
+
+def resolve_entitlements(user_id, now=None):
+    """The user's entitlements keyed by product id, computed from the database in three queries."""
+    now = now or timezone.now()
+    entitlements = {}
+
+    licenses = BotLicense.objects.filter(user_id=user_id, status='active').filter(
+        Q(expiry_date__isnull=True) | Q(expiry_date__gt=now)
+    ).values_list(*(f'product__{field}' for field in PRODUCT_FIELDS), 'expiry_date')
+    for *product, expiry_date in licenses:
+        grant(entitlements, product, 'license', expiry_date)
+
+    subscriptions = UserSubscription.objects.filter(user_id=user_id, status='active', end_date__gt=now).values_list(
+        *(f'subscription_plan__product__{field}' for field in PRODUCT_FIELDS), 'end_date'
+    )
+    for *product, end_date in subscriptions:
+        grant(entitlements, product, 'subscription', end_date)
+
+    # One row per item, or per product of a bundle item
+    bundled = 'product_bundle__productbundleitem__product__'
+    items = OrderItem.objects.filter(order__user_id=user_id, order__status='completed').values_list(
+        *(f'product__{field}' for field in PRODUCT_FIELDS), *(f'{bundled}{field}' for field in PRODUCT_FIELDS)
+    )
+    for row in items:
+        for product in (row[:len(PRODUCT_FIELDS)], row[len(PRODUCT_FIELDS):]):
+            if product[0] is not None and product[3] in ORDER_PRODUCT_TYPES:
+                grant(entitlements, product, 'order')
+    return entitlements
+
+
+def get_entitlements(user_id):
+    """The user's entitlements keyed by product id, from the cache when possible."""
+    key = entitlement_cache_key(user_id)
+    entitlements = cache.get(key)
+    if entitlements is None:
+        now = timezone.now()
+        entitlements = resolve_entitlements(user_id, now)
+        timeout = getattr(settings, 'ENTITLEMENT_CACHE_TIMEOUT', 300)
+        expiries = [entry['expires_at'] for entry in entitlements.values() if entry['expires_at'] is not None]
+        if expiries:
+            # Recomputed as soon as the first entitlement runs out
+            timeout = max(min(timeout, (min(expiries) - now) / timedelta(seconds=1)), 1)
+        cache.set(key, entitlements, timeout)
+    return entitlements
+
+
+def has_access(user, product, now=None):
+    """Whether `user` (a user or id) may use `product` (a product or id) right now."""
+    user_id = getattr(user, 'pk', user)
+    entry = get_entitlements(user_id).get(getattr(product, 'pk', product))
+    if entry is None:
+        return False
+    return entry['expires_at'] is None or entry['expires_at'] > (now or timezone.now())
@@ -0,0 +1,135 @@
+import logging
+import os
+import random
+import socket
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from api.models import Job
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}
+
+
+class JobError(Exception):
+    pass
+
+
+def register_job(name):
+    """Decorator installing a function as the handler for jobs called `name`; it receives the payload as kwargs."""
+    def decorator(func):
+        _handlers[name] = func
+        return func
+    return decorator
+
+
+def get_handler(name):
+    try:
+        return _handlers[name]
+    except KeyError:
+        raise JobError(f'No handler registered for job {name!r}')
+
+
+def enqueue(name, run_at=None, max_attempts=None, **payload):
+    """
+    Queue a job. The row is written in the caller's transaction, so a job enqueued
+    inside transaction.atomic() only becomes visible to workers if it commits.
+    """
+    get_handler(name)
+    return Job.objects.create(
+        name=name,
+        payload=payload,
+        run_at=run_at or timezone.now(),
+        max_attempts=max_attempts or getattr(settings, 'JOBS_MAX_ATTEMPTS', 5),
+    )
+
+
+def retry_delay(attempts):
+    # Exponential backoff with jitter, so jobs failing together do not retry together
+    base = getattr(settings, 'JOBS_RETRY_BACKOFF', 30)
+    ceiling = getattr(settings, 'JOBS_RETRY_BACKOFF_MAX', 3600)
+    delay = min(base * 2 ** (attempts - 1), ceiling)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def claim(worker_id, limit):
+    """
+    Lease up to `limit` due jobs to this worker. Candidates are flipped to running
+    with a conditional UPDATE, so concurrent workers never claim the same row.
+    """
+    now = timezone.now()
+    candidates = list(Job.objects.due(now).order_by('run_at', 'id').values_list('id', flat=True)[:limit])
+    if not candidates:
+        return []
+    Job.objects.filter(id__in=candidates, status='queued').update(
+        status='running', locked_by=worker_id, locked_at=now, attempts=F('attempts') + 1
+    )
+    return list(Job.objects.filter(id__in=candidates, status='running', locked_by=worker_id).order_by('run_at', 'id'))
+
+
+def reclaim_expired(lease_seconds=None):
+    """Requeue running jobs whose worker died without reporting back."""
+    lease = timedelta(seconds=lease_seconds or getattr(settings, 'JOBS_LEASE_SECONDS', 600))
+    expired = Job.objects.filter(status='running', locked_at__lt=timezone.now() - lease)
+    dead = expired.filter(attempts__gte=F('max_attempts')).update(
+        status='dead', locked_by=None, locked_at=None, last_error='Lease expired', finished_at=timezone.now()
+    )
+    return dead + expired.update(status='queued', locked_by=None, locked_at=None, run_at=timezone.now())
+
+
+def renew_leases(worker_id):
+    """Push back the lease of every job this worker is running, so long handlers are not reclaimed mid-run."""
+    return Job.objects.filter(status='running', locked_by=worker_id).update(locked_at=timezone.now())
+
+
+def purge_finished(retention_days=None, batch_size=1000):
+    """Delete done and dead jobs finished more than JOBS_RETENTION_DAYS ago; returns how many were deleted."""
+    days = retention_days if retention_days is not None else getattr(settings, 'JOBS_RETENTION_DAYS', 14)
+    finished = Job.objects.filter(status__in=['done', 'dead'], finished_at__lt=timezone.now() - timedelta(days=days))
+    deleted = 0
+    while True:
+        # In batches, so the purge never holds locks on a large range at once
+        ids = list(finished.order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += Job.objects.filter(id__in=ids).delete()[0]
+
+
+def run_job(job_id, worker_id):
+    """Run one claimed job and record the outcome. Safe to call from pool threads and processes."""
+    close_old_connections()
+    try:
+        job = Job.objects.get(pk=job_id, status='running', locked_by=worker_id)
+    except Job.DoesNotExist:
+        return None
+    try:
+        with transaction.atomic():
+            get_handler(job.name)(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            logger.error('Job %s failed on its last attempt and is dead-lettered', job)
+            outcome = {'status': 'dead', 'finished_at': timezone.now()}
+        else:
+            logger.info('Job %s failed (attempt %s of %s), retrying', job, job.attempts, job.max_attempts)
+            outcome = {'status': 'queued', 'run_at': timezone.now() + retry_delay(job.attempts)}
+        outcome['last_error'] = error
+    else:
+        outcome = {'status': 'done', 'finished_at': timezone.now(), 'last_error': None}
+    # Only the lease holder may report back; a reclaimed job belongs to someone else
+    Job.objects.filter(pk=job.pk, status='running', locked_by=worker_id).update(
+        locked_by=None, locked_at=None, **outcome
+    )
+    close_old_connections()
+    return outcome['status']
+
+
+def new_worker_id():
+    return f'{socket.gethostname()[:60]}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
@@ -0,0 +1,106 @@
+"""
+Signed license tokens that bots verify offline.
+
+A token is an Ed25519-signed JWT naming the license key, product slug, device
+fingerprint and license expiry. Bots fetch the public key once, verify tokens
+locally on every start and only come back for a fresh token before `exp`, or
+to poll the revocation feed. Nothing here touches the database.
+"""
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import lru_cache
+
+import jwt
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+
+ALGORITHM = 'EdDSA'
+REQUIRED_CLAIMS = ['sub', 'prd', 'fpr', 'iat', 'exp']
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+logger = logging.getLogger(__name__)
+
+
+def timestamp_us(value):
+    """Microseconds since the epoch, exactly; revocations are compared at this precision."""
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+@lru_cache(maxsize=4)
+def load_private_key(pem, secret_key, debug=False):
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+    from cryptography.hazmat.primitives.serialization import load_pem_private_key
+    if pem:
+        key = load_pem_private_key(pem.encode(), password=None)
+        if not isinstance(key, Ed25519PrivateKey):
+            raise ValueError('LICENSE_TOKEN_PRIVATE_KEY must be an Ed25519 key')
+        return key
+    if not debug:
+        # A key derived from SECRET_KEY changes with it and would invalidate every token in the field
+        raise ImproperlyConfigured('LICENSE_TOKEN_PRIVATE_KEY must be set to a PEM Ed25519 private key')
+    logger.warning('LICENSE_TOKEN_PRIVATE_KEY is not set; signing license tokens with a key derived from SECRET_KEY')
+    return Ed25519PrivateKey.from_private_bytes(hashlib.sha256(f'license-tokens:{secret_key}'.encode()).digest())
+
+
+def private_key():
+    return load_private_key(getattr(settings, 'LICENSE_TOKEN_PRIVATE_KEY', None), settings.SECRET_KEY, settings.DEBUG)
+
+
+def public_key_pem():
+    from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+    return private_key().public_key().public_bytes(Encoding.PEM, PublicFormat.SubjectPublicKeyInfo).decode()
+
+
+def sign_license_token(license_key, product, fingerprint, expiry_date=None, now=None):
+    """
+    Token for one activated device. It expires after LICENSE_TOKEN_LIFETIME or
+    with the license, whichever is first, which bounds how long a revocation a
+    bot never heard about can go unnoticed.
+    """
+    now = now or timezone.now()
+    expires_at = now + timedelta(seconds=getattr(settings, 'LICENSE_TOKEN_LIFETIME', 7 * 24 * 3600))
+    if expiry_date is not None:
+        expires_at = min(expires_at, expiry_date)
+    claims = {
+        'sub': license_key,
+        'prd': product,
+        'fpr': fingerprint,
+        'lexp': int(expiry_date.timestamp()) if expiry_date is not None else None,
+        'iat': int(now.timestamp()),
+        # `iat` is whole seconds, too coarse to tell a revocation from a reactivation in the same second
+        'iat_us': timestamp_us(now),
+        'exp': int(expires_at.timestamp()),
+    }
+    return jwt.encode(claims, private_key(), algorithm=ALGORITHM), expires_at
+
+
+def revocation_digest(license_key, fingerprint=None):
+    """
+    What the revocation feed publishes instead of raw keys: a digest of the
+    license key, or of the key and fingerprint for a single released device.
+    """
+    value = license_key if fingerprint is None else f'{license_key}:{fingerprint}'
+    return hashlib.sha256(value.encode()).hexdigest()[:32]
+
+
+def verify_license_token(token, public_key, fingerprint=None, revoked=None):
+    """
+    Reference verification, as bots are expected to do it: check the signature
+    and expiry, that the token was minted for this device, and that it was not
+    minted before a revocation of the license or of this device's activation.
+    `revoked` maps digests from the revocation feed to their revoked_at_us timestamps.
+    Raises jwt.InvalidTokenError.
+    """
+    claims = jwt.decode(token, public_key, algorithms=[ALGORITHM], options={'require': REQUIRED_CLAIMS})
+    if fingerprint is not None and claims['fpr'] != fingerprint:
+        raise jwt.InvalidTokenError('Token was issued for another device')
+    if revoked:
+        issued_at = claims.get('iat_us', claims['iat'] * 1_000_000)
+        for digest in (revocation_digest(claims['sub']), revocation_digest(claims['sub'], claims['fpr'])):
+            # Tokens minted after a revocation belong to a reactivated license or device
+            if issued_at <= revoked.get(digest, -1):
+                raise jwt.InvalidTokenError('License has been revoked')
+    return claims
@@ -0,0 +1,257 @@
+"""
+Bot license issuance, validation and activation.
+
+Deployed bots validate their key on every startup, so validation answers from
+a short-lived cache of the license row. Activations go straight to the
+database: the seat is taken with a conditional UPDATE, which keeps concurrent
+activations from ever exceeding activation_limit.
+
+Activated devices also get a signed token (api.license_tokens) they verify
+offline, together with the revocation feed kept here.
+"""
+import hashlib
+import secrets
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max, Prefetch
+from django.utils import timezone
+
+from api.activity_log import activation_log
+from api.entitlements import invalidate_entitlements
+from api.license_tokens import revocation_digest, sign_license_token
+from api.models import (
+    BotLicense, BotLicenseActivation, LicenseRevocation, OrderItem, Product
+)
+
+REVOCATION_CURSOR_KEY = 'license:revocations:cursor'
+
+LICENSE_FIELDS = [
+    'id', 'license_key', 'status', 'expiry_date', 'activation_limit', 'activation_count', 'product__slug'
+]
+
+
+class LicenseError(Exception):
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
+
+
+def generate_license_key():
+    return '-'.join(secrets.token_hex(4).upper() for _ in range(4))
+
+
+def issue_licenses(orders, batch_size=500):
+    """
+    Create one active license per bot unit bought in `orders`, bundles included,
+    with a single bulk insert. Items that already have licenses are skipped, so
+    issuing twice for the same orders creates nothing the second time.
+    """
+    users = {order.pk: order.user_id for order in orders}
+    items = (
+        OrderItem.objects.filter(order_id__in=users, licenses__isnull=True)
+        .select_related('product', 'product_bundle')
+        .prefetch_related(Prefetch(
+            'product_bundle__products', Product.objects.filter(product_type='bot').order_by('id'), to_attr='bots'
+        ))
+        .order_by('id')
+    )
+    licenses = []
+    for item in items:
+        if (item.metadata or {}).get('renews_subscription_id') is not None:
+            # A subscription renewal keeps the licenses issued when it was bought
+            products = []
+        elif item.product is not None:
+            products = [item.product] if item.product.product_type == 'bot' else []
+        else:
+            products = item.product_bundle.bots if item.product_bundle is not None else []
+        licenses.extend(
+            BotLicense(
+                user_id=users[item.order_id], product=product, order_item=item,
+                license_key=generate_license_key(), status='active',
+            )
+            for product in products for _ in range(item.quantity)
+        )
+    return BotLicense.objects.bulk_create(licenses, batch_size=batch_size)
+
+
+def license_cache_key(license_key):
+    # Keys come straight from the request; hash them into something every cache backend accepts
+    return f'license:state:{hashlib.sha1(license_key.encode()).hexdigest()}'
+
+
+def get_license_state(license_key):
+    """
+    The license's fields as a dict, or None for an unknown key. Cached for
+    LICENSE_CACHE_TIMEOUT seconds, misses included, so bots retrying a bad key
+    do not reach the database either.
+    """
+    key = license_cache_key(license_key)
+    state = cache.get(key)
+    if state is None:
+        state = BotLicense.objects.filter(license_key=license_key).values(*LICENSE_FIELDS).first() or {}
+        cache.set(key, state, getattr(settings, 'LICENSE_CACHE_TIMEOUT', 30))
+    return state or None
+
+
+def invalidate_license(license_key):
+    cache.delete(license_cache_key(license_key))
+
+
+def expire_licenses(now=None, batch_size=1000):
+    """
+    Flip active licenses past their expiry date to expired, at most batch_size
+    rows per transaction so the sweep never holds many row locks at once. Yields
+    (licenses expired, seconds the UPDATE took) per batch; the cached states of a
+    batch are dropped once it commits.
+    """
+    now = now or timezone.now()
+    due = BotLicense.objects.filter(status='active', expiry_date__lt=now)
+    while True:
+        with transaction.atomic():
+            batch = list(due.order_by('expiry_date', 'id').values_list('id', 'license_key', 'user_id')[:batch_size])
+            if not batch:
+                return
+            start = time.perf_counter()
+            # No revocation is published: tokens never outlive the expiry date they were signed with
+            expired = due.filter(id__in=[row[0] for row in batch]).update(status='expired', updated_at=now)
+            elapsed = time.perf_counter() - start
+            keys = [license_cache_key(license_key) for _, license_key, _ in batch]
+            user_ids = {user_id for _, _, user_id in batch}
+
+            # Bound now: inside an outer transaction the callbacks only run at its end
+            def invalidate(keys=keys, user_ids=user_ids):
+                cache.delete_many(keys)
+                invalidate_entitlements(*user_ids)
+            transaction.on_commit(invalidate)
+        yield expired, elapsed
+
+
+def check_license(state, now=None):
+    """Raise LicenseError unless the license `state` can be used right now."""
+    if state is None:
+        raise LicenseError('not_found', 'Unknown license key.')
+    if state['status'] != 'active':
+        raise LicenseError(state['status'], f"License is {state['status']}.")
+    if state['expiry_date'] is not None and state['expiry_date'] <= (now or timezone.now()):
+        raise LicenseError('expired', 'License has expired.')
+
+
+def validate_license(license_key):
+    state = get_license_state(license_key)
+    check_license(state)
+    return state
+
+
+def activate_license(license_key, fingerprint, ip_address='', device_info=None):
+    """
+    Take an activation seat for the device `fingerprint`. Activating a device that
+    already holds a seat is a no-op, so bots may activate on every start.
+    """
+    license = BotLicense.objects.filter(license_key=license_key).first()
+    try:
+        check_license(None if license is None else {
+            'status': license.status, 'expiry_date': license.expiry_date
+        })
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    BotLicenseActivation.objects.create(bot_license=license, fingerprint=fingerprint)
+            except IntegrityError:
+                return get_license_state(license_key)
+            # The count and the limit are compared inside the UPDATE, so of several
+            # concurrent activations only as many as there are free seats succeed
+            taken = BotLicense.objects.filter(
+                pk=license.pk, status='active', activation_count__lt=F('activation_limit')
+            ).update(activation_count=F('activation_count') + 1, updated_at=timezone.now())
+            if not taken:
+                raise LicenseError('limit_reached', 'License has no free activations left.')
+    except LicenseError:
+        if license is not None:
+            log_activation(license, 'activation_failure', ip_address, device_info)
+        raise
+    invalidate_license(license_key)
+    log_activation(license, 'activation_success', ip_address, device_info)
+    return get_license_state(license_key)
+
+
+def deactivate_license(license_key, fingerprint):
+    """Release the seat held by `fingerprint`; returns whether it held one."""
+    with transaction.atomic():
+        deleted, _ = BotLicenseActivation.objects.filter(
+            bot_license__license_key=license_key, fingerprint=fingerprint
+        ).delete()
+        if deleted:
+            BotLicense.objects.filter(license_key=license_key, activation_count__gt=0).update(
+                activation_count=F('activation_count') - 1, updated_at=timezone.now()
+            )
+            record_revocation(license_key, fingerprint)
+    if deleted:
+        invalidate_license(license_key)
+    return bool(deleted)
+
+
+def log_activation(license, action_type, ip_address, device_info):
+    activation_log.record(license.pk, license.user_id, action_type, ip_address, device_info)
+
+
+def issue_license_token(license_key, fingerprint):
+    """A fresh signed token for a device holding an activation of a usable license."""
+    state = validate_license(license_key)
+    if not BotLicenseActivation.objects.filter(bot_license_id=state['id'], fingerprint=fingerprint).exists():
+        raise LicenseError('not_activated', 'License is not activated on this device.')
+    return sign_license_token(state['license_key'], state['product__slug'], fingerprint, state['expiry_date'])
+
+
+def record_revocation(license_key, fingerprint=None):
+    """
+    Publish that tokens minted so far for the license, or for one of its devices,
+    must no longer be accepted. Runs in the caller's transaction.
+    """
+    revocation = LicenseRevocation.objects.create(digest=revocation_digest(license_key, fingerprint))
+    transaction.on_commit(lambda: cache.set(
+        REVOCATION_CURSOR_KEY, revocation.pk, getattr(settings, 'LICENSE_CACHE_TIMEOUT', 30)
+    ))
+    return revocation
+
+
+def latest_revocation_id():
+    latest = cache.get(REVOCATION_CURSOR_KEY)
+    if latest is None:
+        latest = LicenseRevocation.objects.aggregate(latest=Max('id'))['latest'] or 0
+        cache.set(REVOCATION_CURSOR_KEY, latest, getattr(settings, 'LICENSE_CACHE_TIMEOUT', 30))
+    return latest
+
+
+def revocations_since(since, limit=1000):
+    """
+    Revocations after the cursor `since`, oldest first, as (revocations, cursor, more).
+    Bots poll with the cursor they were last given; when nothing changed this is
+    answered from the cached latest id. Entries older than the token lifetime are
+    left out, since every token they could apply to has expired.
+
+    Ids are assigned at insert but become visible at commit, so a revocation can
+    appear below one already served. The cursor therefore only moves past entries
+    older than LICENSE_REVOCATION_LAG seconds; newer ones are served again on the
+    next poll, and bots key what they hold by digest.
+    """
+    if since >= latest_revocation_id():
+        return [], since, False
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=getattr(settings, 'LICENSE_TOKEN_LIFETIME', 7 * 24 * 3600))
+    rows = list(
+        LicenseRevocation.objects.filter(id__gt=since, revoked_at__gte=cutoff)
+        .order_by('id').values('id', 'digest', 'revoked_at')[:limit + 1]
+    )
+    more = len(rows) > limit
+    rows = rows[:limit]
+    settled = LicenseRevocation.objects.filter(
+        id__gt=since, revoked_at__lt=now - timedelta(seconds=getattr(settings, 'LICENSE_REVOCATION_LAG', 30))
+    )
+    if more:
+        settled = settled.filter(id__lte=rows[-1]['id'])
+    cursor = settled.aggregate(latest=Max('id'))['latest'] or since
+    return rows, cursor, more
@@ -0,0 +1,77 @@
+import os
+import random
+import tempfile
+import time
+import zlib
+
+import bsdiff4
+from django.core.management.base import BaseCommand
+
+
+def next_release(rng, data, change):
+    """Edit about `change` of the bytes: replaced, inserted and deleted blocks, as a rebuild would."""
+    data = bytearray(data)
+    block = 4096
+    for _ in range(max(int(len(data) * change / block), 1)):
+        offset = rng.randrange(len(data) - block)
+        edit = rng.choice(['replace', 'insert', 'delete'])
+        if edit == 'replace':
+            data[offset:offset + block] = rng.randbytes(block)
+        elif edit == 'insert':
+            data[offset:offset] = rng.randbytes(block)
+        else:
+            del data[offset:offset + block]
+    return bytes(data)
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure bsdiff4 patch size and build/apply time on synthetic bot releases, for consecutive '
+        'releases and for a direct patch skipping them'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size-mb', type=float, default=20)
+        parser.add_argument('--change', type=float, default=0.01, help='Fraction of bytes changed per release')
+        parser.add_argument('--releases', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        # Half random bytes, half repetitive, roughly like a packed executable with resources
+        size = int(options['size_mb'] * 1024 * 1024)
+        releases = [rng.randbytes(size // 2) + bytes(range(256)) * (size // 512)]
+        for _ in range(options['releases'] - 1):
+            releases.append(next_release(rng, releases[-1], options['change']))
+
+        full = len(releases[-1])
+        self.stdout.write(
+            f'release {full / 2**20:.1f} MB, gzip {len(zlib.compress(releases[-1], 6)) / 2**20:.1f} MB, '
+            f'{options["change"]:.1%} changed per release'
+        )
+        self.stdout.write(f"{'patch':<14}{'size KB':>10}{'% of full':>11}{'build s':>10}{'apply s':>10}")
+        with tempfile.TemporaryDirectory() as directory:
+            paths = []
+            for index, content in enumerate(releases):
+                paths.append(os.path.join(directory, f'release-{index}'))
+                with open(paths[-1], 'wb') as f:
+                    f.write(content)
+            pairs = [(index - 1, index) for index in range(1, len(releases))]
+            if len(releases) > 2:
+                pairs.append((0, len(releases) - 1))
+            for source, target in pairs:
+                patch_path = os.path.join(directory, f'{source}-{target}.patch')
+                start = time.perf_counter()
+                bsdiff4.file_diff(paths[source], paths[target], patch_path)
+                built = time.perf_counter() - start
+                with open(patch_path, 'rb') as f:
+                    patch = f.read()
+                start = time.perf_counter()
+                result = bsdiff4.patch(releases[source], patch)
+                applied = time.perf_counter() - start
+                assert result == releases[target]
+                patch_size = len(patch)
+                self.stdout.write(
+                    f'{f"{source} -> {target}":<14}{patch_size / 1024:>10.1f}{patch_size / full:>11.1%}'
+                    f'{built:>10.2f}{applied:>10.2f}'
+                )
@@ -0,0 +1,53 @@
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from users.models import User
+from api.models import ProductCategory, Product
+
+
+class Command(BaseCommand):
+    help = 'Measure order creation latency through the API for large carts (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=50)
+        parser.add_argument('--orders', type=int, default=200)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = User.objects.create_user(
+                email='benchmark-checkout@example.com', username='benchmark-checkout',
+                full_name='Benchmark', password=None
+            )
+            category = ProductCategory.objects.create(name='Benchmark', slug='benchmark-checkout')
+            products = Product.objects.bulk_create([
+                Product(category=category, name=f'Checkout {i}', slug=f'benchmark-checkout-{i}',
+                        description='', price=Decimal('19.99'), product_type='bot')
+                for i in range(options['items'])
+            ])
+            cart = [{'product_id': product.id, 'quantity': 1 + i % 3} for i, product in enumerate(products)]
+
+            client = APIClient()
+            client.force_authenticate(user)
+            url = reverse('order-create')
+            timings = []
+            with CaptureQueriesContext(connection) as queries:
+                for _ in range(options['orders']):
+                    start = time.perf_counter()
+                    response = client.post(url, {'items': cart, 'payment_method': 'card'}, format='json')
+                    timings.append((time.perf_counter() - start) * 1000)
+                    assert response.status_code == 201, response.data
+            transaction.set_rollback(True)
+
+        timings.sort()
+        self.stdout.write(f"{options['orders']} orders of {options['items']} items")
+        self.stdout.write(f'  queries per order: {len(queries) / options["orders"]:.1f}')
+        self.stdout.write(f'  p50: {statistics.median(timings):.2f} ms')
+        self.stdout.write(f'  p95: {timings[int(len(timings) * 0.95) - 1]:.2f} ms')
+        self.stdout.write(f'  max: {timings[-1]:.2f} ms')
@@ -0,0 +1,91 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from api.license_tokens import public_key_pem, sign_license_token, verify_license_token
+from api.licenses import get_license_state, invalidate_license, validate_license
+from api.models import BotLicense, Product, ProductCategory
+from users.models import User
+
+
+def verify_tokens(public_key, tokens, count):
+    # Runs in pool processes; loads the key once like a bot does at startup
+    from cryptography.hazmat.primitives.serialization import load_pem_public_key
+    key = load_pem_public_key(public_key.encode())
+    start = time.perf_counter()
+    for i in range(count):
+        verify_license_token(tokens[i % len(tokens)], key)
+    return time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare license checks per core: offline signed-token verification against the cached and '
+        'uncached database validation, then verification throughput across several processes '
+        '(benchmark rows are rolled back)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verifications', type=int, default=20000, help='Checks per measurement')
+        parser.add_argument('--tokens', type=int, default=100, help='Distinct tokens cycled through')
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+
+    def handle(self, *args, **options):
+        count = options['verifications']
+        with transaction.atomic():
+            user = User.objects.create_user(
+                email='license-benchmark@example.com', username='license-benchmark', full_name='', password=None
+            )
+            category = ProductCategory.objects.create(name='Benchmark', slug='benchmark-licenses')
+            product = Product.objects.create(
+                category=category, name='Benchmark bot', slug='benchmark-license-bot', description='', price=1,
+                product_type='bot'
+            )
+            license = BotLicense.objects.create(user=user, product=product, license_key='BENCH-0', status='active')
+            tokens = [
+                sign_license_token(license.license_key, product.slug, f'device-{i}')[0]
+                for i in range(options['tokens'])
+            ]
+            public_key = public_key_pem()
+
+            self.stdout.write(f"{'check':<24}{'per second':>14}{'queries':>10}")
+            elapsed = verify_tokens(public_key, tokens, count)
+            self.report('signed token', count, elapsed, 0)
+
+            validate_license(license.license_key)
+            with CaptureQueriesContext(connection) as queries:
+                elapsed = self.timed(count, lambda: validate_license(license.license_key))
+            self.report('cached validation', count, elapsed, len(queries))
+
+            def uncached():
+                invalidate_license(license.license_key)
+                get_license_state(license.license_key)
+            with CaptureQueriesContext(connection) as queries:
+                elapsed = self.timed(count, uncached)
+            self.report('database validation', count, elapsed, len(queries))
+            transaction.set_rollback(True)
+        invalidate_license(license.license_key)
+
+        processes = options['processes']
+        share = max(count // processes, 1)
+        with ProcessPoolExecutor(processes) as pool:
+            # Each process reports its own loop time, so pool start-up is not counted
+            timings = list(pool.map(verify_tokens, *zip(*[(public_key, tokens, share)] * processes)))
+        per_core = share / (sum(timings) / len(timings))
+        self.stdout.write(
+            f'{processes} processes: {per_core:,.0f} verifications/s per core, '
+            f'{per_core * processes:,.0f}/s in total'
+        )
+
+    def timed(self, count, func):
+        start = time.perf_counter()
+        for _ in range(count):
+            func()
+        return time.perf_counter() - start
+
+    def report(self, name, count, elapsed, queries):
+        self.stdout.write(f'{name:<24}{count / elapsed:>14,.0f}{queries:>10}')
@@ -0,0 +1,175 @@
+import asyncio
+import os
+import signal
+import statistics
+import subprocess
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+SERVERS = {
+    'wsgi': ['gunicorn', '-c', 'gunicorn_config.py', 'core.wsgi:application'],
+    'asgi': ['gunicorn', '-c', 'gunicorn_asgi_config.py', 'core.asgi:application'],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive API endpoints with many concurrent keep-alive clients and report requests/sec '
+        'and latency percentiles per target. With --serve, starts the WSGI (sync workers) and '
+        'ASGI (uvicorn workers) gunicorn setups side by side and compares them.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', action='append', default=[],
+                            help='NAME=BASE_URL of an already running server; repeatable')
+        parser.add_argument('--serve', action='store_true',
+                            help='Start gunicorn with gunicorn_config.py and gunicorn_asgi_config.py and compare them')
+        parser.add_argument('--port', type=int, default=8100, help='First port used by --serve')
+        parser.add_argument('--workers', type=int, default=None, help='Override the worker count used by --serve')
+        parser.add_argument('--path', action='append', default=[],
+                            help='Request path, cycled through by every client; repeatable')
+        parser.add_argument('--header', action='append', default=[], help='Extra "Name: value" request header')
+        parser.add_argument('--concurrency', type=int, default=500)
+        parser.add_argument('--requests', type=int, default=20000, help='Requests per target')
+        parser.add_argument('--timeout', type=float, default=60.0, help='Per-request timeout in seconds')
+
+    def handle(self, *args, **options):
+        paths = options['path'] or ['/api/products/', '/api/categories/', '/api/products/?featured=true']
+        headers = [header.split(':', 1) for header in options['header']]
+        if any(len(header) != 2 for header in headers):
+            raise CommandError('--header must look like "Name: value"')
+
+        targets = [target.split('=', 1) for target in options['target']]
+        if any(len(target) != 2 for target in targets):
+            raise CommandError('--target must look like NAME=BASE_URL')
+        processes = []
+        if options['serve']:
+            for offset, (name, command) in enumerate(SERVERS.items()):
+                url = f'http://127.0.0.1:{options["port"] + offset}'
+                processes.append(self.start_server(command, url, options['workers']))
+                targets.append([name, url])
+        if not targets:
+            raise CommandError('Give at least one --target or use --serve')
+
+        try:
+            self.stdout.write(
+                f"{options['requests']} requests per target, {options['concurrency']} concurrent clients, "
+                f"paths: {', '.join(paths)}"
+            )
+            self.stdout.write(f"{'target':<10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'errors':>8}")
+            for name, url in targets:
+                result = asyncio.run(self.run_load(url, paths, headers, options))
+                self.stdout.write(
+                    f"{name:<10}{result['rps']:>10.0f}{result['p50']:>10.1f}{result['p99']:>10.1f}"
+                    f"{result['max']:>10.1f}{result['errors']:>8}"
+                )
+        finally:
+            for process in processes:
+                process.send_signal(signal.SIGTERM)
+                process.wait(timeout=30)
+
+    def start_server(self, command, url, workers):
+        bind = urlsplit(url).netloc
+        command = command + ['-b', bind, '--access-logfile', '/dev/null', '--error-logfile', '-']
+        if workers:
+            command += ['-w', str(workers)]
+        process = subprocess.Popen(command, cwd=settings.BASE_DIR, env=dict(os.environ), stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f'{" ".join(command)} exited with {process.returncode}')
+            try:
+                status, _ = asyncio.run(self.probe(url))
+                if status < 500:
+                    return process
+            except OSError:
+                pass
+            time.sleep(0.2)
+        process.kill()
+        raise CommandError(f'{" ".join(command)} did not start listening on {bind}')
+
+    async def probe(self, url):
+        parts = urlsplit(url)
+        reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+        try:
+            return await self.fetch(reader, writer, self.request_bytes(parts, '/api/categories/', []))
+        finally:
+            writer.close()
+
+    async def run_load(self, url, paths, headers, options):
+        parts = urlsplit(url)
+        requests = [self.request_bytes(parts, path, headers) for path in paths]
+        state = {'issued': 0, 'errors': 0}
+        timings = []
+
+        async def client(index):
+            reader = writer = None
+            while state['issued'] < options['requests']:
+                request = requests[state['issued'] % len(requests)]
+                state['issued'] += 1
+                start = time.perf_counter()
+                try:
+                    if writer is None:
+                        reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+                    status, keep_alive = await asyncio.wait_for(
+                        self.fetch(reader, writer, request), options['timeout']
+                    )
+                except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError):
+                    state['errors'] += 1
+                    status, keep_alive = None, False
+                if status == 200:
+                    timings.append((time.perf_counter() - start) * 1000)
+                elif status is not None:
+                    state['errors'] += 1
+                if not keep_alive and writer is not None:
+                    writer.close()
+                    reader = writer = None
+            if writer is not None:
+                writer.close()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client(i) for i in range(options['concurrency'])))
+        elapsed = time.perf_counter() - started
+        timings = sorted(timings) or [0.0]
+        return {
+            'rps': len(timings) / elapsed,
+            'p50': statistics.median(timings),
+            'p99': timings[max(int(len(timings) * 0.99) - 1, 0)],
+            'max': timings[-1],
+            'errors': state['errors'],
+        }
+
+    def request_bytes(self, parts, path, headers):
+        lines = [f'GET {path} HTTP/1.1', f'Host: {parts.netloc}', 'Accept: application/json']
+        lines += [f'{name.strip()}: {value.strip()}' for name, value in headers]
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+    async def fetch(self, reader, writer, request):
+        """Send one request and read the whole response; returns (status, keep_alive)."""
+        writer.write(request)
+        await writer.drain()
+        head = await reader.readuntil(b'\r\n\r\n')
+        status_line, *header_lines = head.decode('latin-1').split('\r\n')
+        version, status = status_line.split(' ', 2)[:2]
+        response_headers = {}
+        for line in header_lines:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                response_headers[name.strip().lower()] = value.strip().lower()
+
+        if 'content-length' in response_headers:
+            await reader.readexactly(int(response_headers['content-length']))
+        elif response_headers.get('transfer-encoding') == 'chunked':
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                await reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        else:
+            await reader.read()
+            return int(status), False
+        keep_alive = version == 'HTTP/1.1' and response_headers.get('connection') != 'close'
+        return int(status), keep_alive
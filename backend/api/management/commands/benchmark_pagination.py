@@ -0,0 +1,68 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from users.models import User
+from api.models import Order
+from api.pagination import KeysetPagination
+
+
+class Command(BaseCommand):
+    help = 'Compare page-N latency of offset and keyset pagination on order history (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=200000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        factory = APIRequestFactory()
+        with transaction.atomic():
+            user = self.populate(options['orders'])
+            queryset = Order.objects.filter(user=user).order_by('-created_at', '-id')
+            page_size = KeysetPagination.page_size
+
+            self.stdout.write(f"{'page':>8}{'offset':>16}{'keyset':>16}")
+            page = 1
+            while (page - 1) * page_size < options['orders']:
+                offset_ms = self.best_of(options['repeat'], lambda: PageNumberPagination().paginate_queryset(
+                    queryset, Request(factory.get('/', {'page': page}))
+                ))
+                # The cursor a client would hold after reading page - 1
+                boundary = queryset[(page - 1) * page_size - 1] if page > 1 else None
+                keyset_ms = self.best_of(options['repeat'], lambda: self.keyset_page(factory, queryset, boundary))
+                self.stdout.write(f'{page:>8}{offset_ms:>13.2f} ms{keyset_ms:>13.2f} ms')
+                page *= 10
+            transaction.set_rollback(True)
+
+    def populate(self, count):
+        user = User.objects.create_user(
+            email='benchmark-pagination@example.com', username='benchmark-pagination',
+            full_name='Benchmark', password=None
+        )
+        batch = []
+        for i in range(count):
+            batch.append(Order(user=user, order_number=f'BENCH-{i:08d}', subtotal=0, total=0))
+            if len(batch) == 5000:
+                Order.objects.bulk_create(batch)
+                batch = []
+        Order.objects.bulk_create(batch)
+        return user
+
+    def keyset_page(self, factory, queryset, boundary):
+        paginator = KeysetPagination()
+        params = {}
+        if boundary is not None:
+            params = {'cursor': paginator.cursor_token(boundary, reverse=False)}
+        return paginator.paginate_queryset(queryset, Request(factory.get('/', params)))
+
+    def best_of(self, repeat, func):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return min(timings)
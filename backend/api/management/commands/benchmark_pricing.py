@@ -0,0 +1,44 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.cache import bump_catalog_version
+from api.models import ProductCategory, Product
+from api.pricing import CartLine, price_cart
+
+
+class Command(BaseCommand):
+    help = 'Time price_cart for carts of 1 to 1000 lines, cold and with cached unit prices (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        sizes = [1, 10, 100, 1000]
+        with transaction.atomic():
+            category = ProductCategory.objects.create(name='Benchmark', slug='benchmark-pricing')
+            products = Product.objects.bulk_create([
+                Product(category=category, name=f'Pricing {i}', slug=f'benchmark-pricing-{i}', description='',
+                        price=Decimal('10.00') + i, sale_price=Decimal('9.99') if i % 2 else None,
+                        product_type='signal')
+                for i in range(max(sizes))
+            ])
+
+            self.stdout.write(f"{'lines':>8}{'cold':>14}{'cached':>14}")
+            for size in sizes:
+                lines = [CartLine('product', product.id, 1 + i % 5) for i, product in enumerate(products[:size])]
+                cold = self.best_of(options['repeat'], lambda: (bump_catalog_version(), price_cart(lines, 'USD')))
+                price_cart(lines, 'USD')
+                warm = self.best_of(options['repeat'], lambda: price_cart(lines, 'USD'))
+                self.stdout.write(f'{size:>8}{cold:>11.3f} ms{warm:>11.3f} ms')
+            transaction.set_rollback(True)
+
+    def best_of(self, repeat, func):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return min(timings)
@@ -0,0 +1,77 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import ProductCategory, Product
+from api.search import ScanSearchBackend, get_search_backend
+
+VOCABULARY = [
+    'bitcoin', 'ethereum', 'solana', 'scalper', 'grid', 'momentum', 'breakout', 'arbitrage',
+    'swing', 'futures', 'spot', 'martingale', 'trend', 'reversal', 'volatility', 'hedge',
+    'signal', 'bot', 'course', 'alpha', 'forex', 'gold', 'index', 'options', 'leverage',
+    'indicator', 'strategy', 'backtest', 'portfolio', 'risk', 'daily', 'weekly', 'hourly',
+]
+SYLLABLES = ['ka', 'lo', 'mi', 'ren', 'sa', 'tor', 'vu', 'ze', 'qua', 'dex', 'pi', 'nor']
+QUERIES = ['bitcoin', 'grid bot', 'momentum strat', 'volatility hedge futures', 'arb', 'nonexistentword']
+
+
+class Command(BaseCommand):
+    help = 'Compare indexed product search against the icontains scan on a synthetic catalog (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            self.populate(rng, options['products'])
+            backends = [ScanSearchBackend(), get_search_backend()]
+            self.stdout.write(f"{'query':<28}" + ''.join(f'{type(b).__name__:>32}' for b in backends))
+            for query in QUERIES:
+                timings = [self.time_query(backend, query, options['repeat']) for backend in backends]
+                self.stdout.write(
+                    f'{query:<28}' + ''.join(f'{ms:>22.2f} ms ({hits:>6} hits)' for ms, hits in timings)
+                )
+            transaction.set_rollback(True)
+
+    def populate(self, rng, count):
+        category = ProductCategory.objects.create(name='Benchmark', slug='benchmark-search')
+        # Mostly filler words so domain terms have a realistic document frequency
+        filler = [''.join(rng.choices(SYLLABLES, k=4)) for _ in range(5000)]
+
+        def words(k):
+            return ' '.join(rng.choice(VOCABULARY) if rng.random() < 0.05 else rng.choice(filler) for _ in range(k))
+
+        batch = []
+        for i in range(count):
+            batch.append(Product(
+                category=category,
+                name=words(3).title(),
+                slug=f'benchmark-search-{i}',
+                short_description=words(10),
+                description=words(120),
+                price=Decimal('49.00'),
+                product_type='signal',
+            ))
+            if len(batch) == 5000:
+                Product.objects.bulk_create(batch)
+                batch = []
+        Product.objects.bulk_create(batch)
+        # bulk_create skips post_save, so index the fixture in one pass
+        get_search_backend().rebuild()
+
+    def time_query(self, backend, query, repeat):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            queryset = backend.search(Product.objects.active(), query)
+            hits = queryset.count()
+            list(queryset.values_list('id', flat=True)[:20])
+            elapsed = (time.perf_counter() - start) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return best, hits
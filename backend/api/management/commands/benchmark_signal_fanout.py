@@ -0,0 +1,73 @@
+import asyncio
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.models import Product, Signal
+from api.signal_stream import Frame, SignalHub, Subscriber, encode_signal
+
+
+class Command(BaseCommand):
+    help = (
+        'Time fanning signals out to in-process stream subscribers, one consumer task per simulated connection, '
+        'with each signal encoded once against once per connection (no database access)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=50_000)
+        parser.add_argument('--signals', type=int, default=20)
+        parser.add_argument('--buffer', type=int, default=100, help='Frames a subscriber may fall behind')
+        parser.add_argument(
+            '--per-connection-sample', type=int, default=2000, help='Connections timed with per-connection encoding'
+        )
+
+    def handle(self, *args, **options):
+        product = Product(pk=1, slug='benchmark-signals')
+        signals = [
+            Signal(
+                pk=i + 1, product=product, asset_pair='BTC/USDT', timeframe='1h', side='buy',
+                entry_price=Decimal('64250.5'), take_profit=Decimal('66000'), stop_loss=Decimal('63000'),
+                created_at=timezone.now(),
+            )
+            for i in range(options['signals'])
+        ]
+        runs = [(True, options['connections']), (False, min(options['connections'], options['per_connection_sample']))]
+        for encode_once, connections in runs:
+            publish_time, total_time, dropped = asyncio.run(
+                self.fan_out(signals, encode_once, connections, options['buffer'])
+            )
+            delivered = connections * len(signals)
+            self.stdout.write(
+                f"{'encode once' if encode_once else 'encode per connection'}: {delivered:,} frames to "
+                f"{connections:,} connections, publish {publish_time * 1000:.0f}ms, all delivered in "
+                f"{total_time * 1000:.0f}ms ({delivered / total_time:,.0f} frames/s), {dropped} dropped"
+            )
+
+    async def fan_out(self, signals, encode_once, connections, buffer):
+        hub = SignalHub()
+        subscribers = {Subscriber(1, buffer) for _ in range(connections)}
+        hub.channels[1] = subscribers
+        by_id = {signal.pk: signal for signal in signals}
+
+        async def consume(subscriber):
+            for _ in signals:
+                frame = await subscriber.next()
+                if not encode_once:
+                    # What a server rendering every connection's message itself pays
+                    encode_signal(by_id[frame.id]).event
+            return subscriber.dropped
+
+        consumers = [asyncio.ensure_future(consume(subscriber)) for subscriber in subscribers]
+        # Let every consumer reach its first wait, as idle connections would be
+        await asyncio.sleep(0)
+        start = time.perf_counter()
+        for signal in signals:
+            if encode_once:
+                hub.publish(encode_signal(signal))
+            else:
+                hub.publish(Frame(signal.pk, signal.product_id, None, None))
+        publish_time = time.perf_counter() - start
+        results = await asyncio.gather(*consumers, return_exceptions=True)
+        return publish_time, time.perf_counter() - start, sum(1 for result in results if result is not False)
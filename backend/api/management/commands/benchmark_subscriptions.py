@@ -0,0 +1,126 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from api.dates import add_months
+from api.models import Order, OrderItem, Product, ProductCategory, ProductSubscriptionPlan, UserSubscription
+from api.subscriptions import expire_due, renew_due, renewal_order_number
+from users.models import User
+
+
+class QueryCounter:
+    """Counts queries without keeping them, unlike CaptureQueriesContext, which a million rows would fill."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        'Time process_subscriptions over generated subscriptions, a share of them due for renewal or expiry, '
+        'against renewing a sample with per-row saves (benchmark rows are rolled back)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscriptions', type=int, default=1_000_000)
+        parser.add_argument('--users', type=int, default=10_000)
+        parser.add_argument('--due-share', type=float, default=0.3, help='Share of subscriptions due for renewal')
+        parser.add_argument('--expiring-share', type=float, default=0.1, help='Share ended without auto-renew')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--per-row-sample', type=int, default=2000, help='Renewals timed with per-row saves')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        with transaction.atomic():
+            start = time.perf_counter()
+            self.populate(now, options)
+            self.stdout.write(
+                f"Created {options['subscriptions']:,} subscriptions in {time.perf_counter() - start:.1f}s"
+            )
+
+            with transaction.atomic():
+                self.per_row(now, options['per_row_sample'])
+                transaction.set_rollback(True)
+
+            for run in ('first run', 'rerun'):
+                counter = QueryCounter()
+                with connection.execute_wrapper(counter):
+                    start = time.perf_counter()
+                    renewed, orders = renew_due(now, options['batch_size'])
+                    renew_time = time.perf_counter() - start
+                    start = time.perf_counter()
+                    expired = expire_due(now, options['batch_size'])
+                    expire_time = time.perf_counter() - start
+                self.stdout.write(
+                    f'{run}: renewed {renewed:,} ({orders:,} orders) in {renew_time:.1f}s, '
+                    f'{renewed / renew_time if renewed else 0:,.0f}/s; expired {expired:,} in {expire_time:.1f}s, '
+                    f'{expired / expire_time if expired else 0:,.0f}/s; {counter.count:,} queries'
+                )
+            transaction.set_rollback(True)
+
+    def populate(self, now, options):
+        users = User.objects.bulk_create([
+            User(email=f'subscription-bench-{i}@example.com', username=f'subscription-bench-{i}', full_name='')
+            for i in range(options['users'])
+        ], batch_size=5000)
+        category = ProductCategory.objects.create(name='Benchmark', slug='benchmark-subscriptions')
+        product = Product.objects.create(
+            category=category, name='Benchmark signals', slug='benchmark-subscription-signals', description='',
+            price=10, product_type='signal'
+        )
+        plans = [
+            ProductSubscriptionPlan.objects.create(
+                product=product, name=cycle, price=10 * months, billing_cycle=cycle, features=[]
+            )
+            for cycle, months in ProductSubscriptionPlan.BILLING_CYCLE_MONTHS.items()
+        ]
+        rng = random.Random(21)
+        due_share, expiring_share = options['due_share'], options['expiring_share']
+        batch = []
+        for i in range(options['subscriptions']):
+            plan = plans[i % len(plans)]
+            months = ProductSubscriptionPlan.BILLING_CYCLE_MONTHS[plan.billing_cycle]
+            roll = rng.random()
+            auto_renew = roll >= due_share + expiring_share or roll < due_share
+            if roll < due_share + expiring_share:
+                end_date = now - timedelta(minutes=rng.randrange(1, 7 * 24 * 60))
+            else:
+                end_date = now + timedelta(minutes=rng.randrange(1, 30 * 24 * 60))
+            batch.append(UserSubscription(
+                user=users[i % len(users)], subscription_plan=plan, status='active',
+                start_date=add_months(end_date, -months), end_date=end_date, auto_renew=auto_renew,
+                next_payment_date=end_date,
+            ))
+            if len(batch) == 10_000:
+                UserSubscription.objects.bulk_create(batch)
+                batch = []
+        UserSubscription.objects.bulk_create(batch)
+
+    def per_row(self, now, sample):
+        due = UserSubscription.objects.filter(
+            status='active', auto_renew=True, next_payment_date__lte=now
+        ).select_related('subscription_plan').order_by('next_payment_date', 'id')[:sample]
+        start = time.perf_counter()
+        count = 0
+        for subscription in due:
+            plan = subscription.subscription_plan
+            months = ProductSubscriptionPlan.BILLING_CYCLE_MONTHS[plan.billing_cycle]
+            order = Order.objects.create(
+                user_id=subscription.user_id, order_number=renewal_order_number(subscription), subtotal=plan.price,
+                total=plan.price,
+            )
+            OrderItem.objects.create(order=order, product_id=plan.product_id, price=plan.price, subtotal=plan.price)
+            subscription.next_payment_date = add_months(subscription.next_payment_date, months)
+            subscription.end_date = add_months(subscription.end_date, months)
+            subscription.save()
+            count += 1
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f'per-row saves: renewed {count:,} in {elapsed:.1f}s, {count / elapsed if count else 0:,.0f}/s')
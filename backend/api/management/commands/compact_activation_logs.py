@@ -0,0 +1,69 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from api.activity_log import replay_segments
+from api.dates import add_months, month_start
+from api.models import BotActivationLogSummary, BotDownloadActivationLog
+
+
+class Command(BaseCommand):
+    help = (
+        'Replay spilled activation log segments, roll log rows older than --keep-days up into '
+        'monthly per-license counts, and drop monthly counts older than --retain-months'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-days', type=int, default=90, help='Raw rows younger than this are kept')
+        parser.add_argument('--retain-months', type=int, default=24, help='Monthly counts kept; 0 keeps all')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows compacted per transaction')
+
+    def handle(self, *args, **options):
+        replayed = replay_segments()
+        # Only whole months are compacted, so a month's counts are final once written
+        cutoff = month_start(timezone.now() - timedelta(days=options['keep_days']))
+        rows = BotDownloadActivationLog.objects.filter(log_timestamp__lt=cutoff)
+        compacted = 0
+        while True:
+            first = rows.order_by('log_timestamp', 'id').values_list('log_timestamp', flat=True).first()
+            if first is None:
+                break
+            start = month_start(first)
+            month = rows.filter(log_timestamp__gte=start, log_timestamp__lt=add_months(start, 1))
+            while True:
+                with transaction.atomic():
+                    batch = list(
+                        month.order_by('id').values_list('id', 'bot_license_id', 'action_type')[:options['batch_size']]
+                    )
+                    if not batch:
+                        break
+                    self.add_counts(start.date(), Counter((license_id, action) for _, license_id, action in batch))
+                    BotDownloadActivationLog.objects.filter(id__in=[row[0] for row in batch]).delete()
+                compacted += len(batch)
+
+        removed = 0
+        if options['retain_months']:
+            oldest = add_months(month_start(timezone.now()), -options['retain_months']).date()
+            removed, _ = BotActivationLogSummary.objects.filter(month__lt=oldest).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'Replayed {replayed} spilled events, compacted {compacted} rows, removed {removed} monthly counts'
+        ))
+
+    def add_counts(self, month, counts):
+        existing = {
+            (summary.bot_license_id, summary.action_type): summary
+            for summary in BotActivationLogSummary.objects.filter(
+                month=month, bot_license_id__in={license_id for license_id, _ in counts}
+            )
+        }
+        for key, events in counts.items():
+            if key in existing:
+                BotActivationLogSummary.objects.filter(pk=existing[key].pk).update(events=F('events') + events)
+        BotActivationLogSummary.objects.bulk_create([
+            BotActivationLogSummary(month=month, bot_license_id=license_id, action_type=action, events=events)
+            for (license_id, action), events in counts.items() if (license_id, action) not in existing
+        ])
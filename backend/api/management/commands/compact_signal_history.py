@@ -0,0 +1,50 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from api.models import Signal
+from api.dates import add_months, month_start
+from api.signal_history import ROW_FIELDS, append_to_chunk, to_columns
+
+
+class Command(BaseCommand):
+    help = (
+        'Move closed and cancelled signals created before --keep-days into monthly NumPy column chunks per '
+        'product, asset pair and timeframe (api.signal_history); open signals stay in the table'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-days', type=int, default=90, help='Signals younger than this are kept as rows')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Signals compacted per transaction')
+
+    def handle(self, *args, **options):
+        # Whole months only, so a month's chunk is written once unless late closes trickle in
+        cutoff = month_start(timezone.now() - timedelta(days=options['keep_days']))
+        rows = Signal.objects.filter(created_at__lt=cutoff).exclude(status='open')
+        compacted = chunks = 0
+        while True:
+            first = rows.order_by('created_at', 'id').values_list(
+                'product_id', 'asset_pair', 'timeframe', 'created_at'
+            ).first()
+            if first is None:
+                break
+            product_id, asset_pair, timeframe, created_at = first
+            start = month_start(created_at)
+            series = rows.filter(
+                product_id=product_id, asset_pair=asset_pair, timeframe=timeframe,
+                created_at__gte=start, created_at__lt=add_months(start, 1),
+            )
+            while True:
+                with transaction.atomic():
+                    batch = list(series.order_by('id').values_list(*ROW_FIELDS)[:options['batch_size']])
+                    if not batch:
+                        break
+                    columns = to_columns(batch, asset_pair, timeframe)
+                    append_to_chunk(product_id, asset_pair, timeframe, start.date(), columns)
+                    # The track record counts chunks as it counted these rows, so it is unchanged
+                    Signal.objects.filter(id__in=[row[0] for row in batch]).delete()
+                compacted += len(batch)
+            chunks += 1
+        self.stdout.write(self.style.SUCCESS(f'Compacted {compacted} signals into {chunks} monthly chunks'))
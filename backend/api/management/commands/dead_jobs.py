@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from api.models import Job
+
+
+class Command(BaseCommand):
+    help = 'List the dead-letter jobs, optionally putting them back in the queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--name', help='Only jobs with this name')
+        parser.add_argument('--requeue', action='store_true', help='Requeue the listed jobs with a fresh attempt budget')
+
+    def handle(self, *args, **options):
+        jobs = Job.objects.dead().order_by('finished_at', 'id')
+        if options['name']:
+            jobs = jobs.filter(name=options['name'])
+        for job in jobs.only('id', 'name', 'attempts', 'finished_at', 'last_error'):
+            error = (job.last_error or '').strip().splitlines()
+            self.stdout.write(f'{job.pk:>8}  {job.name:<24} {job.attempts} attempts  {job.finished_at:%Y-%m-%d %H:%M}  '
+                              f'{error[-1] if error else ""}')
+        if options['requeue']:
+            self.stdout.write(self.style.SUCCESS(f'Requeued {jobs.requeue()} jobs'))
@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from api.licenses import expire_licenses
+
+
+def row_lock_status():
+    """InnoDB's cumulative row lock wait counters, or None on other databases."""
+    if connection.vendor != 'mysql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("SHOW GLOBAL STATUS WHERE Variable_name IN ('Innodb_row_lock_waits', 'Innodb_row_lock_time')")
+        return {name: int(value) for name, value in cursor.fetchall()}
+
+
+class Command(BaseCommand):
+    help = (
+        'Mark active licenses past their expiry date as expired, in short transactions of --batch-size rows, '
+        'and report throughput and time spent waiting on row locks'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Licenses expired per transaction')
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to sleep between batches')
+
+    def handle(self, *args, **options):
+        locks_before = row_lock_status()
+        start = time.perf_counter()
+        expired, update_times = 0, []
+        for count, elapsed in expire_licenses(batch_size=options['batch_size']):
+            expired += count
+            update_times.append(elapsed)
+            if options['pause']:
+                time.sleep(options['pause'])
+        total = time.perf_counter() - start
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Expired {expired} licenses in {len(update_times)} batches, {total:.2f}s '
+            f'({expired / total if total else 0:,.0f}/s)'
+        ))
+        if update_times:
+            update_times.sort()
+            p95 = update_times[min(int(len(update_times) * 0.95), len(update_times) - 1)]
+            self.stdout.write(
+                f'UPDATE time per batch: median {update_times[len(update_times) // 2] * 1000:.1f}ms, '
+                f'p95 {p95 * 1000:.1f}ms, max {update_times[-1] * 1000:.1f}ms'
+            )
+        if locks_before is not None:
+            locks_after = row_lock_status()
+            # Server-wide counters: they include waits of any concurrent writers
+            self.stdout.write(
+                f"Row lock waits: {locks_after['Innodb_row_lock_waits'] - locks_before['Innodb_row_lock_waits']}, "
+                f"{locks_after['Innodb_row_lock_time'] - locks_before['Innodb_row_lock_time']}ms waited"
+            )
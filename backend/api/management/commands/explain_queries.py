@@ -0,0 +1,140 @@
+import re
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from users.models import User
+from api.models import (
+    ProductCategory, Product, ProductSubscriptionPlan, ProductReview, Order, UserSubscription, BotLicense, Job
+)
+from api.pagination import KeysetPagination
+from api.views import (
+    CategoryListView, ProductListView, ProductReviewListView, OrderListView
+)
+
+SQLITE_FULL_SCAN = re.compile(r'\bSCAN (\w+)(?!\w| USING)')
+MYSQL_FULL_SCAN = re.compile(r'"table_name": "(\w+)",\s*"access_type": "ALL"')
+
+
+class Command(BaseCommand):
+    help = (
+        'EXPLAIN the queryset behind each hot API view and background scan, and fail '
+        'if any of them reads a table with a full scan'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fixture-size', type=int, default=20000,
+            help='Rows to load into the large tables before explaining (rolled back afterwards); 0 uses existing data'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['fixture_size']:
+                self.populate(options['fixture_size'])
+            failures = []
+            for name, queryset in self.querysets():
+                plan = self.explain(queryset)
+                scanned = self.full_scans(plan)
+                status = self.style.ERROR('FULL SCAN ' + ', '.join(scanned)) if scanned else self.style.SUCCESS('ok')
+                self.stdout.write(f'{name:<36} {status}')
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'    {plan}')
+                if scanned:
+                    failures.append(name)
+            transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError(f'Full table scans in: {", ".join(failures)}')
+
+    def view_queryset(self, view_class, params=None, user=None, **kwargs):
+        request = Request(APIRequestFactory().get('/', params or {}))
+        request.user = user
+        view = view_class(request=request, kwargs=kwargs, format_kwarg=None)
+        return view.get_queryset()
+
+    def keyset_page(self, queryset):
+        return queryset.order_by(*KeysetPagination.ordering)[:KeysetPagination.page_size + 1]
+
+    def querysets(self):
+        now = timezone.now()
+        user = Order.objects.values_list('user', flat=True).first()
+        user = User.objects.get(pk=user) if user else User(pk=0)
+        product = Product.objects.active().values_list('slug', flat=True).first()
+        category = ProductCategory.objects.values_list('slug', flat=True).first() or 'none'
+        checks = [
+            ('category list', CategoryListView.queryset.order_by('order_index', 'id')),
+            ('product list', self.keyset_page(self.view_queryset(ProductListView))),
+            ('product list by category', self.keyset_page(self.view_queryset(ProductListView, {'category': category}))),
+            ('product list by type', self.keyset_page(self.view_queryset(ProductListView, {'type': 'bot'}))),
+            ('product list featured', self.keyset_page(self.view_queryset(ProductListView, {'featured': 'true'}))),
+            ('product list by rating', self.view_queryset(ProductListView, {'sort': 'rating'})[:20]),
+            ('order history', self.keyset_page(self.view_queryset(OrderListView, user=user))),
+            ('subscriptions due for renewal', UserSubscription.objects.filter(
+                status='active', next_payment_date__lte=now).order_by('next_payment_date', 'id')[:1000]),
+            ('subscriptions past end date', UserSubscription.objects.filter(
+                status='active', end_date__lt=now).order_by('end_date', 'id')[:1000]),
+            ('licenses past expiry', BotLicense.objects.filter(
+                status='active', expiry_date__lt=now).order_by('expiry_date', 'id')[:1000]),
+            ('job queue poll', Job.objects.due(now).order_by('run_at', 'id')[:100]),
+        ]
+        if product:
+            reviews = self.view_queryset(ProductReviewListView, slug=product)
+            checks.append(('product reviews', reviews.order_by('-created_at', '-id')[:21]))
+        return checks
+
+    def explain(self, queryset):
+        if connection.vendor == 'mysql':
+            return queryset.explain(format='json')
+        return queryset.explain()
+
+    def full_scans(self, plan):
+        pattern = MYSQL_FULL_SCAN if connection.vendor == 'mysql' else SQLITE_FULL_SCAN
+        return sorted(set(pattern.findall(plan)))
+
+    def populate(self, size):
+        now = timezone.now()
+        users = User.objects.bulk_create([
+            User(email=f'explain-{i}@example.com', username=f'explain-{i}', full_name='Explain')
+            for i in range(max(size // 100, 1))
+        ])
+        categories = ProductCategory.objects.bulk_create([
+            ProductCategory(name=f'Explain {i}', slug=f'explain-{i}', order_index=i) for i in range(max(size // 100, 1))
+        ])
+        ProductCategory.objects.rebuild_paths()
+        products = Product.objects.bulk_create([
+            Product(category=categories[i % len(categories)], name=f'Explain {i}', slug=f'explain-{i}',
+                    description='', price=Decimal('10.00'), product_type=['signal', 'bot', 'course'][i % 3],
+                    is_featured=i % 50 == 0, is_active=i % 10 != 0)
+            for i in range(size)
+        ], batch_size=1000)
+        plans = ProductSubscriptionPlan.objects.bulk_create([
+            ProductSubscriptionPlan(product=product, name='Monthly', price=Decimal('10.00'),
+                                    billing_cycle='monthly', features=[])
+            for product in products[:len(categories)]
+        ])
+        ProductReview.objects.bulk_create([
+            ProductReview(product=products[i % 100], user=users[i % len(users)], rating=1 + i % 5, is_approved=True)
+            for i in range(size)
+        ], batch_size=1000)
+        Order.objects.bulk_create([
+            Order(user=users[i % len(users)], order_number=f'EXPLAIN-{i}', subtotal=0, total=0)
+            for i in range(size)
+        ], batch_size=1000)
+        UserSubscription.objects.bulk_create([
+            UserSubscription(user=users[i % len(users)], subscription_plan=plans[i % len(plans)],
+                             status=['active', 'expired', 'cancelled'][i % 3], start_date=now,
+                             end_date=now + timedelta(days=i % 60 - 30),
+                             next_payment_date=now + timedelta(days=i % 60 - 30), auto_renew=i % 2 == 0)
+            for i in range(size)
+        ], batch_size=1000)
+        BotLicense.objects.bulk_create([
+            BotLicense(user=users[i % len(users)], product=products[i % len(products)], license_key=f'EXPLAIN-{i}',
+                       status=['active', 'expired', 'inactive'][i % 3], expiry_date=now + timedelta(days=i % 60 - 30))
+            for i in range(size)
+        ], batch_size=1000)
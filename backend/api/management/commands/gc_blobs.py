@@ -0,0 +1,103 @@
+import os
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, ProtectedError
+from django.utils import timezone
+
+from api.blobs import blob_path, store_root
+from api.models import Blob, BotFile
+from users.models import UserKYCDocument
+
+# Every model with a `blob` foreign key; refcounts are the sum over these
+REFERENCING_MODELS = [BotFile, UserKYCDocument]
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete blobs nothing has referenced for --grace-hours, along with store files that have no row '
+        'and abandoned partial uploads. --reconcile first recounts references from the referencing tables.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours', type=float, default=24, help='Unreferenced blobs and files younger than this are kept'
+        )
+        parser.add_argument('--reconcile', action='store_true', help='Recount blob references before collecting')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be removed without removing it')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        grace = timedelta(hours=options['grace_hours'])
+        fixed = self.reconcile(dry_run) if options['reconcile'] else 0
+
+        deleted = 0
+        candidates = Blob.objects.filter(refcount=0, created_at__lt=timezone.now() - grace)
+        for sha256 in candidates.values_list('sha256', flat=True).iterator():
+            if dry_run:
+                deleted += 1
+                continue
+            try:
+                with transaction.atomic():
+                    # Re-checked under the row lock uploads reusing the blob take (api.blobs.commit)
+                    if not Blob.objects.select_for_update().filter(pk=sha256, refcount=0).exists():
+                        continue
+                    Blob.objects.filter(pk=sha256).delete()
+                    # Before the lock is released, so an upload waiting on it stores the file again
+                    self.unlink(blob_path(sha256))
+            except ProtectedError:
+                self.stderr.write(f'Blob {sha256} has refcount 0 but is referenced; run with --reconcile')
+                continue
+            deleted += 1
+
+        orphans, partials = self.sweep_files(time.time() - grace.total_seconds(), dry_run)
+        verb = 'Would remove' if dry_run else 'Removed'
+        self.stdout.write(self.style.SUCCESS(
+            f'Fixed {fixed} refcounts. {verb} {deleted} unreferenced blobs, {orphans} orphan files '
+            f'and {partials} partial uploads'
+        ))
+
+    def reconcile(self, dry_run):
+        counts = Counter()
+        for model in REFERENCING_MODELS:
+            for row in model.objects.filter(blob__isnull=False).values('blob_id').annotate(references=Count('id')):
+                counts[row['blob_id']] += row['references']
+        fixed = 0
+        for sha256, refcount in Blob.objects.values_list('sha256', 'refcount').iterator():
+            if counts[sha256] != refcount:
+                if not dry_run:
+                    Blob.objects.filter(pk=sha256).update(refcount=counts[sha256])
+                fixed += 1
+        return fixed
+
+    def sweep_files(self, cutoff, dry_run):
+        """Remove store files without a Blob row and stale partial uploads, both older than `cutoff`."""
+        root = store_root()
+        if not root.exists():
+            return 0, 0
+        orphans = 0
+        for shard in root.glob('[0-9a-f][0-9a-f]/[0-9a-f][0-9a-f]'):
+            # Files are renamed into place before their row is created, hence the age check
+            files = {path.name: path for path in shard.iterdir() if path.stat().st_mtime < cutoff}
+            known = set(Blob.objects.filter(pk__in=list(files)).values_list('sha256', flat=True))
+            for name, path in files.items():
+                if name not in known:
+                    if not dry_run:
+                        self.unlink(path)
+                    orphans += 1
+        partials = 0
+        for path in root.glob('tmp/*.part'):
+            if path.stat().st_mtime < cutoff:
+                if not dry_run:
+                    self.unlink(path)
+                partials += 1
+        return orphans, partials
+
+    def unlink(self, path):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
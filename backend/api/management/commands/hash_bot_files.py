@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from api.downloads import update_file_metadata
+from api.models import BotFile
+
+
+class Command(BaseCommand):
+    help = 'Recompute the SHA-256 and size of bot files, e.g. after replacing files on disk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--missing', action='store_true', help='Only hash files that have no SHA-256 yet')
+
+    def handle(self, *args, **options):
+        changed, missing = [], []
+        bot_files = BotFile.objects.filter(sha256='') if options['missing'] else BotFile.objects.all()
+        for bot_file in bot_files.order_by('id').iterator():
+            before = (bot_file.sha256, bot_file.file_size)
+            if not update_file_metadata(bot_file):
+                missing.append(bot_file)
+            elif (bot_file.sha256, bot_file.file_size) != before:
+                changed.append(bot_file)
+        BotFile.objects.bulk_update(changed, ['sha256', 'file_size'], batch_size=500)
+        for bot_file in missing:
+            self.stderr.write(f'{bot_file.pk}: {bot_file.file_path} not found')
+        self.stdout.write(self.style.SUCCESS(f'Updated {len(changed)} bot files, {len(missing)} missing'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.licenses import issue_licenses
+from api.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Issue bot licenses for completed orders whose bot purchases have none yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--order', action='append', default=[], help='Only this order number; repeatable')
+        parser.add_argument('--batch-size', type=int, default=500, help='Orders handled per transaction')
+
+    def handle(self, *args, **options):
+        orders = Order.objects.filter(status='completed').order_by('id').only('id', 'user_id')
+        if options['order']:
+            orders = orders.filter(order_number__in=options['order'])
+        issued, last_id = 0, 0
+        while True:
+            batch = list(orders.filter(id__gt=last_id)[:options['batch_size']])
+            if not batch:
+                break
+            with transaction.atomic():
+                issued += len(issue_licenses(batch))
+            last_id = batch[-1].id
+        self.stdout.write(self.style.SUCCESS(f'Issued {issued} licenses'))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.subscriptions import expire_due, renew_due
+
+
+class Command(BaseCommand):
+    help = (
+        'Create renewal orders for auto-renewing subscriptions whose next payment is due and expire '
+        'subscriptions that ended without auto-renew. Safe to rerun after an interruption.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Subscriptions handled per transaction')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        start = time.perf_counter()
+        renewed, orders = renew_due(now, options['batch_size'])
+        expired = expire_due(now, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Renewed {renewed} subscriptions with {orders} new orders and expired {expired} '
+            f'in {time.perf_counter() - start:.1f}s'
+        ))
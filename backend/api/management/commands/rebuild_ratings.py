@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.ratings import rebuild_ratings
+
+
+class Command(BaseCommand):
+    help = 'Recompute every product rating aggregate from approved reviews in one GROUP BY pass'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        updated = rebuild_ratings(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rating aggregates for {updated} reviewed products'))
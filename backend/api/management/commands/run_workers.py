@@ -0,0 +1,80 @@
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from api.jobs import claim, new_worker_id, purge_finished, reclaim_expired, renew_leases, run_job
+
+PURGE_INTERVAL = 3600
+
+
+class Command(BaseCommand):
+    help = (
+        'Process queued background jobs with a pool of threads or processes until stopped, renewing the leases '
+        'of running jobs and purging finished ones hourly'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4, help='Jobs run at the same time')
+        parser.add_argument('--pool', choices=['thread', 'process'], default='thread')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Exit once no job is due instead of polling')
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        worker_id = new_worker_id()
+        concurrency = options['concurrency']
+        if options['pool'] == 'process':
+            # Children must not share the parent's database sockets
+            connections.close_all()
+            executor = ProcessPoolExecutor(max_workers=concurrency)
+        else:
+            executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='job')
+        self.stdout.write(f'Worker {worker_id} running {concurrency} {options["pool"]}s')
+
+        counts = {}
+        running = set()
+        renew_every = getattr(settings, 'JOBS_LEASE_SECONDS', 600) / 4
+        renewed_at = purged_at = float('-inf')
+        with executor:
+            while not self.stopping:
+                now = time.monotonic()
+                if running and now - renewed_at >= renew_every:
+                    renew_leases(worker_id)
+                    renewed_at = now
+                if now - purged_at >= PURGE_INTERVAL:
+                    purge_finished()
+                    purged_at = now
+                reclaim_expired()
+                jobs = claim(worker_id, concurrency - len(running))
+                running.update(executor.submit(run_job, job.pk, worker_id) for job in jobs)
+                if not running:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+                # Wake up when a slot frees, or after a poll interval to pick up newly due jobs
+                done, running = wait(running, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                for future in done:
+                    status = future.result()
+                    counts[status] = counts.get(status, 0) + 1
+            # Let claimed jobs finish so their leases are released, renewing them meanwhile
+            while running:
+                done, running = wait(running, timeout=renew_every)
+                for future in done:
+                    status = future.result()
+                    counts[status] = counts.get(status, 0) + 1
+                if running:
+                    renew_leases(worker_id)
+
+        summary = ', '.join(f'{count} {status}' for status, count in sorted(counts.items(), key=str)) or 'no jobs'
+        self.stdout.write(self.style.SUCCESS(f'Worker {worker_id} stopped: {summary}'))
+
+    def stop(self, signum, frame):
+        self.stopping = True
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+from api.search import FTS_TABLE, FULLTEXT_INDEX, FULLTEXT_COLUMNS
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            f"name, short_description, description, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        schema_editor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, short_description, description) "
+            f"SELECT id, name, COALESCE(short_description, ''), description FROM api_product"
+        )
+    elif vendor == 'mysql':
+        schema_editor.execute(f'ALTER TABLE api_product ADD FULLTEXT INDEX {FULLTEXT_INDEX} ({FULLTEXT_COLUMNS})')
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    elif vendor == 'mysql':
+        schema_editor.execute(f'ALTER TABLE api_product DROP INDEX {FULLTEXT_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
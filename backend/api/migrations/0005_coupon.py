@@ -0,0 +1,31 @@
+# Generated by Django 4.2 on 2026-10-18 11:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Coupon',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=50, unique=True)),
+                ('discount_type', models.CharField(choices=[('percentage', 'Percentage'), ('fixed', 'Fixed Amount')], max_length=20)),
+                ('value', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('currency', models.CharField(blank=True, max_length=3, null=True)),
+                ('min_subtotal', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('max_uses', models.IntegerField(blank=True, null=True)),
+                ('used_count', models.IntegerField(default=0)),
+                ('valid_from', models.DateTimeField(blank=True, null=True)),
+                ('valid_until', models.DateTimeField(blank=True, null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
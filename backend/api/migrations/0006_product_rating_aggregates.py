@@ -0,0 +1,86 @@
+# Generated by Django 4.2 on 2026-10-18 12:01
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Product = apps.get_model('api', 'Product')
+    ProductReview = apps.get_model('api', 'ProductReview')
+    rows = (
+        ProductReview.objects.filter(is_approved=True, rating__in=range(1, 6))
+        .values_list('product_id', 'rating')
+        .annotate(total=models.Count('id'))
+        .order_by()
+    )
+    histograms = {}
+    for product_id, rating, total in rows:
+        histograms.setdefault(product_id, {})[rating] = total
+
+    products = []
+    for product_id, histogram in histograms.items():
+        product = Product(pk=product_id)
+        product.rating_count = sum(histogram.values())
+        product.rating_sum = sum(star * count for star, count in histogram.items())
+        product.rating_average = (Decimal(product.rating_sum) / product.rating_count).quantize(Decimal('0.01'))
+        for star, count in histogram.items():
+            setattr(product, f'rating_count_{star}', count)
+        products.append(product)
+    fields = ['rating_count', 'rating_sum', 'rating_average'] + [f'rating_count_{star}' for star in range(1, 6)]
+    Product.objects.bulk_update(products, fields, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_coupon'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_average',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=3),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count_1',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count_2',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count_3',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count_4',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count_5',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'rating_average', 'rating_count'], name='api_product_active_rating_idx'),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2 on 2026-10-18 12:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_product_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productreview',
+            index=models.Index(fields=['product', 'is_approved', 'created_at', 'id'], name='api_review_product_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productreview',
+            index=models.Index(fields=['product', 'is_approved', 'rating', 'created_at', 'id'], name='api_review_product_rating_idx'),
+        ),
+    ]
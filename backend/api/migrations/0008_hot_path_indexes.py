@@ -0,0 +1,73 @@
+# Generated by Django 4.2 on 2026-10-18 12:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_review_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='botlicense',
+            index=models.Index(fields=['status', 'expiry_date', 'id'], name='api_license_status_expiry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'product_type', 'created_at', 'id'], name='api_product_active_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'is_featured', 'created_at', 'id'], name='api_product_featured_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['created_at', 'id'], name='api_product_live_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['rating_average', 'rating_count'], name='api_product_live_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['product_type', 'created_at', 'id'], name='api_product_live_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_featured', True)), fields=['created_at', 'id'], name='api_product_live_featured_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productcategory',
+            index=models.Index(fields=['is_active', 'order_index'], name='api_category_active_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productcategory',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['order_index'], name='api_category_live_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productreview',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['product', 'created_at', 'id'], name='api_review_approved_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productreview',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['product', 'rating', 'created_at', 'id'], name='api_review_approved_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usersubscription',
+            index=models.Index(fields=['status', 'next_payment_date', 'id'], name='api_sub_status_payment_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usersubscription',
+            index=models.Index(fields=['status', 'end_date', 'id'], name='api_sub_status_end_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usersubscription',
+            index=models.Index(condition=models.Q(('auto_renew', True), ('status', 'active')), fields=['next_payment_date', 'id'], name='api_sub_renewal_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usersubscription',
+            index=models.Index(condition=models.Q(('auto_renew', False), ('status', 'active')), fields=['end_date', 'id'], name='api_sub_expiry_due_idx'),
+        ),
+    ]
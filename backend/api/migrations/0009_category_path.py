@@ -0,0 +1,39 @@
+# Generated by Django 4.2 on 2026-10-18 12:09
+
+from django.db import migrations, models
+
+
+def backfill_category_paths(apps, schema_editor):
+    ProductCategory = apps.get_model('api', 'ProductCategory')
+    categories = list(ProductCategory.objects.only('id', 'parent_id'))
+    children = {}
+    for category in categories:
+        children.setdefault(category.parent_id, []).append(category)
+    stack = [(category, '', 0) for category in children.get(None, [])]
+    while stack:
+        category, parent_path, depth = stack.pop()
+        category.path = f'{parent_path}{category.pk:010d}/'
+        category.depth = depth
+        stack.extend((child, category.path, depth + 1) for child in children.get(category.pk, []))
+    ProductCategory.objects.bulk_update(categories, ['path', 'depth'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productcategory',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='productcategory',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(backfill_category_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2 on 2026-10-18 12:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_job_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='botlicense',
+            name='order_item',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='licenses', to='api.orderitem'),
+        ),
+        migrations.CreateModel(
+            name='BotLicenseActivation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=128)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('bot_license', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activations', to='api.botlicense')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='botlicenseactivation',
+            constraint=models.UniqueConstraint(fields=('bot_license', 'fingerprint'), name='api_license_activation_unique'),
+        ),
+    ]
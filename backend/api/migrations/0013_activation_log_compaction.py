@@ -0,0 +1,42 @@
+# Generated by Django 4.2 on 2026-10-18 12:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_license_revocations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BotActivationLogSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('action_type', models.CharField(choices=[('download', 'Download'), ('activation_attempt', 'Activation Attempt'), ('activation_success', 'Activation Success'), ('activation_failure', 'Activation Failure')], max_length=20)),
+                ('events', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='botdownloadactivationlog',
+            name='log_timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='botdownloadactivationlog',
+            index=models.Index(fields=['log_timestamp', 'id'], name='api_actlog_timestamp_idx'),
+        ),
+        migrations.AddField(
+            model_name='botactivationlogsummary',
+            name='bot_license',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activation_log_summaries', to='api.botlicense'),
+        ),
+        migrations.AddConstraint(
+            model_name='botactivationlogsummary',
+            constraint=models.UniqueConstraint(fields=('month', 'bot_license', 'action_type'), name='api_actlog_summary_unique'),
+        ),
+    ]
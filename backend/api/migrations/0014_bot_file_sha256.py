@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 12:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_activation_log_compaction'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='botfile',
+            name='sha256',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+    ]
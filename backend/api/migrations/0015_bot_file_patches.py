@@ -0,0 +1,30 @@
+# Generated by Django 4.2 on 2026-10-18 12:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_bot_file_sha256'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BotFilePatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_path', models.CharField(max_length=255)),
+                ('file_size', models.BigIntegerField()),
+                ('sha256', models.CharField(max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='patches_from', to='api.botfile')),
+                ('target', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='patches_to', to='api.botfile')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='botfilepatch',
+            constraint=models.UniqueConstraint(fields=('source', 'target'), name='api_botfilepatch_unique'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2 on 2026-10-18 12:56
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0016_blob_store'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Signal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('asset_pair', models.CharField(max_length=30)),
+                ('timeframe', models.CharField(blank=True, default='', max_length=10)),
+                ('side', models.CharField(choices=[('buy', 'Buy'), ('sell', 'Sell')], max_length=4)),
+                ('entry_price', models.DecimalField(decimal_places=8, max_digits=20)),
+                ('take_profit', models.DecimalField(blank=True, decimal_places=8, max_digits=20, null=True)),
+                ('stop_loss', models.DecimalField(blank=True, decimal_places=8, max_digits=20, null=True)),
+                ('note', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='signals', to='api.product')),
+                ('vendor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='published_signals', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='signal',
+            index=models.Index(fields=['product', 'id'], name='api_signal_product_idx'),
+        ),
+    ]
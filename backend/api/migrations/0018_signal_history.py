@@ -0,0 +1,61 @@
+# Generated by Django 4.2 on 2026-10-18 13:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_signal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SignalHistoryChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('asset_pair', models.CharField(max_length=30)),
+                ('timeframe', models.CharField(blank=True, default='', max_length=10)),
+                ('month', models.DateField()),
+                ('signal_count', models.PositiveIntegerField(default=0)),
+                ('closed_count', models.PositiveIntegerField(default=0)),
+                ('win_count', models.PositiveIntegerField(default=0)),
+                ('profit_sum', models.FloatField(default=0)),
+                ('columns', models.BinaryField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='signal',
+            name='closed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='signal',
+            name='exit_price',
+            field=models.DecimalField(blank=True, decimal_places=8, max_digits=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='signal',
+            name='profit_percentage',
+            field=models.DecimalField(blank=True, decimal_places=4, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='signal',
+            name='status',
+            field=models.CharField(choices=[('open', 'Open'), ('closed', 'Closed'), ('cancelled', 'Cancelled')], default='open', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='signal',
+            index=models.Index(fields=['product', 'asset_pair', 'timeframe', 'created_at'], name='api_signal_series_idx'),
+        ),
+        migrations.AddField(
+            model_name='signalhistorychunk',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='signal_history_chunks', to='api.product'),
+        ),
+        migrations.AddConstraint(
+            model_name='signalhistorychunk',
+            constraint=models.UniqueConstraint(fields=('product', 'asset_pair', 'timeframe', 'month'), name='api_signal_chunk_unique'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2 on 2026-10-18 13:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_signal_history'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='signal',
+            constraint=models.CheckConstraint(check=models.Q(('entry_price__gt', 0)), name='api_signal_entry_positive'),
+        ),
+        migrations.AddConstraint(
+            model_name='signal',
+            constraint=models.CheckConstraint(check=models.Q(('take_profit__isnull', True), ('take_profit__gt', 0), _connector='OR'), name='api_signal_tp_positive'),
+        ),
+        migrations.AddConstraint(
+            model_name='signal',
+            constraint=models.CheckConstraint(check=models.Q(('stop_loss__isnull', True), ('stop_loss__gt', 0), _connector='OR'), name='api_signal_sl_positive'),
+        ),
+    ]
@@ -1,6 +1,68 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import F, Subquery, Value
+from django.db.models.functions import Concat, Length, Substr
+from django.utils import timezone
 from users.models import User
 
+CATEGORY_PATH_STEP = 10
+
+
+def category_path_segment(pk):
+    # Fixed-width segments keep paths in tree order and make every subtree a
+    # contiguous range: descendants of P sort between P and P[:-1] + '0'
+    return f'{pk:0{CATEGORY_PATH_STEP}d}/'
+
+
+def category_tree(categories):
+    """Link already-loaded categories into a forest; see ProductCategoryQuerySet.tree()."""
+    categories = list(categories)
+    nodes = {category.id: category for category in categories}
+    roots = []
+    for category in categories:
+        category.tree_children = []
+    for category in categories:
+        if category.parent_id is None:
+            roots.append(category)
+        elif category.parent_id in nodes:
+            nodes[category.parent_id].tree_children.append(category)
+    return roots
+
+
+class ProductCategoryQuerySet(models.QuerySet):
+    def subtree(self, slug):
+        """The category with this slug and all of its descendants, as one path range scan."""
+        root = ProductCategory.objects.filter(slug=slug)
+        upper = root.annotate(
+            upper=Concat(Substr('path', 1, Length('path') - 1), Value('0'))
+        ).values('upper')[:1]
+        return self.filter(path__gte=Subquery(root.values('path')[:1]), path__lt=Subquery(upper))
+    
+    def rebuild_paths(self):
+        """Recompute every path from the parent links, for rows written around save() (bulk_create, raw SQL)."""
+        categories = list(ProductCategory.objects.only('id', 'parent_id', 'path', 'depth'))
+        children = {}
+        for category in categories:
+            children.setdefault(category.parent_id, []).append(category)
+        stack = [(category, '', 0) for category in children.get(None, [])]
+        while stack:
+            category, parent_path, depth = stack.pop()
+            category.path = parent_path + category_path_segment(category.pk)
+            category.depth = depth
+            stack.extend((child, category.path, depth + 1) for child in children.get(category.pk, []))
+        ProductCategory.objects.bulk_update(categories, ['path', 'depth'], batch_size=1000)
+        return len(categories)
+    
+    def tree(self):
+        """
+        Load the whole forest in one query and return its roots, each node carrying
+        its ordered children in `tree_children`. Nodes whose parent is not in the
+        queryset are dropped along with their descendants.
+        """
+        return category_tree(self.order_by('order_index', 'id'))
+
+
 class ProductCategory(models.Model):
     name = models.CharField(max_length=100)
     slug = models.SlugField(max_length=100, unique=True)
@@ -9,11 +71,80 @@ class ProductCategory(models.Model):
     image_url = models.CharField(max_length=255, blank=True, null=True)
     is_active = models.BooleanField(default=True)
     order_index = models.IntegerField(default=0)
+    # Materialized path of zero-padded ids from the root down, e.g. '0000000001/0000000007/'
+    path = models.CharField(max_length=255, blank=True, default='', editable=False, db_index=True)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ProductCategoryQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_active', 'order_index'], name='api_category_active_order_idx'),
+            # Partial twin for SQLite, see Product.Meta
+            models.Index(fields=['order_index'], name='api_category_live_order_idx', condition=models.Q(is_active=True)),
+        ]
+    
     def __str__(self):
         return self.name
+    
+    def save(self, *args, **kwargs):
+        # Atomic so a rejected move does not leave the new parent saved
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self.update_path()
+    
+    def update_path(self):
+        """Recompute this category's path and, if it moved, re-root its whole subtree."""
+        if self.parent_id:
+            parent_path, parent_depth = ProductCategory.objects.filter(pk=self.parent_id).values_list(
+                'path', 'depth'
+            ).get()
+            depth = parent_depth + 1
+        else:
+            parent_path, depth = '', 0
+        if self.path and parent_path.startswith(self.path):
+            raise ValueError(f'Category {self.pk} cannot be moved below its own descendant {self.parent_id}.')
+        path = parent_path + category_path_segment(self.pk)
+        if path == self.path and depth == self.depth:
+            return
+        
+        if self.path:
+            ProductCategory.objects.filter(
+                path__gt=self.path, path__lt=self.path[:-1] + '0'
+            ).update(
+                path=Concat(Value(path), Substr('path', len(self.path) + 1)),
+                depth=F('depth') + (depth - self.depth),
+            )
+        ProductCategory.objects.filter(pk=self.pk).update(path=path, depth=depth)
+        self.path, self.depth = path, depth
+
+
+PRODUCT_DETAIL_REVIEW_LIMIT = 3
+
+
+class ProductQuerySet(models.QuerySet):
+    def active(self):
+        return self.filter(is_active=True)
+    
+    def with_catalog_relations(self, review_limit=PRODUCT_DETAIL_REVIEW_LIMIT):
+        # Everything ProductSerializer touches, loaded in a fixed number of queries;
+        # only the latest approved reviews are embedded, the rest are paginated
+        # by the product reviews endpoint. Subscription plans come from the
+        # catalog snapshot (api.snapshot) instead.
+        approved_reviews = ProductReview.objects.filter(is_approved=True).select_related('user')
+        latest_reviews = approved_reviews.order_by('-created_at', '-id')[:review_limit]
+        return self.select_related('category', 'signal_detail', 'bot_detail').prefetch_related(
+            models.Prefetch('reviews', queryset=latest_reviews, to_attr='latest_reviews'),
+        )
+    
+    def for_listing(self):
+        # Storefront grid columns plus the precomputed rating summary
+        return self.only(
+            'id', 'category_id', 'name', 'slug', 'short_description', 'price', 'sale_price',
+            'image_url', 'is_featured', 'product_type', 'rating_average', 'rating_count', 'created_at'
+        )
 
 
 class Product(models.Model):
@@ -39,9 +170,47 @@ class Product(models.Model):
     is_active = models.BooleanField(default=True)
     product_type = models.CharField(max_length=20, choices=PRODUCT_TYPE_CHOICES)
     metadata = models.JSONField(blank=True, null=True)
+    
+    # Approved-review aggregates, maintained by api.ratings
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_average = models.DecimalField(max_digits=3, decimal_places=2, default=0)
+    rating_count_1 = models.PositiveIntegerField(default=0)
+    rating_count_2 = models.PositiveIntegerField(default=0)
+    rating_count_3 = models.PositiveIntegerField(default=0)
+    rating_count_4 = models.PositiveIntegerField(default=0)
+    rating_count_5 = models.PositiveIntegerField(default=0)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ProductQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            # Keyset pagination over the active catalog
+            models.Index(fields=['is_active', 'created_at', 'id'], name='api_product_active_created_idx'),
+            # Sorting the catalog by rating
+            models.Index(fields=['is_active', 'rating_average', 'rating_count'], name='api_product_active_rating_idx'),
+            # Catalog filters by type and featured flag, in listing order
+            models.Index(fields=['is_active', 'product_type', 'created_at', 'id'], name='api_product_active_type_idx'),
+            models.Index(fields=['is_active', 'is_featured', 'created_at', 'id'], name='api_product_featured_idx'),
+            # Partial twins of the indexes above. SQLite compares booleans as bare
+            # columns and cannot seek on a leading boolean column; MySQL skips these.
+            models.Index(fields=['created_at', 'id'], name='api_product_live_created_idx',
+                         condition=models.Q(is_active=True)),
+            models.Index(fields=['rating_average', 'rating_count'], name='api_product_live_rating_idx',
+                         condition=models.Q(is_active=True)),
+            models.Index(fields=['product_type', 'created_at', 'id'], name='api_product_live_type_idx',
+                         condition=models.Q(is_active=True)),
+            models.Index(fields=['created_at', 'id'], name='api_product_live_featured_idx',
+                         condition=models.Q(is_active=True, is_featured=True)),
+        ]
+    
+    @property
+    def rating_histogram(self):
+        return {star: getattr(self, f'rating_count_{star}') for star in range(1, 6)}
+    
     def __str__(self):
         return self.name
 
@@ -53,6 +222,12 @@ class ProductSubscriptionPlan(models.Model):
         ('biannually', 'Biannually'),
         ('annually', 'Annually'),
     ]
+    BILLING_CYCLE_MONTHS = {
+        'monthly': 1,
+        'quarterly': 3,
+        'biannually': 6,
+        'annually': 12,
+    }
     
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='subscription_plans')
     name = models.CharField(max_length=100)
@@ -81,6 +256,101 @@ class SignalDetail(models.Model):
         return f"Signal Detail - {self.product.name}"
 
 
+class Signal(models.Model):
+    """
+    A trade call published by the vendor of a signal product. Entitled subscribers
+    receive it live through api.signal_stream; the id doubles as the stream's
+    event id, so clients resume from the last one they saw. The vendor later
+    closes it at an exit price (or cancels it), and closed signals make up the
+    product's track record (api.signal_history).
+    """
+    SIDE_CHOICES = [
+        ('buy', 'Buy'),
+        ('sell', 'Sell'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('open', 'Open'),
+        ('closed', 'Closed'),
+        ('cancelled', 'Cancelled'),
+    ]
+    
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='signals')
+    vendor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='published_signals')
+    asset_pair = models.CharField(max_length=30)
+    timeframe = models.CharField(max_length=10, blank=True, default='')
+    side = models.CharField(max_length=4, choices=SIDE_CHOICES)
+    entry_price = models.DecimalField(max_digits=20, decimal_places=8)
+    take_profit = models.DecimalField(max_digits=20, decimal_places=8, blank=True, null=True)
+    stop_loss = models.DecimalField(max_digits=20, decimal_places=8, blank=True, null=True)
+    note = models.TextField(blank=True, default='')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='open')
+    exit_price = models.DecimalField(max_digits=20, decimal_places=8, blank=True, null=True)
+    profit_percentage = models.DecimalField(max_digits=10, decimal_places=4, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    closed_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        indexes = [
+            # Stream replay: a product's signals after the last one a client saw
+            models.Index(fields=['product', 'id'], name='api_signal_product_idx'),
+            # History range scans: one series of a product over a time window
+            models.Index(fields=['product', 'asset_pair', 'timeframe', 'created_at'], name='api_signal_series_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(check=models.Q(entry_price__gt=0), name='api_signal_entry_positive'),
+            models.CheckConstraint(
+                check=models.Q(take_profit__isnull=True) | models.Q(take_profit__gt=0), name='api_signal_tp_positive'
+            ),
+            models.CheckConstraint(
+                check=models.Q(stop_loss__isnull=True) | models.Q(stop_loss__gt=0), name='api_signal_sl_positive'
+            ),
+        ]
+    
+    def close(self, exit_price=None, now=None):
+        """Close at `exit_price`, recording the profit in percent of the entry; without one, cancel."""
+        if exit_price is not None and self.entry_price <= 0:
+            raise ValueError(f'Signal {self.pk} has no positive entry price to measure a profit against')
+        self.closed_at = now or timezone.now()
+        if exit_price is None:
+            self.status = 'cancelled'
+            return
+        sign = 1 if self.side == 'buy' else -1
+        profit = sign * (exit_price - self.entry_price) * 100 / self.entry_price
+        self.status, self.exit_price, self.profit_percentage = 'closed', exit_price, profit.quantize(Decimal('0.0001'))
+    
+    def __str__(self):
+        return f"{self.product.name} - {self.side} {self.asset_pair}"
+
+
+class SignalHistoryChunk(models.Model):
+    """
+    One month of a product's finished signals for one asset pair and timeframe,
+    compacted out of Signal into compressed NumPy columns (api.signal_history).
+    The counts and profit sum cover closed signals, so a product's track record
+    is summed without decoding any columns.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='signal_history_chunks')
+    asset_pair = models.CharField(max_length=30)
+    timeframe = models.CharField(max_length=10, blank=True, default='')
+    month = models.DateField()
+    signal_count = models.PositiveIntegerField(default=0)
+    closed_count = models.PositiveIntegerField(default=0)
+    win_count = models.PositiveIntegerField(default=0)
+    profit_sum = models.FloatField(default=0)
+    columns = models.BinaryField()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['product', 'asset_pair', 'timeframe', 'month'], name='api_signal_chunk_unique'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.product_id} - {self.asset_pair} {self.timeframe} {self.month:%Y-%m}: {self.signal_count}"
+
+
 class BotDetail(models.Model):
     RISK_LEVEL_CHOICES = [
         ('low', 'Low'),
@@ -106,20 +376,84 @@ class BotDetail(models.Model):
         return f"Bot Detail - {self.product.name}"
 
 
+class Blob(models.Model):
+    """
+    A file in the content-addressed store (api.blobs), named by the SHA-256 of its
+    content. `refcount` counts the rows pointing at it; blobs nobody references are
+    removed by `manage.py gc_blobs`.
+    """
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    size = models.BigIntegerField()
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            # GC: unreferenced blobs past the grace period
+            models.Index(fields=['refcount', 'created_at'], name='api_blob_refcount_idx'),
+        ]
+    
+    def __str__(self):
+        return self.sha256
+
+
 class BotFile(models.Model):
     bot_detail = models.ForeignKey(BotDetail, on_delete=models.CASCADE, related_name='files')
     file_name = models.CharField(max_length=255)
+    # Relative to BOT_FILES_ROOT; for files kept in the blob store only names where patches go
     file_path = models.CharField(max_length=255)
+    blob = models.ForeignKey(Blob, on_delete=models.PROTECT, blank=True, null=True, related_name='bot_files')
     file_size = models.IntegerField()
     file_type = models.CharField(max_length=50)
     version = models.CharField(max_length=20)
     is_active = models.BooleanField(default=True)
+    # Hex SHA-256 of the content, filled in on save (api.downloads); the download ETag
+    sha256 = models.CharField(max_length=64, blank=True, default='', editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'blob_id' in field_names:
+            instance._saved_blob_id = instance.blob_id
+        if 'blob_id' in field_names and 'file_path' in field_names:
+            # What the stored sha256 was computed from
+            instance._hashed_source = (instance.file_path, instance.blob_id)
+        return instance
+    
     def __str__(self):
         return self.file_name
 
 
+class BotFilePatch(models.Model):
+    """
+    Binary diff (bsdiff4) turning one active BotFile into a later release of the same
+    bot; built by the `build_bot_file_patches` job (api.patches). The file lives next
+    to the target file under BOT_FILES_ROOT.
+    """
+    # With file_name, lets api.downloads serve patches like bot files
+    file_type = 'application/x-bsdiff4'
+    
+    source = models.ForeignKey(BotFile, on_delete=models.CASCADE, related_name='patches_from')
+    target = models.ForeignKey(BotFile, on_delete=models.CASCADE, related_name='patches_to')
+    file_path = models.CharField(max_length=255)
+    file_size = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'target'], name='api_botfilepatch_unique'),
+        ]
+    
+    @property
+    def file_name(self):
+        return f'{self.target.file_name}.{self.source.version}-{self.target.version}.patch'
+    
+    def __str__(self):
+        return f"{self.source} -> {self.target}"
+
+
 class UserBotConfiguration(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='bot_configurations')
     bot_product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='user_configurations')
@@ -149,13 +483,57 @@ class BotLicense(models.Model):
     activation_count = models.IntegerField(default=0)
     expiry_date = models.DateTimeField(blank=True, null=True)
     user_bot_configuration = models.ForeignKey(UserBotConfiguration, on_delete=models.SET_NULL, blank=True, null=True, related_name='licenses')
+    # The purchase this license was issued for; bulk issuance skips items that already have licenses
+    order_item = models.ForeignKey('OrderItem', on_delete=models.SET_NULL, blank=True, null=True, related_name='licenses')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            # Expiry sweeps: active licenses by expiry date
+            models.Index(fields=['status', 'expiry_date', 'id'], name='api_license_status_expiry_idx'),
+        ]
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'status' in field_names:
+            instance._saved_status = instance.status
+        return instance
+    
     def __str__(self):
         return f"{self.user.email} - {self.product.name} - {self.license_key}"
 
 
+class BotLicenseActivation(models.Model):
+    """One device a license is activated on. activation_count is kept equal to the number of rows."""
+    bot_license = models.ForeignKey(BotLicense, on_delete=models.CASCADE, related_name='activations')
+    fingerprint = models.CharField(max_length=128)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['bot_license', 'fingerprint'], name='api_license_activation_unique'),
+        ]
+    
+    def __str__(self):
+        return f"{self.bot_license.license_key} - {self.fingerprint}"
+
+
+class LicenseRevocation(models.Model):
+    """
+    Feed of revoked licenses and released device activations that bots holding
+    signed license tokens poll, by id, for what changed since their last fetch.
+    `digest` is api.license_tokens.revocation_digest() of the key (and fingerprint),
+    so the feed never publishes license keys.
+    """
+    digest = models.CharField(max_length=64)
+    revoked_at = models.DateTimeField(default=timezone.now, db_index=True)
+    
+    def __str__(self):
+        return self.digest
+
+
 class BotDownloadActivationLog(models.Model):
     ACTION_TYPE_CHOICES = [
         ('download', 'Download'),
@@ -170,12 +548,35 @@ class BotDownloadActivationLog(models.Model):
     action_type = models.CharField(max_length=20, choices=ACTION_TYPE_CHOICES)
     ip_address = models.CharField(max_length=45)
     device_info = models.TextField(blank=True, null=True)
-    log_timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the event happens, not when the batched writer inserts it (api.activity_log)
+    log_timestamp = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        indexes = [
+            # Monthly compaction and retention walk the table by time
+            models.Index(fields=['log_timestamp', 'id'], name='api_actlog_timestamp_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.email} - {self.action_type} - {self.log_timestamp}"
 
 
+class BotActivationLogSummary(models.Model):
+    """Event counts per license, action and month, left behind when old log rows are compacted."""
+    month = models.DateField()
+    bot_license = models.ForeignKey(BotLicense, on_delete=models.CASCADE, related_name='activation_log_summaries')
+    action_type = models.CharField(max_length=20, choices=BotDownloadActivationLog.ACTION_TYPE_CHOICES)
+    events = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['month', 'bot_license', 'action_type'], name='api_actlog_summary_unique'),
+        ]
+    
+    def __str__(self):
+        return f"{self.month:%Y-%m} - {self.bot_license_id} - {self.action_type}: {self.events}"
+
+
 class ProductReview(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reviews')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='product_reviews')
@@ -187,6 +588,34 @@ class ProductReview(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            # Paginated reviews endpoint, by recency and by rating
+            models.Index(fields=['product', 'is_approved', 'created_at', 'id'], name='api_review_product_recent_idx'),
+            models.Index(fields=['product', 'is_approved', 'rating', 'created_at', 'id'], name='api_review_product_rating_idx'),
+            # Partial twins for SQLite, see Product.Meta
+            models.Index(fields=['product', 'created_at', 'id'], name='api_review_approved_recent_idx',
+                         condition=models.Q(is_approved=True)),
+            models.Index(fields=['product', 'rating', 'created_at', 'id'], name='api_review_approved_rating_idx',
+                         condition=models.Q(is_approved=True)),
+        ]
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_rating_state()
+        return instance
+    
+    @property
+    def rating_state(self):
+        return (self.product_id, self.rating, self.is_approved)
+    
+    def remember_rating_state(self):
+        # What this row currently contributes to its product's rating aggregates
+        deferred = self.get_deferred_fields()
+        if not deferred.intersection({'product', 'product_id', 'rating', 'is_approved'}):
+            self._saved_rating_state = self.rating_state
+    
     def __str__(self):
         return f"{self.user.email} - {self.product.name} - {self.rating}"
 
@@ -224,6 +653,54 @@ class DigitalInventory(models.Model):
         return f"Inventory - {self.product.name}"
 
 
+class Coupon(models.Model):
+    DISCOUNT_TYPE_CHOICES = [
+        ('percentage', 'Percentage'),
+        ('fixed', 'Fixed Amount'),
+    ]
+    
+    code = models.CharField(max_length=50, unique=True)
+    discount_type = models.CharField(max_length=20, choices=DISCOUNT_TYPE_CHOICES)
+    value = models.DecimalField(max_digits=10, decimal_places=2)
+    currency = models.CharField(max_length=3, blank=True, null=True)
+    min_subtotal = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    max_uses = models.IntegerField(blank=True, null=True)
+    used_count = models.IntegerField(default=0)
+    valid_from = models.DateTimeField(blank=True, null=True)
+    valid_until = models.DateTimeField(blank=True, null=True)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def is_redeemable(self, subtotal, currency):
+        now = timezone.now()
+        if not self.is_active:
+            return False
+        if self.valid_from and now < self.valid_from:
+            return False
+        if self.valid_until and now > self.valid_until:
+            return False
+        if self.max_uses is not None and self.used_count >= self.max_uses:
+            return False
+        if self.min_subtotal is not None and subtotal < self.min_subtotal:
+            return False
+        # Fixed amounts are only meaningful in the currency they were issued in
+        if self.discount_type == 'fixed' and self.currency and self.currency != currency:
+            return False
+        return True
+    
+    def __str__(self):
+        return self.code
+
+
+class OrderQuerySet(models.QuerySet):
+    def with_items(self):
+        # OrderSerializer's nested items and their product names, in one extra query
+        return self.prefetch_related(
+            models.Prefetch('items', queryset=OrderItem.objects.select_related('product', 'product_bundle'))
+        )
+
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -254,9 +731,26 @@ class Order(models.Model):
     billing_address_id = models.IntegerField(blank=True, null=True)
     ip_address = models.CharField(max_length=45, blank=True, null=True)
     user_agent = models.TextField(blank=True, null=True)
+    # Set by the fulfil_order job once licenses and subscriptions have been issued
+    fulfilled_at = models.DateTimeField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = OrderQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            # Order history keyset pagination
+            models.Index(fields=['user', 'created_at', 'id'], name='api_order_user_created_idx'),
+        ]
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'payment_status' in field_names:
+            instance._saved_payment_status = instance.payment_status
+        return instance
+    
     def __str__(self):
         return self.order_number
 
@@ -295,5 +789,71 @@ class UserSubscription(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_payment_date', 'id'], name='api_sub_status_payment_idx'),
+            models.Index(fields=['status', 'end_date', 'id'], name='api_sub_status_end_idx'),
+            # Partial indexes holding only the rows renewal and expiry runs look at;
+            # MySQL has no partial indexes and uses the composite ones above
+            models.Index(
+                fields=['next_payment_date', 'id'], name='api_sub_renewal_due_idx',
+                condition=models.Q(status='active', auto_renew=True),
+            ),
+            models.Index(
+                fields=['end_date', 'id'], name='api_sub_expiry_due_idx',
+                condition=models.Q(status='active', auto_renew=False),
+            ),
+        ]
+    
     def __str__(self):
         return f"{self.user.email} - {self.subscription_plan.name}"
+
+
+class JobQuerySet(models.QuerySet):
+    def due(self, now=None):
+        return self.filter(status='queued', run_at__lte=now or timezone.now())
+    
+    def dead(self):
+        return self.filter(status='dead')
+    
+    def requeue(self):
+        """Put jobs (typically dead ones) back in the queue with a fresh attempt budget."""
+        return self.update(status='queued', attempts=0, run_at=timezone.now(), locked_by=None, locked_at=None)
+
+
+class Job(models.Model):
+    """
+    A unit of background work run by `manage.py run_workers` (see api.jobs).
+    Jobs that keep failing end up with status 'dead', which is the dead-letter list.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('dead', 'Dead'),
+    ]
+    
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True, null=True)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    objects = JobQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            # Workers poll for due jobs and reclaim expired leases
+            models.Index(fields=['status', 'run_at', 'id'], name='api_job_status_run_idx'),
+            models.Index(fields=['status', 'locked_at'], name='api_job_status_locked_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
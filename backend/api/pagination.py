@@ -0,0 +1,143 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a composite key, (created_at, id) unless the view
+    sets `keyset_ordering`. Each page is a bounded index range scan, so deep
+    pages cost the same as the first one and no COUNT(*) is issued. Views need
+    an index matching the ordering, which must end in a unique field.
+    """
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.page_queryset(queryset, request, view)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        return self.set_page([row async for row in self.page_queryset(queryset, request, view)])
+
+    def page_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = tuple(getattr(view, 'keyset_ordering', self.ordering))
+        self.position, self.reverse = self.decode_cursor(request, queryset.model)
+
+        ordering = self.ordering if not self.reverse else tuple(self.flip(field) for field in self.ordering)
+        queryset = queryset.order_by(*ordering)
+        if self.position is not None:
+            queryset = queryset.filter(self.after(ordering, self.position))
+        # One extra row tells us whether there is another page in this direction
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if self.reverse:
+            results.reverse()
+
+        self.page = results
+        self.has_next = has_more if not self.reverse else self.position is not None
+        self.has_previous = self.position is not None if not self.reverse else has_more
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def flip(self, field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    def after(self, ordering, position):
+        # Row-value comparison (a, b) > (x, y) spelled out for the ORM:
+        # a > x OR (a = x AND b > y), plus a redundant bound on the leading column
+        # so the database can turn it into a single index range scan.
+        fields = [field.lstrip('-') for field in ordering]
+        lookups = ['lt' if field.startswith('-') else 'gt' for field in ordering]
+        condition = Q()
+        for i, field in enumerate(fields):
+            term = Q(**{f'{field}__{lookups[i]}': position[i]})
+            for prior_field, prior_value in zip(fields[:i], position[:i]):
+                term &= Q(**{prior_field: prior_value})
+            condition |= term
+        leading_bound = Q(**{f'{fields[0]}__{lookups[0]}e': position[0]})
+        return leading_bound & condition
+
+    def position_of(self, instance):
+        return [getattr(instance, field.lstrip('-')) for field in self.ordering]
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            values = payload['p']
+            fields = [model._meta.get_field(field.lstrip('-')) for field in self.ordering]
+            if len(values) != len(fields) or None in values:
+                raise ValueError
+            position = [field.to_python(value) for field, value in zip(fields, values)]
+            reverse = bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def cursor_token(self, instance, reverse):
+        values = [
+            value.isoformat() if isinstance(value, datetime) else value
+            for value in self.position_of(instance)
+        ]
+        payload = json.dumps({'p': values, 'r': int(reverse)}, separators=(',', ':'), cls=DjangoJSONEncoder)
+        return urlsafe_b64encode(payload.encode('ascii')).decode('ascii')
+
+    def encode_cursor(self, instance, reverse):
+        token = self.cursor_token(instance, reverse)
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
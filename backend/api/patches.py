@@ -0,0 +1,115 @@
+"""
+Delta updates between bot releases.
+
+For every active BotFile, patches are built from each of the previous
+BOT_FILE_PATCH_HISTORY active releases of the same bot and file type, so a
+client a few versions behind can choose between stepping through consecutive
+patches and one direct patch. plan_update() picks the cheapest route by bytes
+and falls back to the full file when no route is smaller than it.
+"""
+import heapq
+import logging
+import os
+from pathlib import PurePosixPath
+
+import bsdiff4
+from django.conf import settings
+
+from api.downloads import bot_file_path, file_sha256, resolve_path
+from api.models import BotFile, BotFilePatch
+
+logger = logging.getLogger(__name__)
+
+
+def release_chains(bot_detail_id):
+    """Active files of a bot in release order, one list per file type."""
+    chains = {}
+    for bot_file in BotFile.objects.filter(bot_detail_id=bot_detail_id, is_active=True).order_by('created_at', 'id'):
+        chains.setdefault(bot_file.file_type, []).append(bot_file)
+    return list(chains.values())
+
+
+def patch_file_path(source, target):
+    return str(PurePosixPath(target.file_path).parent / 'patches' / f'{source.pk}-{target.pk}.bsdiff')
+
+
+def build_patch(source, target):
+    """Diff two releases on disk and record the patch; returns None when a release file is missing."""
+    source_path, target_path = bot_file_path(source), bot_file_path(target)
+    if not source_path.is_file() or not target_path.is_file():
+        logger.warning('Skipping patch %s -> %s: release file missing', source.pk, target.pk)
+        return None
+    relative_path = patch_file_path(source, target)
+    path = resolve_path(relative_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(path.name + '.partial')
+    bsdiff4.file_diff(str(source_path), str(target_path), str(partial))
+    os.replace(partial, path)
+    return BotFilePatch.objects.create(
+        source=source, target=target, file_path=relative_path, file_size=path.stat().st_size,
+        sha256=file_sha256(path),
+    )
+
+
+def build_patches(bot_detail_id):
+    """Build every missing patch of a bot; returns the new BotFilePatch rows."""
+    history = getattr(settings, 'BOT_FILE_PATCH_HISTORY', 5)
+    existing = set(
+        BotFilePatch.objects.filter(target__bot_detail_id=bot_detail_id).values_list('source_id', 'target_id')
+    )
+    built = []
+    for chain in release_chains(bot_detail_id):
+        for index, target in enumerate(chain):
+            for source in chain[max(index - history, 0):index]:
+                if (source.pk, target.pk) not in existing:
+                    patch = build_patch(source, target)
+                    if patch is not None:
+                        built.append(patch)
+    return built
+
+
+def plan_update(current, target):
+    """
+    The patches taking `current` to `target` with the fewest bytes to download,
+    or None when the full target file is at least as cheap or no route exists.
+    """
+    if current.pk == target.pk:
+        return []
+    edges = {}
+    patches = BotFilePatch.objects.filter(
+        target__bot_detail_id=target.bot_detail_id, source__is_active=True, target__is_active=True
+    ).select_related('source', 'target')
+    for patch in patches:
+        edges.setdefault(patch.source_id, []).append(patch)
+
+    # Dijkstra over releases, weighted by patch size
+    best = {current.pk: 0}
+    via = {}
+    queue = [(0, current.pk)]
+    while queue:
+        size, file_id = heapq.heappop(queue)
+        if file_id == target.pk:
+            break
+        if size > best[file_id]:
+            continue
+        for patch in edges.get(file_id, ()):
+            total = size + patch.file_size
+            if total < best.get(patch.target_id, float('inf')):
+                best[patch.target_id] = total
+                via[patch.target_id] = patch
+                heapq.heappush(queue, (total, patch.target_id))
+
+    if best.get(target.pk, float('inf')) >= target.file_size:
+        return None
+    route, file_id = [], target.pk
+    while file_id != current.pk:
+        route.append(via[file_id])
+        file_id = via[file_id].source_id
+    return route[::-1]
+
+
+def remove_patch_file(patch):
+    try:
+        os.unlink(bot_file_path(patch))
+    except FileNotFoundError:
+        pass
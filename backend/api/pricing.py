@@ -0,0 +1,112 @@
+import hashlib
+from collections import namedtuple
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.core.cache import cache
+
+from api.cache import current_version
+from api.models import Product, ProductBundle
+
+CENT = Decimal('0.01')
+
+CartLine = namedtuple('CartLine', ['kind', 'id', 'quantity'])
+LineTotal = namedtuple('LineTotal', ['kind', 'id', 'quantity', 'unit_price', 'subtotal'])
+Quote = namedtuple('Quote', ['lines', 'subtotal', 'discount', 'tax', 'total', 'currency', 'coupon'])
+
+
+class PricingError(Exception):
+    pass
+
+
+class CouponError(PricingError):
+    pass
+
+
+def money(value):
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+class PercentageTax:
+    def __init__(self, rate):
+        self.rate = Decimal(str(rate))
+
+    def __call__(self, taxable):
+        return money(taxable * self.rate)
+
+
+_tax_rules = {}
+
+
+def register_tax_rule(currency, rule):
+    """Install a callable taking the taxable amount and returning the tax for a currency."""
+    _tax_rules[currency.upper()] = rule
+
+
+def get_tax_rule(currency):
+    currency = currency.upper()
+    if currency not in _tax_rules:
+        rates = getattr(settings, 'PRICING_TAX_RATES', {})
+        rate = rates.get(currency, getattr(settings, 'PRICING_DEFAULT_TAX_RATE', '0'))
+        _tax_rules[currency] = PercentageTax(rate)
+    return _tax_rules[currency]
+
+
+def load_unit_prices(lines):
+    """
+    Effective unit price for every product and bundle in the cart, read with one
+    query per item type and cached per (item set, catalog version). The version
+    includes the version file, so changes saved by other workers are seen too.
+    """
+    product_ids = sorted({line.id for line in lines if line.kind == 'product'})
+    bundle_ids = sorted({line.id for line in lines if line.kind == 'bundle'})
+    digest = hashlib.md5(f'{product_ids}:{bundle_ids}'.encode()).hexdigest()
+    version, file_version = current_version()
+    cache_key = f'pricing:{version}:{file_version}:{digest}'
+    prices = cache.get(cache_key)
+    if prices is not None:
+        return prices
+
+    prices = {}
+    if product_ids:
+        rows = Product.objects.filter(id__in=product_ids, is_active=True).values_list('id', 'price', 'sale_price')
+        for product_id, price, sale_price in rows:
+            prices[('product', product_id)] = sale_price if sale_price else price
+    if bundle_ids:
+        rows = ProductBundle.objects.filter(id__in=bundle_ids, is_active=True).values_list('id', 'price')
+        for bundle_id, price in rows:
+            prices[('bundle', bundle_id)] = price
+    cache.set(cache_key, prices, getattr(settings, 'PRICING_CACHE_TIMEOUT', 300))
+    return prices
+
+
+def coupon_discount(coupon, subtotal, currency):
+    if coupon is None:
+        return Decimal('0.00')
+    if not coupon.is_redeemable(subtotal, currency):
+        raise CouponError(f'Coupon {coupon.code} cannot be applied to this order.')
+    if coupon.discount_type == 'percentage':
+        discount = money(subtotal * coupon.value / 100)
+    else:
+        discount = coupon.value
+    return min(discount, subtotal)
+
+
+def price_cart(lines, currency='USD', coupon=None):
+    """Price a whole cart in one call: line totals, coupon discount, tax and total."""
+    prices = load_unit_prices(lines)
+    missing = [line for line in lines if (line.kind, line.id) not in prices]
+    if missing:
+        raise PricingError(f'Unknown {missing[0].kind} {missing[0].id}.')
+
+    totals = []
+    subtotal = Decimal('0.00')
+    for line in lines:
+        unit_price = prices[(line.kind, line.id)]
+        line_subtotal = unit_price * line.quantity
+        subtotal += line_subtotal
+        totals.append(LineTotal(line.kind, line.id, line.quantity, unit_price, line_subtotal))
+
+    discount = coupon_discount(coupon, subtotal, currency)
+    tax = get_tax_rule(currency)(subtotal - discount)
+    return Quote(totals, subtotal, discount, tax, subtotal - discount + tax, currency, coupon)
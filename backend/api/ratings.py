@@ -0,0 +1,84 @@
+from collections import defaultdict
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import transaction
+from django.db.models import Count, F
+
+from api.cache import bump_catalog_version
+from api.models import Product, ProductReview
+
+STARS = range(1, 6)
+
+
+def rating_average(rating_sum, rating_count):
+    """
+    Mean rating to two places with ties rounded up, in Python so the incremental
+    and rebuild paths agree whatever the database's ROUND does with them.
+    """
+    if not rating_count:
+        return Decimal('0.00')
+    return (Decimal(rating_sum) / rating_count).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def adjust(product_id, rating, sign):
+    if rating not in STARS:
+        return
+    Product.objects.filter(pk=product_id).update(**{
+        'rating_count': F('rating_count') + sign,
+        'rating_sum': F('rating_sum') + sign * rating,
+        f'rating_count_{rating}': F(f'rating_count_{rating}') + sign,
+    })
+
+
+def apply_review_change(before, after):
+    """
+    Move a review's contribution from its `before` state to its `after` state.
+    Each state is a (product_id, rating, is_approved) tuple or None.
+    """
+    if before == after:
+        return
+    touched = set()
+    # The adjusting UPDATEs lock the rows, so the totals read back are not moved by a concurrent review
+    with transaction.atomic():
+        if before is not None and before[2]:
+            adjust(before[0], before[1], -1)
+            touched.add(before[0])
+        if after is not None and after[2]:
+            adjust(after[0], after[1], 1)
+            touched.add(after[0])
+        totals = Product.objects.filter(pk__in=touched).values_list('pk', 'rating_sum', 'rating_count')
+        for product_id, rating_sum, rating_count in totals:
+            Product.objects.filter(pk=product_id).update(rating_average=rating_average(rating_sum, rating_count))
+
+
+def rebuild_ratings(batch_size=1000):
+    """
+    Recompute every product's aggregates from one GROUP BY pass over approved reviews.
+    The queryset updates send no post_save, so the catalog version is bumped here.
+    """
+    histograms = defaultdict(lambda: dict.fromkeys(STARS, 0))
+    rows = (
+        ProductReview.objects.filter(is_approved=True, rating__in=STARS)
+        .values_list('product_id', 'rating')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    for product_id, rating, total in rows:
+        histograms[product_id][rating] = total
+
+    products = []
+    for product_id, histogram in histograms.items():
+        product = Product(pk=product_id)
+        product.rating_count = sum(histogram.values())
+        product.rating_sum = sum(star * count for star, count in histogram.items())
+        product.rating_average = rating_average(product.rating_sum, product.rating_count)
+        for star, count in histogram.items():
+            setattr(product, f'rating_count_{star}', count)
+        products.append(product)
+    fields = ['rating_count', 'rating_sum', 'rating_average'] + [f'rating_count_{star}' for star in STARS]
+    with transaction.atomic():
+        reset = {field: 0 for field in fields}
+        Product.objects.filter(rating_count__gt=0).update(**reset)
+        Product.objects.bulk_update(products, fields, batch_size=batch_size)
+        transaction.on_commit(bump_catalog_version)
+    return len(products)
@@ -0,0 +1,144 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+FTS_TABLE = 'api_product_fts'
+FULLTEXT_INDEX = 'api_product_fulltext'
+FULLTEXT_COLUMNS = 'name, short_description, description'
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+MAX_QUERY_TERMS = 8
+
+
+def tokenize(text):
+    return [token.lower() for token in TOKEN_RE.findall(text or '')][:MAX_QUERY_TERMS]
+
+
+class BaseSearchBackend:
+    """Filters a Product queryset by a search string, best matches first."""
+
+    def search(self, queryset, query):
+        raise NotImplementedError
+
+    def index_product(self, product):
+        pass
+
+    def remove_product(self, product_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class ScanSearchBackend(BaseSearchBackend):
+    """Unindexed substring scan, used when the database has no full-text support."""
+
+    def search(self, queryset, query):
+        return queryset.filter(
+            Q(name__icontains=query) |
+            Q(description__icontains=query) |
+            Q(short_description__icontains=query)
+        )
+
+
+class SQLiteFTS5SearchBackend(BaseSearchBackend):
+    """FTS5 virtual table keyed by product id, maintained from Product signals."""
+
+    # bm25 column weights for name, short_description, description
+    RANK = f'bm25({FTS_TABLE}, 10.0, 5.0, 1.0)'
+
+    def build_match(self, terms):
+        # Every term must match, the last one as a prefix so search-as-you-type works
+        quoted = [f'"{term}"' for term in terms]
+        quoted[-1] += '*'
+        return ' '.join(quoted)
+
+    def search(self, queryset, query):
+        terms = tokenize(query)
+        if not terms:
+            return queryset.none()
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = api_product.id', f'{FTS_TABLE} MATCH %s'],
+            params=[self.build_match(terms)],
+            select={'search_rank': self.RANK},
+            order_by=['search_rank'],
+        )
+
+    def index_product(self, product):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [product.pk])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, short_description, description) VALUES (%s, %s, %s, %s)',
+                [product.pk, product.name, product.short_description or '', product.description]
+            )
+
+    def remove_product(self, product_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [product_id])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, short_description, description) '
+                f"SELECT id, name, COALESCE(short_description, ''), description FROM api_product"
+            )
+
+
+class MySQLFullTextSearchBackend(BaseSearchBackend):
+    """InnoDB FULLTEXT index; MySQL keeps it current on every write."""
+
+    MATCH = f'MATCH ({FULLTEXT_COLUMNS}) AGAINST (%s IN BOOLEAN MODE)'
+    # InnoDB's default stopword list; these words are never indexed
+    STOPWORDS = frozenset((
+        'a about an are as at be by com de en for from how i in is it la of on or that the this to was what '
+        'when where who will with und www'
+    ).split())
+    # innodb_ft_min_token_size, read from the server on first use
+    min_token_size = None
+
+    def get_min_token_size(self):
+        if self.min_token_size is None:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT @@innodb_ft_min_token_size')
+                type(self).min_token_size = cursor.fetchone()[0]
+        return self.min_token_size
+
+    def build_match(self, terms):
+        # Requiring a word that is not indexed would match nothing, so short words and
+        # stopwords are left out. The last term is kept as a prefix, which MySQL looks
+        # up even when it is short or a stopword
+        *words, last = terms
+        min_size = self.get_min_token_size()
+        required = [f'+{term}' for term in words if len(term) >= min_size and term not in self.STOPWORDS]
+        required.append(f'+{last}*')
+        return ' '.join(required)
+
+    def search(self, queryset, query):
+        terms = tokenize(query)
+        if not terms:
+            return queryset.none()
+        match = self.build_match(terms)
+        return queryset.extra(
+            where=[self.MATCH],
+            params=[match],
+            select={'search_rank': self.MATCH},
+            select_params=[match],
+            order_by=['-search_rank'],
+        )
+
+
+VENDOR_BACKENDS = {
+    'sqlite': SQLiteFTS5SearchBackend,
+    'mysql': MySQLFullTextSearchBackend,
+}
+
+
+def get_search_backend():
+    backend_path = getattr(settings, 'PRODUCT_SEARCH_BACKEND', None)
+    if backend_path:
+        return import_string(backend_path)()
+    return VENDOR_BACKENDS.get(connection.vendor, ScanSearchBackend)()
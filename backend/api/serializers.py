@@ -1,8 +1,16 @@
+import os
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.urls import reverse
 from rest_framework import serializers
 from api.models import (
-    ProductCategory, Product, ProductSubscriptionPlan, SignalDetail, BotDetail,
-    ProductReview, ProductBundle, Order, OrderItem, UserSubscription
+    PRODUCT_DETAIL_REVIEW_LIMIT, ProductCategory, Product, ProductSubscriptionPlan, SignalDetail, Signal, BotDetail,
+    ProductReview, ProductBundle, Coupon, Order, OrderItem, UserSubscription, BotFile, BotFilePatch
 )
+from api.blobs import store_upload
+from api.pricing import CartLine, CouponError, PricingError, price_cart
 
 class ProductCategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -10,6 +18,17 @@ class ProductCategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'slug', 'description', 'parent', 'image_url', 'is_active', 'order_index']
 
 
+class ProductCategoryTreeSerializer(ProductCategorySerializer):
+    """Renders a node from ProductCategoryQuerySet.tree() with its subtree nested under `children`."""
+    children = serializers.SerializerMethodField()
+    
+    class Meta(ProductCategorySerializer.Meta):
+        fields = ProductCategorySerializer.Meta.fields + ['depth', 'children']
+    
+    def get_children(self, obj):
+        return ProductCategoryTreeSerializer(obj.tree_children, many=True, context=self.context).data
+
+
 class SignalDetailSerializer(serializers.ModelSerializer):
     class Meta:
         model = SignalDetail
@@ -17,6 +36,57 @@ class SignalDetailSerializer(serializers.ModelSerializer):
                   'signal_frequency', 'release_schedule_info']
 
 
+# The smallest price Signal's decimal fields hold
+MIN_PRICE = Decimal('0.00000001')
+# Units of one item per order, and the largest amount Order's and OrderItem's decimal fields hold
+MAX_ITEM_QUANTITY = 1000
+MAX_ORDER_AMOUNT = Decimal('99999999.99')
+
+
+class SignalSerializer(serializers.ModelSerializer):
+    """A published signal, as listed and as sent to live streams (api.signal_stream)."""
+    product = serializers.SlugRelatedField(slug_field='slug', read_only=True)
+    
+    class Meta:
+        model = Signal
+        fields = ['id', 'product', 'asset_pair', 'timeframe', 'side', 'entry_price', 'take_profit', 'stop_loss',
+                  'note', 'status', 'exit_price', 'profit_percentage', 'created_at', 'closed_at']
+        read_only_fields = ['status', 'exit_price', 'profit_percentage', 'closed_at']
+        # Profits are measured in percent of the entry, so prices must be positive
+        extra_kwargs = {
+            'entry_price': {'min_value': MIN_PRICE},
+            'take_profit': {'min_value': MIN_PRICE},
+            'stop_loss': {'min_value': MIN_PRICE},
+        }
+    
+    def validate(self, attrs):
+        entry, take_profit, stop_loss = attrs['entry_price'], attrs.get('take_profit'), attrs.get('stop_loss')
+        # A buy profits above its entry and stops out below it, a sell the other way round
+        sign = 1 if attrs['side'] == 'buy' else -1
+        if take_profit is not None and (take_profit - entry) * sign <= 0:
+            raise serializers.ValidationError({'take_profit': f"Must be past the entry price for a {attrs['side']}."})
+        if stop_loss is not None and (entry - stop_loss) * sign <= 0:
+            raise serializers.ValidationError({'stop_loss': f"Must be short of the entry price for a {attrs['side']}."})
+        return attrs
+
+
+class SignalCloseSerializer(serializers.Serializer):
+    """Closes an open signal at `exit_price`, or cancels it when there is none."""
+    exit_price = serializers.DecimalField(max_digits=20, decimal_places=8, min_value=0, required=False)
+    
+    def validate(self, attrs):
+        if self.instance.status != 'open':
+            raise serializers.ValidationError(f'The signal is already {self.instance.status}.')
+        if self.instance.entry_price <= 0:
+            raise serializers.ValidationError('The signal has no positive entry price to measure a profit against.')
+        return attrs
+    
+    def update(self, instance, validated_data):
+        instance.close(validated_data.get('exit_price'))
+        instance.save(update_fields=['status', 'exit_price', 'profit_percentage', 'closed_at'])
+        return instance
+
+
 class BotDetailSerializer(serializers.ModelSerializer):
     class Meta:
         model = BotDetail
@@ -46,8 +116,10 @@ class ProductSerializer(serializers.ModelSerializer):
     category_name = serializers.SerializerMethodField()
     signal_detail = SignalDetailSerializer(read_only=True)
     bot_detail = BotDetailSerializer(read_only=True)
-    reviews = ProductReviewSerializer(many=True, read_only=True)
-    subscription_plans = ProductSubscriptionPlanSerializer(many=True, read_only=True)
+    reviews = serializers.SerializerMethodField()
+    subscription_plans = serializers.SerializerMethodField()
+    rating_average = serializers.DecimalField(max_digits=3, decimal_places=2, coerce_to_string=False, read_only=True)
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
     
     class Meta:
         model = Product
@@ -55,10 +127,38 @@ class ProductSerializer(serializers.ModelSerializer):
                   'short_description', 'price', 'sale_price', 'image_url', 
                   'additional_images', 'is_featured', 'is_active', 'product_type', 
                   'signal_detail', 'bot_detail', 'reviews', 'subscription_plans', 
+                  'rating_average', 'rating_count', 'rating_histogram',
                   'created_at', 'updated_at']
     
     def get_category_name(self, obj):
         return obj.category.name
+    
+    def get_reviews(self, obj):
+        # Only the latest approved reviews; the full list is paginated by the reviews endpoint
+        reviews = getattr(obj, 'latest_reviews', None)
+        if reviews is None:
+            reviews = obj.reviews.filter(is_approved=True).select_related('user').order_by(
+                '-created_at', '-id'
+            )[:PRODUCT_DETAIL_REVIEW_LIMIT]
+        return ProductReviewSerializer(reviews, many=True, context=self.context).data
+    
+    def get_subscription_plans(self, obj):
+        # Active plans only; views pass the snapshot's product id -> plans map in the context
+        plans = self.context.get('subscription_plans')
+        if plans is not None:
+            return plans.get(obj.id, ())
+        return ProductSubscriptionPlanSerializer(
+            obj.subscription_plans.filter(is_active=True).order_by('id'), many=True
+        ).data
+
+
+class ProductListSerializer(serializers.ModelSerializer):
+    rating_average = serializers.DecimalField(max_digits=3, decimal_places=2, coerce_to_string=False, read_only=True)
+    
+    class Meta:
+        model = Product
+        fields = ['id', 'name', 'slug', 'category', 'short_description', 'price', 'sale_price',
+                  'image_url', 'is_featured', 'product_type', 'rating_average', 'rating_count']
 
 
 class ProductBundleSerializer(serializers.ModelSerializer):
@@ -98,67 +198,91 @@ class OrderSerializer(serializers.ModelSerializer):
 
 class OrderCreateSerializer(serializers.ModelSerializer):
     items = serializers.ListField(write_only=True)
+    coupon_code = serializers.CharField(write_only=True, required=False, allow_blank=True)
     
     class Meta:
         model = Order
-        fields = ['payment_method', 'currency', 'notes', 'items']
+        fields = ['payment_method', 'currency', 'notes', 'items', 'coupon_code']
+    
+    def validate_items(self, items):
+        if not items:
+            raise serializers.ValidationError("An order needs at least one item.")
+        
+        lines = []
+        for item in items:
+            if not isinstance(item, dict) or ('product_id' in item) == ('product_bundle_id' in item):
+                raise serializers.ValidationError("Each item needs exactly one of product_id or product_bundle_id.")
+            try:
+                quantity = int(item.get('quantity', 1))
+                object_id = int(item.get('product_id', item.get('product_bundle_id')))
+            except (TypeError, ValueError):
+                raise serializers.ValidationError("Item ids and quantities must be integers.")
+            if quantity < 1:
+                raise serializers.ValidationError("Item quantity must be at least 1.")
+            if quantity > MAX_ITEM_QUANTITY:
+                raise serializers.ValidationError(f"Item quantity must be at most {MAX_ITEM_QUANTITY}.")
+            lines.append(CartLine('product' if 'product_id' in item else 'bundle', object_id, quantity))
+        return lines
+    
+    def validate(self, attrs):
+        coupon = None
+        coupon_code = attrs.pop('coupon_code', '')
+        if coupon_code:
+            coupon = Coupon.objects.filter(code=coupon_code).first()
+            if coupon is None:
+                raise serializers.ValidationError({"coupon_code": "Unknown coupon."})
+        
+        # Price the whole cart in one batched call; unknown items fail here
+        try:
+            attrs['quote'] = price_cart(attrs['items'], attrs.get('currency', 'USD'), coupon)
+        except CouponError as e:
+            raise serializers.ValidationError({"coupon_code": str(e)})
+        except PricingError as e:
+            raise serializers.ValidationError({"items": str(e)})
+        quote = attrs['quote']
+        amounts = [quote.subtotal, quote.tax, quote.total] + [line.subtotal for line in quote.lines]
+        if max(amounts) > MAX_ORDER_AMOUNT:
+            raise serializers.ValidationError({"items": f"Order totals must not exceed {MAX_ORDER_AMOUNT}."})
+        return attrs
     
     def create(self, validated_data):
-        items_data = validated_data.pop('items')
-        user = self.context['request'].user
+        validated_data.pop('items')
+        quote = validated_data.pop('quote')
+        user = validated_data.pop('user', None) or self.context['request'].user
         
         # Generate order number
         import uuid
         order_number = f"ORD-{uuid.uuid4().hex[:8].upper()}"
         
-        # Calculate totals
-        subtotal = 0
-        for item in items_data:
-            if 'product_id' in item:
-                product = Product.objects.get(id=item['product_id'])
-                price = product.sale_price if product.sale_price else product.price
-                item_subtotal = price * item['quantity']
-                subtotal += item_subtotal
-            elif 'product_bundle_id' in item:
-                bundle = ProductBundle.objects.get(id=item['product_bundle_id'])
-                item_subtotal = bundle.price * item['quantity']
-                subtotal += item_subtotal
-        
-        # Apply tax (example: 10%)
-        tax = subtotal * 0.1
-        total = subtotal + tax
-        
-        # Create order
-        order = Order.objects.create(
-            user=user,
-            order_number=order_number,
-            subtotal=subtotal,
-            tax=tax,
-            total=total,
-            **validated_data
-        )
-        
-        # Create order items
-        for item in items_data:
-            if 'product_id' in item:
-                product = Product.objects.get(id=item['product_id'])
-                price = product.sale_price if product.sale_price else product.price
-                OrderItem.objects.create(
-                    order=order,
-                    product=product,
-                    quantity=item['quantity'],
-                    price=price,
-                    subtotal=price * item['quantity']
-                )
-            elif 'product_bundle_id' in item:
-                bundle = ProductBundle.objects.get(id=item['product_bundle_id'])
-                OrderItem.objects.create(
+        with transaction.atomic():
+            if quote.coupon is not None:
+                # Conditional increment so concurrent checkouts cannot overrun max_uses
+                redeemed = Coupon.objects.filter(pk=quote.coupon.pk).filter(
+                    Q(max_uses__isnull=True) | Q(used_count__lt=F('max_uses'))
+                ).update(used_count=F('used_count') + 1)
+                if not redeemed:
+                    raise serializers.ValidationError({"coupon_code": "Coupon has been fully redeemed."})
+            
+            order = Order.objects.create(
+                user=user,
+                order_number=order_number,
+                subtotal=quote.subtotal,
+                discount=quote.discount,
+                tax=quote.tax,
+                total=quote.total,
+                **validated_data
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(
                     order=order,
-                    product_bundle=bundle,
-                    quantity=item['quantity'],
-                    price=bundle.price,
-                    subtotal=bundle.price * item['quantity']
+                    product_id=line.id if line.kind == 'product' else None,
+                    product_bundle_id=line.id if line.kind == 'bundle' else None,
+                    quantity=line.quantity,
+                    price=line.unit_price,
+                    subtotal=line.subtotal,
                 )
+                for line in quote.lines
+            ])
         
         return order
 
@@ -178,3 +302,66 @@ class UserSubscriptionSerializer(serializers.ModelSerializer):
     
     def get_product_name(self, obj):
         return obj.subscription_plan.product.name
+
+
+class LicenseRequestSerializer(serializers.Serializer):
+    license_key = serializers.CharField(max_length=100)
+    fingerprint = serializers.CharField(max_length=128, required=False)
+
+
+class LicenseStateSerializer(serializers.Serializer):
+    """Serializes the cached license state dicts of api.licenses."""
+    license_key = serializers.CharField()
+    product = serializers.CharField(source='product__slug')
+    status = serializers.CharField()
+    expiry_date = serializers.DateTimeField()
+    activation_limit = serializers.IntegerField()
+    activation_count = serializers.IntegerField()
+
+
+class EntitlementSerializer(serializers.Serializer):
+    """Serializes the entitlement dicts of api.entitlements."""
+    product_id = serializers.IntegerField()
+    slug = serializers.CharField()
+    name = serializers.CharField()
+    product_type = serializers.CharField()
+    sources = serializers.ListField(child=serializers.CharField())
+    expires_at = serializers.DateTimeField(allow_null=True)
+
+
+class BotFilePatchSerializer(serializers.ModelSerializer):
+    from_version = serializers.CharField(source='source.version')
+    to_version = serializers.CharField(source='target.version')
+    download_url = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = BotFilePatch
+        fields = ['id', 'from_version', 'to_version', 'file_size', 'sha256', 'download_url']
+    
+    def get_download_url(self, obj):
+        return self.context['request'].build_absolute_uri(reverse('bot-file-patch-download', args=[obj.pk]))
+
+
+class BotFileUploadSerializer(serializers.ModelSerializer):
+    """Admin upload of a bot release; the content is kept in the blob store (api.blobs)."""
+    file = serializers.FileField(write_only=True)
+    
+    class Meta:
+        model = BotFile
+        fields = ['id', 'bot_detail', 'file', 'file_name', 'file_type', 'version', 'is_active', 'file_size',
+                  'sha256', 'created_at']
+        read_only_fields = ['file_name', 'file_size', 'sha256', 'created_at']
+        # A multipart form leaving out a checkbox would otherwise mean False
+        extra_kwargs = {'is_active': {'default': True}}
+    
+    def create(self, validated_data):
+        upload = validated_data.pop('file')
+        file_name = os.path.basename(upload.name)
+        # Not read for blob-backed files; patches between releases are placed next to it
+        file_path = f"{validated_data['bot_detail'].product.slug}/{validated_data['version']}/{file_name}"
+        # The blob stays locked until the reference to it is counted
+        with transaction.atomic():
+            blob = store_upload(upload)
+            return BotFile.objects.create(
+                blob=blob, file_name=file_name, file_path=file_path, file_size=blob.size, **validated_data
+            )
@@ -0,0 +1,185 @@
+"""
+Signal history for analytics: each product's track record and a columnar read path.
+
+Recent signals live in the Signal table, appended in id order and range-scanned
+through api_signal_series_idx. `manage.py compact_signal_history` moves finished
+signals out of it once they are old, one SignalHistoryChunk per product, asset
+pair, timeframe and month, holding the month's signals as compressed NumPy
+columns. signal_series() reads both and returns columns (name -> array), so an
+analysis over months of signals decodes a few chunks instead of building a
+model instance per signal.
+
+A product's success rate and average profit are computed from its closed
+signals, rows and chunks alike, and written to its SignalDetail whenever a
+signal is closed or cancelled.
+"""
+import io
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+import numpy as np
+from django.db.models import Count, Q, Sum
+
+from api.dates import add_months, month_start
+from api.models import Signal, SignalDetail, SignalHistoryChunk
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+ONE_MICROSECOND = timedelta(microseconds=1)
+NOT_A_TIME = np.iinfo(np.int64).min
+
+SIDES = {'buy': 1, 'sell': -1}
+STATUSES = {status: code for code, (status, _) in enumerate(Signal.STATUS_CHOICES)}
+# Stored in chunks; asset_pair and timeframe are the chunk's own and are added on read
+ROW_FIELDS = (
+    'id', 'created_at', 'closed_at', 'side', 'status', 'entry_price', 'exit_price', 'profit_percentage'
+)
+COLUMNS = ROW_FIELDS + ('asset_pair', 'timeframe')
+# The largest value SignalDetail's decimal fields hold
+DETAIL_LIMIT = Decimal('999.99')
+
+
+def to_micros(value):
+    return NOT_A_TIME if value is None else (value - EPOCH) // ONE_MICROSECOND
+
+
+def to_columns(rows, asset_pair=None, timeframe=None):
+    """Columns for rows of ROW_FIELDS values, followed by asset_pair and timeframe unless both are given."""
+    rows = list(rows)
+    count = len(rows)
+    values = list(zip(*rows)) if rows else [()] * len(COLUMNS)
+
+    def floats(index):
+        return np.array([np.nan if value is None else float(value) for value in values[index]], dtype=np.float64)
+
+    def times(index):
+        return np.array([to_micros(value) for value in values[index]], dtype=np.int64).view('datetime64[us]')
+
+    columns = {
+        'id': np.array(values[0], dtype=np.int64),
+        'created_at': times(1),
+        'closed_at': times(2),
+        'side': np.array([SIDES[value] for value in values[3]], dtype=np.int8),
+        'status': np.array([STATUSES[value] for value in values[4]], dtype=np.int8),
+        'entry_price': floats(5),
+        'exit_price': floats(6),
+        'profit_percentage': floats(7),
+    }
+    if asset_pair is None:
+        columns['asset_pair'], columns['timeframe'] = np.array(values[8], 'U30'), np.array(values[9], 'U10')
+    else:
+        columns['asset_pair'] = np.full(count, asset_pair, 'U30')
+        columns['timeframe'] = np.full(count, timeframe, 'U10')
+    return columns
+
+
+def encode_columns(columns):
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **{name: columns[name] for name in ROW_FIELDS})
+    return buffer.getvalue()
+
+
+def decode_columns(data, asset_pair, timeframe):
+    with np.load(io.BytesIO(bytes(data))) as archive:
+        columns = {name: archive[name] for name in ROW_FIELDS}
+    count = len(columns['id'])
+    columns['asset_pair'] = np.full(count, asset_pair, 'U30')
+    columns['timeframe'] = np.full(count, timeframe, 'U10')
+    return columns
+
+
+def concatenate(parts):
+    if not parts:
+        return to_columns([])
+    columns = {name: np.concatenate([part[name] for part in parts]) for name in COLUMNS}
+    order = np.argsort(columns['created_at'], kind='stable')
+    return {name: values[order] for name, values in columns.items()}
+
+
+def chunk_totals(columns):
+    """(signals, closed, wins, profit sum) of a chunk's columns."""
+    closed = columns['status'] == STATUSES['closed']
+    profits = columns['profit_percentage'][closed]
+    return len(columns['id']), int(closed.sum()), int((profits > 0).sum()), float(profits.sum())
+
+
+def append_to_chunk(product_id, asset_pair, timeframe, month, columns):
+    """Merge finished signals into their month's chunk; call inside a transaction."""
+    chunk = SignalHistoryChunk.objects.select_for_update().filter(
+        product_id=product_id, asset_pair=asset_pair, timeframe=timeframe, month=month
+    ).first()
+    if chunk is None:
+        chunk = SignalHistoryChunk(product_id=product_id, asset_pair=asset_pair, timeframe=timeframe, month=month)
+    else:
+        columns = concatenate([decode_columns(chunk.columns, asset_pair, timeframe), columns])
+    chunk.signal_count, chunk.closed_count, chunk.win_count, chunk.profit_sum = chunk_totals(columns)
+    chunk.columns = encode_columns(columns)
+    chunk.save()
+    return chunk
+
+
+def signal_series(product, asset_pair=None, timeframe=None, since=None, until=None):
+    """
+    Columns of a product's signals created in [since, until), oldest first:
+    id, created_at and closed_at (datetime64[us] in UTC, NaT while open), side
+    (1 buy, -1 sell), status (codes of STATUSES), entry_price, exit_price and
+    profit_percentage (float64, NaN until closed), asset_pair and timeframe.
+    """
+    product_id = getattr(product, 'pk', product)
+    rows = Signal.objects.filter(product_id=product_id)
+    chunks = SignalHistoryChunk.objects.filter(product_id=product_id)
+    if asset_pair is not None:
+        rows, chunks = rows.filter(asset_pair=asset_pair), chunks.filter(asset_pair=asset_pair)
+    if timeframe is not None:
+        rows, chunks = rows.filter(timeframe=timeframe), chunks.filter(timeframe=timeframe)
+    if since is not None:
+        rows, chunks = rows.filter(created_at__gte=since), chunks.filter(month__gte=month_start(since).date())
+    if until is not None:
+        last_month = add_months(month_start(until), 1).date()
+        rows, chunks = rows.filter(created_at__lt=until), chunks.filter(month__lt=last_month)
+
+    parts = [
+        decode_columns(data, chunk_pair, chunk_timeframe)
+        for chunk_pair, chunk_timeframe, data in chunks.values_list('asset_pair', 'timeframe', 'columns').iterator()
+    ]
+    parts.append(to_columns(rows.values_list(*ROW_FIELDS, 'asset_pair', 'timeframe')))
+    columns = concatenate(parts)
+
+    # Chunks hold whole months
+    created = columns['created_at'].view(np.int64)
+    keep = np.ones(len(created), dtype=bool)
+    if since is not None:
+        keep &= created >= to_micros(since)
+    if until is not None:
+        keep &= created < to_micros(until)
+    return {name: values[keep] for name, values in columns.items()}
+
+
+def signal_performance(product):
+    """(success rate, average profit) of the product's closed signals, both percentages; Nones without any."""
+    product_id = getattr(product, 'pk', product)
+    recent = Signal.objects.filter(product_id=product_id, status='closed').aggregate(
+        closed=Count('id'), wins=Count('id', filter=Q(profit_percentage__gt=0)), profit=Sum('profit_percentage')
+    )
+    compacted = SignalHistoryChunk.objects.filter(product_id=product_id).aggregate(
+        closed=Sum('closed_count'), wins=Sum('win_count'), profit=Sum('profit_sum')
+    )
+    closed = recent['closed'] + (compacted['closed'] or 0)
+    if not closed:
+        return None, None
+    wins = recent['wins'] + (compacted['wins'] or 0)
+    profit = float(recent['profit'] or 0) + (compacted['profit'] or 0)
+    success_rate = Decimal(100 * wins / closed).quantize(Decimal('0.01'))
+    average_profit = Decimal(profit / closed).quantize(Decimal('0.01'))
+    return success_rate, max(-DETAIL_LIMIT, min(average_profit, DETAIL_LIMIT))
+
+
+def refresh_signal_detail(product_id):
+    """Write the product's track record to its SignalDetail; saved only when it changed."""
+    detail = SignalDetail.objects.filter(product_id=product_id).first()
+    if detail is None:
+        return None
+    success_rate, average_profit = signal_performance(product_id)
+    if (detail.success_rate, detail.average_profit_percentage) != (success_rate, average_profit):
+        detail.success_rate, detail.average_profit_percentage = success_rate, average_profit
+        detail.save(update_fields=['success_rate', 'average_profit_percentage'])
+    return detail
@@ -0,0 +1,333 @@
+"""
+Live signal delivery over Server-Sent Events and WebSockets (ASGI only).
+
+Each worker process has one SignalHub, with a channel per signal product.
+Connections subscribe to the channel of the product they stream. One poller
+task per process picks up new Signal rows, one query per SIGNAL_POLL_INTERVAL
+however many connections are open, encodes each signal once and hands the
+same frame to every subscriber of its product. A signal published through
+this process wakes the poller at once; other workers pick it up on their next
+poll, so no broker is needed between them.
+
+A subscriber buffers at most SIGNAL_SUBSCRIBER_BUFFER frames. One that falls
+further behind is dropped instead of holding up the rest: its stream ends,
+and the client reconnects with the last id it saw (the Last-Event-ID header,
+or `last_id` on the WebSocket URL), which replays what it missed from the
+database. Connections are also ended after SIGNAL_STREAM_MAX_AGE seconds and
+as soon as a periodic check finds the user has lost access.
+
+Signal ids are not committed in order, so frames are not always in id order:
+a signal committed late is still delivered if it shows up within
+SIGNAL_POLL_LAG seconds. A reconnect replays the last SIGNAL_POLL_LAG seconds
+at or below the client's last id as well, and clients drop ids they already have.
+"""
+import asyncio
+import logging
+import re
+from collections import deque, namedtuple
+from datetime import timedelta
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+
+from api.entitlements import has_access
+from api.models import Product, Signal
+from api.serializers import SignalSerializer
+
+logger = logging.getLogger(__name__)
+
+Frame = namedtuple('Frame', ['id', 'product_id', 'data', 'event'])
+
+WEBSOCKET_PATH = re.compile(r'^/ws/signals/(?P<slug>[-\w]+)/$')
+# Close codes: 1013 (try again later) asks a dropped or expired connection to reconnect
+CLOSE_UNAUTHORIZED, CLOSE_FORBIDDEN, CLOSE_NOT_FOUND, CLOSE_RECONNECT = 4401, 4403, 4404, 1013
+POLL_BATCH_SIZE = 500
+
+
+class SlowConsumer(Exception):
+    pass
+
+
+def encode_signal(signal):
+    """A signal's frame, JSON for WebSockets and an SSE event, built once for all subscribers."""
+    data = JSONRenderer().render(SignalSerializer(signal).data)
+    return Frame(signal.pk, signal.product_id, data, b'id: %d\nevent: signal\ndata: %s\n\n' % (signal.pk, data))
+
+
+async def latest_signal_id():
+    return (await Signal.objects.aaggregate(last=Max('id')))['last'] or 0
+
+
+class Subscriber:
+    def __init__(self, product_id, limit):
+        self.product_id = product_id
+        self.limit = limit
+        self.frames = deque()
+        self.dropped = False
+        self.ready = asyncio.Event()
+
+    def push(self, frame):
+        if self.dropped:
+            return
+        if len(self.frames) >= self.limit:
+            self.dropped = True
+            self.frames.clear()
+        else:
+            self.frames.append(frame)
+        self.ready.set()
+
+    async def next(self, timeout=None):
+        """The next frame, or None after `timeout` seconds without one. Raises SlowConsumer once dropped."""
+        if not self.frames and not self.dropped:
+            self.ready.clear()
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        if self.dropped:
+            raise SlowConsumer
+        return self.frames.popleft()
+
+
+class SignalHub:
+    """
+    Ids are handed out at insert but become visible at commit, so a signal may
+    appear below `last_id` after the poll that moved past it. Ids above
+    `settled_id`, the last id polled SIGNAL_POLL_LAG seconds ago, are checked
+    again on every poll, and `published` keeps each from going out twice.
+    """
+    def __init__(self):
+        self._loop = None
+        self.channels = {}
+        self.last_id = self.settled_id = None
+        self.published = set()
+        self._polled = deque()
+
+    async def subscribe(self, product_id):
+        """
+        Join a product's channel. Every signal with an id above `last_id` as it
+        stands on return is delivered to the subscriber.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # First use on this event loop (tests run one per test); nothing carries over
+            self._loop, self.channels, self.last_id, self.settled_id = loop, {}, None, None
+            self.published, self._polled = set(), deque()
+            self._wakeup, self._started = asyncio.Event(), asyncio.Event()
+            self._poller = loop.create_task(self._run())
+        await self._started.wait()
+        if not self.channels:
+            # The poller idles without subscribers; what was published meanwhile had no audience
+            self.last_id = self.settled_id = max(self.last_id, await latest_signal_id())
+            self.published.clear()
+            self._polled.clear()
+        subscriber = Subscriber(product_id, getattr(settings, 'SIGNAL_SUBSCRIBER_BUFFER', 100))
+        self.channels.setdefault(product_id, set()).add(subscriber)
+        self._wakeup.set()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        channel = self.channels.get(subscriber.product_id)
+        if channel is not None:
+            channel.discard(subscriber)
+            if not channel:
+                del self.channels[subscriber.product_id]
+
+    def publish(self, frame):
+        """Hand a frame to every subscriber of its product; returns how many got it."""
+        channel = self.channels.get(frame.product_id, ())
+        for subscriber in channel:
+            subscriber.push(frame)
+        return len(channel)
+
+    def notify(self):
+        """Poll now instead of at the next interval. Safe to call from any thread."""
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def poll(self, batch_size=POLL_BATCH_SIZE):
+        """Publish signals committed since the last poll; returns how many new ids were found."""
+        now = self._loop.time()
+        lag = getattr(settings, 'SIGNAL_POLL_LAG', 5)
+        while self._polled and self._polled[0][0] <= now - lag:
+            self.settled_id = self._polled.popleft()[1]
+        self.published = {pk for pk in self.published if pk > self.settled_id}
+
+        late = []
+        if self.last_id > self.settled_id:
+            # A primary key range scan; only ids missed so far are fetched
+            unsettled = Signal.objects.filter(id__gt=self.settled_id, id__lt=self.last_id)
+            missed = [pk async for pk in unsettled.values_list('id', flat=True) if pk not in self.published]
+            if missed:
+                late = [
+                    signal async for signal in
+                    Signal.objects.filter(id__in=missed).select_related('product').order_by('id')
+                ]
+        signals = [
+            signal async for signal in
+            Signal.objects.filter(id__gt=self.last_id).select_related('product').order_by('id')[:batch_size]
+        ]
+        for signal in late + signals:
+            self.publish(encode_signal(signal))
+            self.published.add(signal.pk)
+        if signals:
+            self.last_id = signals[-1].pk
+        self._polled.append((now, self.last_id))
+        return len(signals)
+
+    async def _run(self):
+        self.last_id = self.settled_id = await latest_signal_id()
+        self._started.set()
+        interval = getattr(settings, 'SIGNAL_POLL_INTERVAL', 0.5)
+        while True:
+            self._wakeup.clear()
+            found = 0
+            if self.channels:
+                try:
+                    found = await self.poll()
+                except Exception:
+                    logger.exception('Polling for new signals failed')
+            # A full batch means more are waiting; with no subscribers, sleep until one comes
+            if found < POLL_BATCH_SIZE:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), interval if self.channels else None)
+                except asyncio.TimeoutError:
+                    pass
+
+
+signal_hub = SignalHub()
+
+
+async def signal_frames(user_id, product_id, last_id=None):
+    """
+    Frames for one connection: the product's signals after `last_id` from the
+    database, then live ones as they are published. Access is rechecked every
+    SIGNAL_HEARTBEAT_INTERVAL seconds, busy or not, and None is yielded then
+    as a keep-alive. Ends after SIGNAL_STREAM_MAX_AGE seconds. Raises
+    PermissionDenied once the user has lost access and SlowConsumer when the
+    connection fell too far behind.
+    """
+    loop = asyncio.get_running_loop()
+    closes_at = loop.time() + getattr(settings, 'SIGNAL_STREAM_MAX_AGE', 300)
+    subscriber = await signal_hub.subscribe(product_id)
+    # Ids sent on this connection; the hub publishes late commits below ids it already sent
+    sent = set()
+    try:
+        if last_id is not None:
+            # Signals committed late may sit below the client's last id; those from the last
+            # SIGNAL_POLL_LAG seconds are sent again, and clients drop ids they already have
+            recent = timezone.now() - timedelta(seconds=getattr(settings, 'SIGNAL_POLL_LAG', 5))
+            late = Signal.objects.filter(product_id=product_id, id__lte=last_id, created_at__gte=recent)
+            async for signal in late.select_related('product').order_by('id'):
+                sent.add(signal.pk)
+                yield encode_signal(signal)
+        # Read in pages while live frames queue up; those already sent are skipped below
+        cursor = last_id
+        replay_limit = getattr(settings, 'SIGNAL_REPLAY_LIMIT', 500)
+        while cursor is not None:
+            signals = [
+                signal async for signal in
+                Signal.objects.filter(product_id=product_id, id__gt=cursor).select_related('product')
+                .order_by('id')[:replay_limit]
+            ]
+            for signal in signals:
+                cursor = signal.pk
+                sent.add(signal.pk)
+                yield encode_signal(signal)
+            if len(signals) < replay_limit:
+                break
+
+        heartbeat = getattr(settings, 'SIGNAL_HEARTBEAT_INTERVAL', 15)
+        check_at = loop.time() + heartbeat
+        while True:
+            now = loop.time()
+            if now >= closes_at:
+                return
+            if now >= check_at:
+                # Subscriptions run out while connections stay open, however busy the product is
+                if not await sync_to_async(has_access)(user_id, product_id):
+                    raise exceptions.PermissionDenied('An active subscription to this product is required.')
+                check_at = now + heartbeat
+                # The hub never publishes settled ids again
+                sent = {pk for pk in sent if pk > signal_hub.settled_id}
+                yield None
+                continue
+            frame = await subscriber.next(min(check_at, closes_at) - now)
+            if frame is not None and frame.id not in sent:
+                sent.add(frame.id)
+                yield frame
+    finally:
+        signal_hub.unsubscribe(subscriber)
+
+
+async def resolve_stream(user, slug):
+    """The signal product `user` may stream; raises NotFound or PermissionDenied."""
+    product = await Product.objects.filter(slug=slug, product_type='signal').only('id').afirst()
+    if product is None:
+        raise exceptions.NotFound()
+    if not await sync_to_async(has_access)(user.pk, product.pk):
+        raise exceptions.PermissionDenied('An active subscription to this product is required.')
+    return product
+
+
+async def websocket_application(scope, receive, send):
+    """
+    ASGI app for `/ws/signals/<slug>/?token=<JWT access token>&last_id=<id>`,
+    sending each signal as a JSON text message.
+    """
+    from api.async_views import AsyncJWTAuthentication
+
+    if (await receive())['type'] != 'websocket.connect':
+        return
+    match = WEBSOCKET_PATH.match(scope['path'])
+    if match is None:
+        await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+        return
+    query = parse_qs(scope.get('query_string', b'').decode())
+    try:
+        user = await AsyncJWTAuthentication().aauthenticate_token(query.get('token', [''])[0].encode())
+        product = await resolve_stream(user, match['slug'])
+        last_id = int(query['last_id'][0]) if 'last_id' in query else None
+    except (exceptions.NotAuthenticated, exceptions.AuthenticationFailed):
+        await send({'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED})
+        return
+    except exceptions.PermissionDenied:
+        await send({'type': 'websocket.close', 'code': CLOSE_FORBIDDEN})
+        return
+    except (exceptions.NotFound, ValueError):
+        await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+        return
+
+    await send({'type': 'websocket.accept'})
+
+    async def deliver():
+        code = CLOSE_RECONNECT
+        try:
+            async for frame in signal_frames(user.pk, product.pk, last_id):
+                if frame is not None:
+                    await send({'type': 'websocket.send', 'text': frame.data.decode()})
+        except exceptions.PermissionDenied:
+            code = CLOSE_FORBIDDEN
+        except SlowConsumer:
+            pass
+        await send({'type': 'websocket.close', 'code': code})
+
+    delivery = asyncio.ensure_future(deliver())
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    await asyncio.wait([delivery, disconnected], return_when=asyncio.FIRST_COMPLETED)
+    for task in (delivery, disconnected):
+        task.cancel()
+    # Lets the stream leave its channel before the connection is gone
+    await asyncio.gather(delivery, disconnected, return_exceptions=True)
+
+
+async def wait_for_disconnect(receive):
+    # Clients have nothing to say; their messages are read and ignored
+    while (await receive())['type'] != 'websocket.disconnect':
+        pass
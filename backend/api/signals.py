@@ -0,0 +1,151 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from api.blobs import release, retain
+from api.cache import bump_catalog_version
+from api.entitlements import bump_entitlement_version, invalidate_entitlements
+from api.downloads import update_file_metadata
+from api.jobs import enqueue
+from api.licenses import invalidate_license, record_revocation
+from api.patches import remove_patch_file
+from api.models import (
+    ProductCategory, Product, ProductSubscriptionPlan, SignalDetail, BotDetail, ProductReview,
+    ProductBundle, ProductBundleItem, Order, UserSubscription, BotLicense, BotFile, BotFilePatch, Signal
+)
+from api.ratings import apply_review_change
+from api.search import get_search_backend
+from api.signal_history import refresh_signal_detail
+from users.models import UserKYCDocument
+
+# Bundles carry no public endpoint yet but their prices feed the pricing cache
+CATALOG_MODELS = [
+    ProductCategory, Product, ProductSubscriptionPlan, SignalDetail, BotDetail, ProductReview, ProductBundle
+]
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    get_search_backend().index_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    get_search_backend().remove_product(instance.pk)
+
+
+@receiver(post_save, sender=ProductReview)
+def update_rating_aggregates(sender, instance, created, **kwargs):
+    before = None if created else getattr(instance, '_saved_rating_state', None)
+    apply_review_change(before, instance.rating_state)
+    instance._saved_rating_state = instance.rating_state
+
+
+@receiver(post_delete, sender=ProductReview)
+def remove_rating_aggregates(sender, instance, **kwargs):
+    apply_review_change(getattr(instance, '_saved_rating_state', instance.rating_state), None)
+
+
+@receiver(post_save, sender=Signal)
+def refresh_signal_track_record(sender, instance, **kwargs):
+    # Open signals do not count towards the product's success rate and profit
+    if instance.status != 'open':
+        transaction.on_commit(lambda: refresh_signal_detail(instance.product_id))
+
+
+@receiver(post_save, sender=Order)
+def queue_order_fulfilment(sender, instance, created, **kwargs):
+    # Enqueued in the saving transaction: if the payment update rolls back, so does the job
+    previous = None if created else getattr(instance, '_saved_payment_status', None)
+    if instance.payment_status == 'paid' and previous != 'paid' and instance.fulfilled_at is None:
+        enqueue('fulfil_order', order_id=instance.pk)
+    instance._saved_payment_status = instance.payment_status
+
+
+@receiver(post_save, sender=BotLicense)
+@receiver(post_delete, sender=BotLicense)
+def invalidate_license_state(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_license(instance.license_key))
+
+
+@receiver(post_save, sender=BotLicense)
+def revoke_license_tokens(sender, instance, created, **kwargs):
+    # Tokens already handed out stay valid offline until the bots see the revocation
+    if not created and getattr(instance, '_saved_status', None) == 'active' and instance.status != 'active':
+        record_revocation(instance.license_key)
+    instance._saved_status = instance.status
+
+
+@receiver(post_delete, sender=BotLicense)
+def revoke_deleted_license_tokens(sender, instance, **kwargs):
+    record_revocation(instance.license_key)
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+@receiver(post_save, sender=UserSubscription)
+@receiver(post_delete, sender=UserSubscription)
+@receiver(post_save, sender=BotLicense)
+@receiver(post_delete, sender=BotLicense)
+def invalidate_user_entitlements(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_entitlements(instance.user_id))
+
+
+@receiver(post_save, sender=ProductBundleItem)
+@receiver(post_delete, sender=ProductBundleItem)
+@receiver(m2m_changed, sender=ProductBundle.products.through)
+def invalidate_bundle_entitlements(sender, action=None, **kwargs):
+    # Everyone who bought the bundle is affected, so all entries move to a new version
+    if action is None or action.startswith('post_'):
+        transaction.on_commit(bump_entitlement_version)
+
+
+@receiver(pre_save, sender=BotFile)
+def hash_bot_file(sender, instance, **kwargs):
+    # Rehashed when the row points at other content, so the download ETag follows the file
+    source = (instance.file_path, instance.blob_id)
+    if instance.sha256 and getattr(instance, '_hashed_source', None) == source:
+        return
+    if not update_file_metadata(instance):
+        # Not on disk yet; the download view queues hash_bot_file once it is requested
+        instance.sha256 = ''
+    instance._hashed_source = source
+
+
+@receiver(post_save, sender=BotFile)
+def queue_bot_file_patches(sender, instance, **kwargs):
+    enqueue('build_bot_file_patches', bot_detail_id=instance.bot_detail_id)
+
+
+@receiver(post_delete, sender=BotFilePatch)
+def delete_bot_file_patch(sender, instance, **kwargs):
+    transaction.on_commit(lambda: remove_patch_file(instance))
+
+
+@receiver(post_save, sender=BotFile)
+@receiver(post_save, sender=UserKYCDocument)
+def count_blob_references(sender, instance, created, **kwargs):
+    previous = None if created else getattr(instance, '_saved_blob_id', None)
+    if instance.blob_id != previous:
+        if instance.blob_id:
+            retain(instance.blob_id)
+        if previous:
+            release(previous)
+    instance._saved_blob_id = instance.blob_id
+
+
+@receiver(post_delete, sender=BotFile)
+@receiver(post_delete, sender=UserKYCDocument)
+def release_blob_reference(sender, instance, **kwargs):
+    if instance.blob_id:
+        release(instance.blob_id)
+
+
+def invalidate_catalog_cache(sender, **kwargs):
+    # Bump after commit so no reader can cache pre-commit rows under the new version
+    transaction.on_commit(bump_catalog_version)
+
+
+for model in CATALOG_MODELS:
+    post_save.connect(invalidate_catalog_cache, sender=model, dispatch_uid=f'catalog-cache-save-{model.__name__}')
+    post_delete.connect(invalidate_catalog_cache, sender=model, dispatch_uid=f'catalog-cache-delete-{model.__name__}')
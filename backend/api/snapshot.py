@@ -0,0 +1,124 @@
+import logging
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from api.cache import current_version
+from api.models import ProductCategory, Product, ProductSubscriptionPlan, category_tree
+from api.pagination import KeysetPagination
+from api.serializers import (
+    ProductCategorySerializer, ProductCategoryTreeSerializer, ProductListSerializer,
+    ProductSubscriptionPlanSerializer
+)
+
+logger = logging.getLogger(__name__)
+
+# Serialized, read-only view of the small catalog tables every page needs.
+# `categories` maps slug -> category, `plans` maps product id -> its active plans.
+CatalogSnapshot = namedtuple('CatalogSnapshot', ['version', 'category_tree', 'categories', 'plans', 'featured_products'])
+
+
+def freeze(data):
+    # Tuples for every list; dicts stay plain so responses built from them still pickle
+    # into the response cache. The lookup maps themselves are wrapped read-only.
+    if isinstance(data, dict):
+        return {key: freeze(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return tuple(freeze(value) for value in data)
+    return data
+
+
+def build_snapshot(version):
+    categories = list(ProductCategory.objects.filter(is_active=True).order_by('order_index', 'id'))
+    plans = {}
+    rows = ProductSubscriptionPlan.objects.filter(is_active=True, product__is_active=True).order_by('id')
+    for plan, data in zip(rows, ProductSubscriptionPlanSerializer(rows, many=True).data):
+        plans.setdefault(plan.product_id, []).append(data)
+    featured = (
+        Product.objects.active().for_listing().filter(is_featured=True)
+        .order_by(*KeysetPagination.ordering)
+    )
+    return CatalogSnapshot(
+        version=version,
+        category_tree=freeze(ProductCategoryTreeSerializer(category_tree(categories), many=True).data),
+        categories=MappingProxyType({
+            category['slug']: freeze(category) for category in ProductCategorySerializer(categories, many=True).data
+        }),
+        plans=MappingProxyType({product_id: freeze(rows) for product_id, rows in plans.items()}),
+        featured_products=freeze(ProductListSerializer(featured, many=True).data),
+    )
+
+
+class CatalogSnapshotStore:
+    """
+    Holds one worker's CatalogSnapshot. The catalog version is checked at most
+    once per CATALOG_SNAPSHOT_CHECK_INTERVAL; when it has moved, the snapshot is
+    rebuilt on a background thread while requests keep reading the old one.
+    Only the very first snapshot of a worker is built on the request path.
+    """
+
+    def __init__(self):
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._rebuilding = False
+
+    def get(self):
+        snapshot = self._snapshot
+        now = time.monotonic()
+        interval = getattr(settings, 'CATALOG_SNAPSHOT_CHECK_INTERVAL', 1.0)
+        if snapshot is not None and now - self._checked_at < interval:
+            return snapshot
+
+        self._checked_at = now
+        version = current_version()
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+        if snapshot is None or not getattr(settings, 'CATALOG_SNAPSHOT_BACKGROUND_REBUILD', True):
+            return self.refresh(version)
+        self.rebuild_in_background(version)
+        return snapshot
+
+    async def aget(self):
+        # Fresh snapshots are returned without leaving the event loop; checking the
+        # version or building the first snapshot runs in a thread
+        snapshot = self._snapshot
+        interval = getattr(settings, 'CATALOG_SNAPSHOT_CHECK_INTERVAL', 1.0)
+        if snapshot is not None and time.monotonic() - self._checked_at < interval:
+            return snapshot
+        return await sync_to_async(self.get)()
+
+    def refresh(self, version=None):
+        # Read the version before the data: a write racing the build leaves the
+        # snapshot labelled too old, which only costs an extra rebuild
+        snapshot = build_snapshot(current_version() if version is None else version)
+        self._snapshot = snapshot
+        return snapshot
+
+    def rebuild_in_background(self, version):
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._rebuild, args=(version,), name='catalog-snapshot', daemon=True).start()
+
+    def _rebuild(self, version):
+        try:
+            self.refresh(version)
+        except Exception:
+            logger.exception('Catalog snapshot rebuild failed; serving the previous snapshot')
+        finally:
+            connections.close_all()
+            self._rebuilding = False
+
+    def clear(self):
+        self._snapshot = None
+        self._checked_at = 0.0
+
+
+catalog_snapshot = CatalogSnapshotStore()
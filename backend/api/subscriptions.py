@@ -0,0 +1,134 @@
+"""
+Subscription renewals and expiry, run by `manage.py process_subscriptions`.
+
+Due subscriptions are walked in keyset batches over the partial indexes
+api_sub_renewal_due_idx and api_sub_expiry_due_idx, one transaction per batch.
+A renewal creates a pending Order for one billing cycle and moves end_date and
+next_payment_date forward by that cycle; the order is fulfilled like any other
+once paid, which records the payment on the subscription. Renewal order numbers
+are derived from the subscription and the date being billed, and a batch's
+orders commit together with its date changes, so an interrupted run is simply
+started again and never bills a period twice.
+"""
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from api.dates import add_months
+from api.entitlements import invalidate_entitlements
+from api.models import Order, OrderItem, ProductSubscriptionPlan, UserSubscription
+from api.pricing import get_tax_rule
+
+# Times a batch is tried when a concurrent run keeps billing part of it first
+RENEWAL_ATTEMPTS = 3
+
+
+def renewal_order_number(subscription):
+    return f'RNW-{subscription.pk}-{subscription.next_payment_date:%Y%m%d%H%M%S}'
+
+
+def due_batches(queryset, date_field, now, batch_size):
+    """Yield lists of due rows ordered by (date_field, id), each fetched after the previous one was handled."""
+    cursor = None
+    while True:
+        rows = queryset.filter(**{f'{date_field}__lte': now})
+        if cursor is not None:
+            rows = rows.filter(Q(**{f'{date_field}__gt': cursor[0]}) | Q(**{date_field: cursor[0], 'id__gt': cursor[1]}))
+        batch = list(rows.order_by(date_field, 'id')[:batch_size])
+        if not batch:
+            return
+        # Taken before the caller moves the batch's dates
+        cursor = (getattr(batch[-1], date_field), batch[-1].id)
+        yield batch
+
+
+def renew_batch(subscriptions, now):
+    """Bill one cycle of each subscription and roll its dates forward; returns the number of orders created."""
+    numbers = {subscription.pk: renewal_order_number(subscription) for subscription in subscriptions}
+    # Periods billed before a crash or by a concurrent run are rolled forward without a second order
+    billed = set(Order.objects.filter(order_number__in=numbers.values()).values_list('order_number', flat=True))
+    currency = getattr(settings, 'SUBSCRIPTION_RENEWAL_CURRENCY', 'USD')
+    tax_rule = get_tax_rule(currency)
+
+    orders, items = [], []
+    for subscription in subscriptions:
+        plan = subscription.subscription_plan
+        months = ProductSubscriptionPlan.BILLING_CYCLE_MONTHS[plan.billing_cycle]
+        period_start = subscription.next_payment_date
+        if numbers[subscription.pk] not in billed:
+            tax = tax_rule(plan.price)
+            orders.append(Order(
+                user_id=subscription.user_id, order_number=numbers[subscription.pk], subtotal=plan.price, tax=tax,
+                total=plan.price + tax, currency=currency, notes=f'Renewal of subscription {subscription.pk}',
+            ))
+            items.append(OrderItem(
+                product_id=plan.product_id, quantity=1, price=plan.price, subtotal=plan.price,
+                metadata={
+                    'subscription_plan_id': plan.pk, 'renews_subscription_id': subscription.pk,
+                    'period_start': period_start.isoformat(),
+                },
+            ))
+        subscription.next_payment_date = add_months(period_start, months)
+        subscription.end_date = add_months(max(subscription.end_date, period_start), months)
+
+    Order.objects.bulk_create(orders)
+    # MySQL returns no primary keys from bulk inserts
+    order_ids = dict(Order.objects.filter(
+        order_number__in=[order.order_number for order in orders]
+    ).values_list('order_number', 'id'))
+    for order, item in zip(orders, items):
+        item.order_id = order_ids[order.order_number]
+    OrderItem.objects.bulk_create(items)
+    # Each row gets its own dates (months differ in length), so these go out as one CASE per field
+    UserSubscription.objects.bulk_update(subscriptions, ['next_payment_date', 'end_date'])
+    UserSubscription.objects.filter(pk__in=numbers).update(updated_at=now)
+    # bulk_update() sends no signals, and cached entitlements still hold the old end dates
+    user_ids = {subscription.user_id for subscription in subscriptions}
+    transaction.on_commit(lambda: invalidate_entitlements(*user_ids))
+    return len(orders)
+
+
+def renew_due(now, batch_size=1000):
+    """
+    Renew every auto-renewing subscription whose next payment is due; returns
+    (renewals, orders created). Each pass bills one cycle per subscription, and
+    passes repeat until nothing is due, so a subscription several cycles behind
+    gets an order per missed cycle.
+    """
+    due = UserSubscription.objects.filter(status='active', auto_renew=True).select_related('subscription_plan')
+    renewed = created = 0
+    while True:
+        renewed_in_pass = 0
+        for batch in due_batches(due, 'next_payment_date', now, batch_size):
+            for attempt in range(1, RENEWAL_ATTEMPTS + 1):
+                try:
+                    with transaction.atomic():
+                        created += renew_batch(batch, now)
+                    break
+                except IntegrityError:
+                    # Only a concurrent run billing some of these first is retried; its orders are now visible
+                    numbers = [renewal_order_number(subscription) for subscription in batch]
+                    if attempt == RENEWAL_ATTEMPTS or not Order.objects.filter(order_number__in=numbers).exists():
+                        raise
+                    batch = list(due.filter(
+                        pk__in=[subscription.pk for subscription in batch], next_payment_date__lte=now
+                    ))
+            renewed_in_pass += len(batch)
+        if not renewed_in_pass:
+            return renewed, created
+        renewed += renewed_in_pass
+
+
+def expire_due(now, batch_size=1000):
+    """Expire active subscriptions that will not renew and have ended; returns how many were expired."""
+    due = UserSubscription.objects.filter(status='active', auto_renew=False).only('id', 'user_id', 'end_date')
+    expired = 0
+    for batch in due_batches(due.filter(end_date__lt=now), 'end_date', now, batch_size):
+        # Conditional, so a subscription switched back to auto-renew meanwhile is left alone
+        expired += UserSubscription.objects.filter(
+            id__in=[subscription.id for subscription in batch], status='active', auto_renew=False, end_date__lt=now
+        ).update(status='expired', updated_at=now)
+        # update() sends no signals
+        user_ids = {subscription.user_id for subscription in batch}
+        transaction.on_commit(lambda user_ids=user_ids: invalidate_entitlements(*user_ids))
+    return expired
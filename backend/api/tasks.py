@@ -0,0 +1,115 @@
+"""Background job handlers, run by `manage.py run_workers`."""
+from django.conf import settings
+from django.core.mail import send_mail
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+from api.dates import add_months
+from api.downloads import update_file_metadata
+from api.jobs import enqueue, register_job
+from api.licenses import issue_licenses
+from api.patches import build_patches
+from api.models import BotFile, Order, ProductSubscriptionPlan, UserSubscription
+from users.models import User
+
+
+@register_job('send_email')
+def send_email(subject, message, recipient_list, from_email=None):
+    send_mail(subject, message, from_email or settings.DEFAULT_FROM_EMAIL, recipient_list, fail_silently=False)
+
+
+@register_job('send_password_reset')
+def send_password_reset(user_id):
+    # The link is made here rather than passed in, so it is never stored in the job's payload
+    user = User.objects.filter(pk=user_id, is_active=True).first()
+    if user is None:
+        return
+    token = get_random_string(length=32)
+    reset_link = f"https://pyscalp.com/reset-password?token={token}"
+    send_mail(
+        'Password Reset Request', f'Click the following link to reset your password: {reset_link}',
+        settings.DEFAULT_FROM_EMAIL, [user.email], fail_silently=False,
+    )
+
+
+@register_job('fulfil_order')
+def fulfil_order(order_id):
+    """
+    Issue what a paid order bought: a license per bot product unit and a
+    subscription per product with an active plan, or the payment of a renewed
+    subscription, then queue the receipt.
+    Runs in one transaction and is a no-op once the order is fulfilled, so
+    retries never issue twice.
+    """
+    order = Order.objects.select_for_update().select_related('user').get(pk=order_id)
+    if order.fulfilled_at is not None:
+        return
+    now = timezone.now()
+
+    items = list(order.items.select_related('product', 'product_bundle').prefetch_related('product_bundle__products'))
+    purchases = []
+    for item in items:
+        if item.product is not None:
+            purchases.append((item, item.product))
+        elif item.product_bundle is not None:
+            purchases.extend((item, product) for product in item.product_bundle.products.all())
+
+    # A plan named in the item's metadata wins over the product's cheapest active plan
+    plans = {}
+    product_ids = {product.id for _, product in purchases}
+    for plan in ProductSubscriptionPlan.objects.filter(product_id__in=product_ids, is_active=True).order_by('price', 'id'):
+        plans.setdefault(plan.product_id, plan)
+    requested = ProductSubscriptionPlan.objects.in_bulk(
+        {(item.metadata or {}).get('subscription_plan_id') for item, _ in purchases} - {None}
+    )
+
+    subscriptions, renewals = [], set()
+    for item, product in purchases:
+        renews = (item.metadata or {}).get('renews_subscription_id')
+        if renews is not None:
+            # Billed by process_subscriptions, which already moved the subscription's dates
+            renewals.add(renews)
+            continue
+        plan = requested.get((item.metadata or {}).get('subscription_plan_id'))
+        if plan is None or plan.product_id != product.id:
+            plan = plans.get(product.id)
+        if plan is not None:
+            end_date = add_months(now, ProductSubscriptionPlan.BILLING_CYCLE_MONTHS[plan.billing_cycle] * item.quantity)
+            subscriptions.append(UserSubscription(
+                user=order.user, subscription_plan=plan, status='active', start_date=now, end_date=end_date,
+                last_payment_date=now, next_payment_date=end_date,
+            ))
+    licenses = issue_licenses([order])
+    UserSubscription.objects.bulk_create(subscriptions)
+    UserSubscription.objects.filter(pk__in=renewals, user=order.user).update(last_payment_date=now, updated_at=now)
+
+    order.fulfilled_at = now
+    order.status = 'completed'
+    order.save(update_fields=['fulfilled_at', 'status', 'updated_at'])
+
+    lines = [
+        f'{item.quantity} x {item.product or item.product_bundle or "Removed item"}: {item.subtotal}' for item in items
+    ]
+    lines += [f'License key for {license.product.name}: {license.license_key}' for license in licenses]
+    enqueue(
+        'send_email',
+        subject=f'Receipt for order {order.order_number}',
+        message='\n'.join(lines + [f'Total: {order.total} {order.currency}']),
+        recipient_list=[order.user.email],
+    )
+
+
+@register_job('build_bot_file_patches')
+def build_bot_file_patches(bot_detail_id):
+    build_patches(bot_detail_id)
+
+
+@register_job('hash_bot_file')
+def hash_bot_file(bot_file_id):
+    bot_file = BotFile.objects.filter(pk=bot_file_id, sha256='').first()
+    if bot_file is None:
+        return
+    if not update_file_metadata(bot_file):
+        # Retried with backoff until the file has been copied into place
+        raise FileNotFoundError(f'{bot_file.file_path} not found')
+    BotFile.objects.filter(pk=bot_file.pk).update(sha256=bot_file.sha256, file_size=bot_file.file_size)
@@ -1,3 +1,1709 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import json
+import os
+import random
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import bsdiff4
+import jwt
+import numpy as np
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from cryptography.hazmat.primitives.serialization import Encoding, NoEncryption, PrivateFormat
+
+from asgiref.sync import sync_to_async
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from users.models import User
+from api.models import (
+    ProductCategory, Product, ProductSubscriptionPlan, SignalDetail, Signal, BotDetail,
+    ProductReview, ProductBundle, Coupon, Order, Job, BotLicense, BotLicenseActivation,
+    BotDownloadActivationLog, BotActivationLogSummary, LicenseRevocation, UserSubscription, BotFile,
+    BotFilePatch, Blob, SignalHistoryChunk
+)
+from api.blobs import blob_path
+from api.activity_log import ActivationLogWriter, activation_log, replay_segments
+from api.cache import (
+    CATALOG_VERSION_KEY, bump_catalog_version, bump_catalog_version_file, get_catalog_version,
+    read_catalog_version_file,
+)
+from api.license_tokens import (
+    private_key, revocation_digest, sign_license_token, timestamp_us, verify_license_token,
+)
+from api.licenses import get_license_state, issue_licenses
+from api.jobs import (
+    claim, enqueue, new_worker_id, purge_finished, reclaim_expired, register_job, renew_leases, run_job,
+)
+from api.ratings import rebuild_ratings
+from api.search import MySQLFullTextSearchBackend, tokenize
+from api.entitlements import get_entitlements, has_access, invalidate_entitlements
+from api.signal_history import STATUSES, signal_performance, signal_series
+from api.signal_stream import (
+    Frame, SignalHub, SlowConsumer, Subscriber, signal_frames, signal_hub, websocket_application
+)
+from api.snapshot import catalog_snapshot
+from api.subscriptions import RENEWAL_ATTEMPTS, renew_due, renewal_order_number
+from api.dates import add_months
+from api.pricing import CartLine, CouponError, PercentageTax, price_cart, register_tax_rule
+
+LICENSE_TOKEN_PRIVATE_KEY = Ed25519PrivateKey.generate().private_bytes(
+    Encoding.PEM, PrivateFormat.PKCS8, NoEncryption()
+).decode()
+
+
+def create_user(index=0, **extra_fields):
+    return User.objects.create_user(
+        email=f'user{index}@example.com',
+        username=f'user{index}',
+        full_name=f'User {index}',
+        password='s3cret-pass',
+        **extra_fields
+    )
+
+
+def create_product(category, index=0, **extra_fields):
+    fields = {
+        'category': category,
+        'name': f'Product {index}',
+        'slug': f'product-{index}',
+        'description': f'Description for product {index}',
+        'price': Decimal('100.00'),
+        'product_type': 'signal',
+    }
+    fields.update(extra_fields)
+    return Product.objects.create(**fields)
+
+
+class CacheIsolatedTestCase(TestCase):
+    """
+    Drops everything cached once a test is over: rolling its writes back sends no
+    signals and lets the next test reuse its ids. Nothing is cleared while a test
+    runs, so a write that leaves a stale entry behind fails the test.
+    """
+
+    def tearDown(self):
+        cache.clear()
+        super().tearDown()
+
+
+@override_settings(CATALOG_SNAPSHOT_CHECK_INTERVAL=0, CATALOG_SNAPSHOT_BACKGROUND_REBUILD=False)
+class CatalogTestCase(CacheIsolatedTestCase):
+    def setUp(self):
+        catalog_snapshot.clear()
+        self.client = APIClient()
+        self.category = ProductCategory.objects.create(name='Crypto', slug='crypto')
+
+
+class CatalogQueryBudgetTests(CatalogTestCase):
+
+    def populate(self, products, reviews_per_product):
+        users = [create_user(i) for i in range(reviews_per_product)]
+        for i in range(products):
+            product = create_product(self.category, index=i)
+            SignalDetail.objects.create(product=product, asset_pairs=['BTC/USDT'], timeframes=['1h'])
+            BotDetail.objects.create(
+                product=product, supported_exchanges=['binance'], supported_assets=['BTC'],
+                risk_level='low', automation_type='fully_automated', version='1.0'
+            )
+            ProductSubscriptionPlan.objects.create(
+                product=product, name='Monthly', price=Decimal('10.00'),
+                billing_cycle='monthly', features=[]
+            )
+            for user in users:
+                ProductReview.objects.create(product=product, user=user, rating=5, is_approved=True)
+            ProductReview.objects.create(product=product, user=users[0], rating=1, is_approved=False)
+
+    def test_product_list_query_count_is_fixed(self):
+        # a single keyset page query with the rating summary, no COUNT(*)
+        self.populate(products=15, reviews_per_product=4)
+        catalog_snapshot.refresh()
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('product-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 15)
+
+    def test_product_list_uses_slim_projection(self):
+        self.populate(products=1, reviews_per_product=3)
+        response = self.client.get(reverse('product-list'))
+        product = response.data['results'][0]
+        self.assertNotIn('description', product)
+        self.assertNotIn('reviews', product)
+        self.assertNotIn('subscription_plans', product)
+        self.assertEqual(product['rating_count'], 3)
+        self.assertEqual(product['rating_average'], 5)
+
+    def test_product_detail_only_includes_approved_reviews(self):
+        self.populate(products=1, reviews_per_product=3)
+        response = self.client.get(reverse('product-detail', kwargs={'slug': 'product-0'}))
+        reviews = response.data['reviews']
+        self.assertEqual(len(reviews), 3)
+        self.assertTrue(all(review['rating'] == 5 for review in reviews))
+
+    def test_product_detail_query_count_is_fixed(self):
+        self.populate(products=1, reviews_per_product=5)
+        catalog_snapshot.refresh()
+        # product with its one-to-one details, then the latest reviews; plans come from the snapshot
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('product-detail', kwargs={'slug': 'product-0'}))
+        self.assertEqual(response.status_code, 200)
+
+
+class ProductSearchTests(CatalogTestCase):
+    def search(self, query):
+        response = self.client.get(reverse('product-list'), {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [product['slug'] for product in response.data['results']]
+
+    def test_prefix_match_ranks_name_hits_first(self):
+        create_product(self.category, index=1, description='A bitcoin scalping strategy')
+        create_product(self.category, index=2, name='Bitcoin Scalper', description='Fast entries')
+        create_product(self.category, index=3, name='Gold Trend', description='Follows gold')
+        self.assertEqual(self.search('bitc'), ['product-2', 'product-1'])
+        self.assertEqual(self.search('bitcoin scal'), ['product-2', 'product-1'])
+
+    def test_index_follows_product_saves_and_deletes(self):
+        product = create_product(self.category, index=1, name='Grid Bot')
+        self.assertEqual(self.search('grid'), ['product-1'])
+        # Cached responses are dropped when the write commits
+        with self.captureOnCommitCallbacks(execute=True):
+            product.name = 'Momentum Bot'
+            product.save()
+        self.assertEqual(self.search('grid'), [])
+        self.assertEqual(self.search('momentum'), ['product-1'])
+        with self.captureOnCommitCallbacks(execute=True):
+            product.delete()
+        self.assertEqual(self.search('momentum'), [])
+
+    def test_punctuation_only_query_returns_nothing(self):
+        create_product(self.category, index=1)
+        self.assertEqual(self.search('"*'), [])
+
+    def test_mysql_only_requires_indexed_words(self):
+        backend = MySQLFullTextSearchBackend()
+        backend.min_token_size = 3
+        self.assertEqual(backend.build_match(tokenize('ai bot')), '+bot*')
+        self.assertEqual(backend.build_match(tokenize('the scalper')), '+scalper*')
+        self.assertEqual(backend.build_match(tokenize('grid bot for btc')), '+grid +bot +btc*')
+        self.assertEqual(backend.build_match(tokenize('ai')), '+ai*')
+
+
+class CatalogResponseCacheTests(CatalogTestCase):
+    def test_repeat_request_is_served_without_queries(self):
+        create_product(self.category, index=1)
+        first = self.client.get(reverse('product-list'), {'type': 'signal', 'page': '1'})
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse('product-list'), {'page': '1', 'type': 'signal'})
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_catalog_write_invalidates_cached_responses(self):
+        product = create_product(self.category, index=1)
+        url = reverse('product-detail', kwargs={'slug': product.slug})
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            product.name = 'Renamed'
+            product.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['name'], 'Renamed')
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_matching_etag_returns_not_modified(self):
+        url = reverse('category-list')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        created_at = timezone.now()
+        orders = [
+            Order(user=self.user, order_number=f'ORD-{i:05d}', subtotal=0, total=0)
+            for i in range(45)
+        ]
+        Order.objects.bulk_create(orders)
+        # Several orders share a timestamp so the id tiebreaker is exercised
+        for i, order in enumerate(Order.objects.order_by('id')):
+            Order.objects.filter(pk=order.pk).update(created_at=created_at - timedelta(minutes=i // 3))
+
+    def test_walks_every_order_once_newest_first(self):
+        seen = []
+        url = reverse('order-list')
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            seen.extend(order['order_number'] for order in response.data['results'])
+            url = response.data['next']
+        expected = list(Order.objects.order_by('-created_at', '-id').values_list('order_number', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_previous_link_returns_preceding_page(self):
+        first = self.client.get(reverse('order-list'), {'page_size': 10})
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(back.data['results'], first.data['results'])
+        self.assertIsNone(back.data['previous'])
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get(reverse('order-list'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+
+class OrderCreateTests(CacheIsolatedTestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        category = ProductCategory.objects.create(name='Crypto', slug='crypto')
+        self.products = [
+            create_product(category, index=i, sale_price=Decimal('80.00') if i % 2 else None)
+            for i in range(20)
+        ]
+        self.bundle = ProductBundle.objects.create(name='Starter', price=Decimal('150.00'))
+
+    def checkout(self, items):
+        return self.client.post(reverse('order-create'), {'items': items, 'payment_method': 'card'}, format='json')
+
+    def test_query_count_does_not_grow_with_cart_size(self):
+        # products, bundles, savepoint, order, items, release
+        bundle_line = {'product_bundle_id': self.bundle.id, 'quantity': 1}
+        small_cart = [{'product_id': self.products[0].id, 'quantity': 1}, bundle_line]
+        large_cart = [{'product_id': product.id, 'quantity': 2} for product in self.products] + [bundle_line]
+        with self.assertNumQueries(6):
+            self.assertEqual(self.checkout(small_cart).status_code, 201)
+        with self.assertNumQueries(6):
+            self.assertEqual(self.checkout(large_cart).status_code, 201)
+
+    def test_totals_use_sale_price_and_exact_tax(self):
+        response = self.checkout([
+            {'product_id': self.products[0].id, 'quantity': 2},
+            {'product_id': self.products[1].id, 'quantity': 1},
+            {'product_bundle_id': self.bundle.id, 'quantity': 1},
+        ])
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(user=self.user)
+        self.assertEqual(order.subtotal, Decimal('430.00'))
+        self.assertEqual(order.tax, Decimal('43.00'))
+        self.assertEqual(order.total, Decimal('473.00'))
+        self.assertEqual(order.items.count(), 3)
+
+    def test_oversized_orders_are_rejected(self):
+        response = self.checkout([{'product_id': self.products[0].id, 'quantity': 1001}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('items', response.data)
+        # Within the quantity limit, but the total would not fit the order's decimal fields
+        Product.objects.filter(pk=self.products[0].pk).update(price=Decimal('99999999.99'))
+        response = self.checkout([{'product_id': self.products[0].id, 'quantity': 2}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('items', response.data)
+        self.assertFalse(Order.objects.exists())
+
+    def test_unknown_product_creates_nothing(self):
+        response = self.checkout([{'product_id': self.products[0].id}, {'product_id': 999999}])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_coupon_discount_is_recorded_and_redeemed(self):
+        coupon = Coupon.objects.create(code='HALF', discount_type='percentage', value=Decimal('50'), max_uses=1)
+        response = self.client.post(reverse('order-create'), {
+            'items': [{'product_id': self.products[0].id}], 'coupon_code': 'HALF'
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(user=self.user)
+        self.assertEqual((order.subtotal, order.discount, order.tax, order.total),
+                         (Decimal('100.00'), Decimal('50.00'), Decimal('5.00'), Decimal('55.00')))
+        coupon.refresh_from_db()
+        self.assertEqual(coupon.used_count, 1)
+
+        response = self.client.post(reverse('order-create'), {
+            'items': [{'product_id': self.products[0].id}], 'coupon_code': 'HALF'
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('coupon_code', response.data)
+
+
+class PricingEngineTests(CacheIsolatedTestCase):
+    def setUp(self):
+        category = ProductCategory.objects.create(name='Crypto', slug='crypto')
+        self.product = create_product(category, index=1, price=Decimal('19.99'), sale_price=Decimal('14.99'))
+        self.bundle = ProductBundle.objects.create(name='Pro', price=Decimal('33.33'))
+        self.lines = [CartLine('product', self.product.id, 3), CartLine('bundle', self.bundle.id, 1)]
+
+    def test_prices_are_decimal_exact(self):
+        quote = price_cart(self.lines, 'USD')
+        self.assertEqual([line.subtotal for line in quote.lines], [Decimal('44.97'), Decimal('33.33')])
+        self.assertEqual(quote.subtotal, Decimal('78.30'))
+        self.assertEqual(quote.tax, Decimal('7.83'))
+        self.assertEqual(quote.total, Decimal('86.13'))
+
+    def test_tax_rule_is_chosen_by_currency(self):
+        register_tax_rule('IDR', PercentageTax('0.11'))
+        self.assertEqual(price_cart(self.lines, 'IDR').tax, Decimal('8.61'))
+
+    def test_fixed_coupon_only_applies_in_its_currency(self):
+        coupon = Coupon.objects.create(code='FIVE', discount_type='fixed', value=Decimal('5.00'), currency='USD')
+        self.assertEqual(price_cart(self.lines, 'USD', coupon).discount, Decimal('5.00'))
+        with self.assertRaises(CouponError):
+            price_cart(self.lines, 'EUR', coupon)
+
+    def test_unit_prices_are_cached_per_item_set(self):
+        price_cart(self.lines, 'USD')
+        with self.assertNumQueries(0):
+            price_cart(list(reversed(self.lines)), 'USD')
+
+    def test_price_changes_from_other_workers_reload_prices(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(CATALOG_VERSION_FILE=os.path.join(directory, 'catalog.version')):
+            self.assertEqual(price_cart(self.lines, 'USD').lines[0].unit_price, Decimal('14.99'))
+            # Saved by another worker: this worker's cache still holds the old version
+            Product.objects.filter(pk=self.product.pk).update(sale_price=Decimal('9.99'))
+            bump_catalog_version_file()
+            self.assertEqual(price_cart(self.lines, 'USD').lines[0].unit_price, Decimal('9.99'))
+
+
+class RatingAggregateTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = create_product(self.category, index=1)
+        self.users = [create_user(i) for i in range(3)]
+
+    def assertAggregates(self, count, average, histogram):
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.rating_count, count)
+        self.assertEqual(self.product.rating_average, Decimal(average))
+        self.assertEqual(self.product.rating_histogram, histogram)
+
+    def test_aggregates_follow_review_lifecycle(self):
+        review = ProductReview.objects.create(product=self.product, user=self.users[0], rating=4)
+        self.assertAggregates(0, '0', {1: 0, 2: 0, 3: 0, 4: 0, 5: 0})
+
+        review.is_approved = True
+        review.save()
+        ProductReview.objects.create(product=self.product, user=self.users[1], rating=5, is_approved=True)
+        self.assertAggregates(2, '4.50', {1: 0, 2: 0, 3: 0, 4: 1, 5: 1})
+
+        review = ProductReview.objects.get(pk=review.pk)
+        review.rating = 1
+        review.save()
+        self.assertAggregates(2, '3.00', {1: 1, 2: 0, 3: 0, 4: 0, 5: 1})
+
+        review.delete()
+        self.assertAggregates(1, '5.00', {1: 0, 2: 0, 3: 0, 4: 0, 5: 1})
+
+    def test_rebuild_matches_incremental_state(self):
+        for user, rating in zip(self.users, [2, 3, 3]):
+            ProductReview.objects.create(product=self.product, user=user, rating=rating, is_approved=True)
+        ProductReview.objects.filter(rating=2).update(is_approved=False)
+        url = reverse('product-detail', kwargs={'slug': self.product.slug})
+        self.assertEqual(self.client.get(url).data['rating_count'], 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(rebuild_ratings(), 1)
+        self.assertAggregates(2, '3.00', {1: 0, 2: 0, 3: 2, 4: 0, 5: 0})
+        # The cached response is replaced even though no post_save was sent
+        self.assertEqual(self.client.get(url).data['rating_count'], 2)
+
+    def test_tied_average_rounds_the_same_way_on_both_paths(self):
+        # 25 / 8 = 3.125 exactly: half-up gives 3.13 where half-even would give 3.12
+        for i, rating in enumerate([5, 5, 5, 3, 3, 2, 1, 1], start=10):
+            ProductReview.objects.create(product=self.product, user=create_user(i), rating=rating, is_approved=True)
+        self.assertAggregates(8, '3.13', {1: 2, 2: 1, 3: 2, 4: 0, 5: 3})
+        with self.captureOnCommitCallbacks(execute=True):
+            rebuild_ratings()
+        self.assertAggregates(8, '3.13', {1: 2, 2: 1, 3: 2, 4: 0, 5: 3})
+
+    def test_sort_by_rating_does_not_read_reviews(self):
+        best = create_product(self.category, index=2)
+        ProductReview.objects.create(product=best, user=self.users[0], rating=5, is_approved=True)
+        ProductReview.objects.create(product=self.product, user=self.users[0], rating=2, is_approved=True)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('product-list'), {'sort': 'rating'})
+        self.assertEqual([product['slug'] for product in response.data['results']], ['product-2', 'product-1'])
+        self.assertFalse(any('api_productreview' in query['sql'] for query in queries))
+
+
+class ProductReviewListTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = create_product(self.category, index=1)
+        users = [create_user(i) for i in range(12)]
+        for i, user in enumerate(users):
+            ProductReview.objects.create(
+                product=self.product, user=user, rating=1 + i % 5,
+                is_approved=i != 0, is_verified_purchase=i % 2 == 0
+            )
+        self.url = reverse('product-review-list', kwargs={'slug': self.product.slug})
+
+    def collect(self, params):
+        ids, url = [], self.url
+        while url:
+            response = self.client.get(url, params if url == self.url else None)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(review['id'] for review in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_pages_through_approved_reviews_newest_first(self):
+        expected = list(self.product.reviews.filter(is_approved=True).order_by('-created_at', '-id')
+                        .values_list('id', flat=True))
+        self.assertEqual(self.collect({'page_size': 5}), expected)
+
+    def test_sort_by_rating_and_verified_filter(self):
+        ids = self.collect({'page_size': 4, 'sort': 'rating', 'verified': 'true'})
+        reviews = ProductReview.objects.in_bulk(ids)
+        ratings = [reviews[i].rating for i in ids]
+        self.assertEqual(ratings, sorted(ratings, reverse=True))
+        self.assertTrue(all(reviews[i].is_verified_purchase and reviews[i].is_approved for i in ids))
+        self.assertEqual(len(ids), 5)
+
+    def test_product_detail_embeds_only_latest_reviews(self):
+        response = self.client.get(reverse('product-detail', kwargs={'slug': self.product.slug}))
+        self.assertEqual(len(response.data['reviews']), 3)
+        self.assertEqual(response.data['rating_count'], 11)
+
+
+class CategoryTreeTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.bots = ProductCategory.objects.create(name='Bots', slug='bots', parent=self.category, order_index=2)
+        self.signals = ProductCategory.objects.create(name='Signals', slug='signals', parent=self.category, order_index=1)
+        self.grid = ProductCategory.objects.create(name='Grid', slug='grid', parent=self.bots)
+        self.stocks = ProductCategory.objects.create(name='Stocks', slug='stocks')
+
+    def listed(self, slug):
+        response = self.client.get(reverse('product-list'), {'category': slug})
+        return {product['slug'] for product in response.data['results']}
+
+    def test_category_filter_matches_whole_subtree_in_one_query(self):
+        for i, category in enumerate([self.category, self.bots, self.grid, self.stocks]):
+            create_product(category, index=i)
+        catalog_snapshot.refresh()
+        with self.assertNumQueries(1):
+            self.client.get(reverse('product-list'), {'category': 'crypto'})
+        self.assertEqual(self.listed('crypto'), {'product-0', 'product-1', 'product-2'})
+        self.assertEqual(self.listed('bots'), {'product-1', 'product-2'})
+        self.assertEqual(self.listed('missing'), set())
+
+    def test_moving_a_category_repaths_its_descendants(self):
+        create_product(self.grid, index=1)
+        self.bots.parent = self.stocks
+        self.bots.save()
+        self.grid.refresh_from_db()
+        self.assertEqual(self.grid.depth, 2)
+        self.assertTrue(self.grid.path.startswith(self.stocks.path))
+        self.assertEqual(self.listed('crypto'), set())
+        self.assertEqual(self.listed('stocks'), {'product-1'})
+
+        self.category.parent = self.category
+        with self.assertRaises(ValueError):
+            self.category.save()
+
+    def test_category_list_is_nested_tree_from_snapshot(self):
+        self.stocks.order_index = -1
+        self.stocks.save()
+        catalog_snapshot.refresh()
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('category-list'))
+        self.assertEqual([node['slug'] for node in response.data], ['stocks', 'crypto'])
+        crypto = response.data[1]
+        self.assertEqual([node['slug'] for node in crypto['children']], ['signals', 'bots'])
+        self.assertEqual([node['slug'] for node in crypto['children'][1]['children']], ['grid'])
+
+    def test_rebuild_paths_restores_bulk_created_rows(self):
+        ProductCategory.objects.filter(pk=self.grid.pk).update(path='', depth=0)
+        ProductCategory.objects.rebuild_paths()
+        self.grid.refresh_from_db()
+        self.assertEqual(self.grid.path, self.bots.path + f'{self.grid.pk:010d}/')
+
+
+class CatalogSnapshotTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = create_product(self.category, index=1, is_featured=True)
+        ProductSubscriptionPlan.objects.create(
+            product=self.product, name='Monthly', price=Decimal('10.00'), billing_cycle='monthly', features=[]
+        )
+        ProductSubscriptionPlan.objects.create(
+            product=self.product, name='Legacy', price=Decimal('5.00'), billing_cycle='monthly',
+            features=[], is_active=False
+        )
+        catalog_snapshot.refresh()
+
+    def test_hot_catalog_reads_make_no_database_queries(self):
+        with self.assertNumQueries(0):
+            tree = self.client.get(reverse('category-list')).data
+            category = self.client.get(reverse('category-detail', kwargs={'slug': 'crypto'})).data
+            featured = self.client.get(reverse('product-list'), {'featured': 'true'}).data
+            missing = self.client.get(reverse('category-detail', kwargs={'slug': 'missing'}))
+        self.assertEqual([node['slug'] for node in tree], ['crypto'])
+        self.assertEqual(category['name'], 'Crypto')
+        self.assertEqual([product['slug'] for product in featured['results']], ['product-1'])
+        self.assertEqual(missing.status_code, 404)
+
+    def test_product_detail_embeds_active_plans_from_snapshot(self):
+        response = self.client.get(reverse('product-detail', kwargs={'slug': self.product.slug}))
+        self.assertEqual([plan['name'] for plan in response.data['subscription_plans']], ['Monthly'])
+
+    def test_version_bump_rebuilds_snapshot(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            create_product(self.category, index=2, is_featured=True)
+        response = self.client.get(reverse('product-list'), {'featured': 'true'})
+        self.assertEqual([product['slug'] for product in response.data['results']], ['product-2', 'product-1'])
+
+    def test_version_file_invalidates_without_shared_cache(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(CATALOG_VERSION_FILE=os.path.join(directory, 'catalog.version')):
+            first = catalog_snapshot.refresh()
+            self.assertIs(catalog_snapshot.get(), first)
+            # Another worker bumped the version: only the file is shared, not the cache
+            ProductCategory.objects.create(name='Stocks', slug='stocks')
+            bump_catalog_version_file()
+            tree = self.client.get(reverse('category-list')).data
+        self.assertEqual([node['slug'] for node in tree], ['crypto', 'stocks'])
+
+    def test_evicted_version_restarts_past_every_version_handed_out(self):
+        seen = {get_catalog_version()}
+        seen.update(bump_catalog_version() for _ in range(3))
+        cache.delete(CATALOG_VERSION_KEY)
+        self.assertGreater(bump_catalog_version(), max(seen))
+        seen.add(get_catalog_version())
+        cache.delete(CATALOG_VERSION_KEY)
+        self.assertGreater(get_catalog_version(), max(seen))
+
+    def test_version_file_counts_every_bump_and_never_fails_a_write(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(CATALOG_VERSION_FILE=os.path.join(directory, 'catalog.version')):
+                # However close together, two bumps never read the same
+                versions = {read_catalog_version_file()}
+                for _ in range(3):
+                    bump_catalog_version_file()
+                    versions.add(read_catalog_version_file())
+                self.assertEqual(versions, {None, 1, 2, 3})
+            # An unwritable file is logged; the committed save goes through
+            with override_settings(CATALOG_VERSION_FILE=os.path.join(directory, 'missing', 'catalog.version')), \
+                    self.assertLogs('api.cache', 'WARNING'), self.captureOnCommitCallbacks(execute=True):
+                ProductCategory.objects.create(name='Stocks', slug='stocks')
+
+
+@override_settings(ROOT_URLCONF='core.urls_async')
+class AsyncAPITests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = create_user()
+        self.products = [create_product(self.category, index=i, is_featured=i == 0) for i in range(25)]
+        order = Order.objects.create(user=self.user, order_number='ORD-ASYNC', subtotal=10, total=10)
+        order.items.create(product=self.products[0], quantity=1, price=10, subtotal=10)
+        self.auth = {'Authorization': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+        catalog_snapshot.refresh()
+
+    async def test_catalog_reads(self):
+        seen, url = [], reverse('product-list')
+        while url:
+            response = await self.async_client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(product['slug'] for product in response.json()['results'])
+            url = response.json()['next']
+        self.assertEqual(seen, [f'product-{i}' for i in reversed(range(25))])
+
+        response = await self.async_client.get(reverse('product-detail', kwargs={'slug': 'product-3'}))
+        self.assertEqual(response.json()['category_name'], 'Crypto')
+        response = await self.async_client.get(reverse('product-list'), {'featured': 'true'})
+        self.assertEqual([product['slug'] for product in response.json()['results']], ['product-0'])
+        response = await self.async_client.get(reverse('category-list'))
+        self.assertEqual([node['slug'] for node in response.json()], ['crypto'])
+        response = await self.async_client.get(reverse('category-list'), headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+        response = await self.async_client.get(reverse('product-detail', kwargs={'slug': 'missing'}))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_authenticated_reads(self):
+        response = await self.async_client.get(reverse('order-list'))
+        self.assertEqual(response.status_code, 401)
+        response = await self.async_client.get(reverse('order-list'), headers=self.auth)
+        self.assertEqual(response.json()['results'][0]['items'][0]['product_name'], 'Product 0')
+        response = await self.async_client.get(reverse('order-detail', kwargs={'order_number': 'ORD-ASYNC'}), headers=self.auth)
+        self.assertEqual(response.json()['total'], '10.00')
+        response = await self.async_client.get(reverse('user-profile'), headers=self.auth)
+        self.assertEqual(response.json()['email'], 'user0@example.com')
+
+    def test_writes_fall_through_to_sync_views(self):
+        response = self.client.patch(reverse('user-profile'), {'full_name': 'Renamed'}, format='json', headers=self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['full_name'], 'Renamed')
+        response = self.client.post(reverse('order-create'), {
+            'items': [{'product_id': self.products[1].id, 'quantity': 1}], 'payment_method': 'card'
+        }, format='json', headers=self.auth)
+        self.assertEqual(response.status_code, 201)
+
+
+@register_job('test_flaky')
+def flaky_job(fail):
+    if fail:
+        raise RuntimeError('upstream unavailable')
+
+
+def run_due_jobs():
+    worker = new_worker_id()
+    return [run_job(job.pk, worker) for job in claim(worker, 100)]
+
+
+class JobQueueTests(TestCase):
+    def test_job_enqueued_in_rolled_back_transaction_is_discarded(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                enqueue('test_flaky', fail=False)
+                raise RuntimeError
+        self.assertFalse(Job.objects.exists())
+
+    def test_failures_back_off_then_dead_letter(self):
+        job = enqueue('test_flaky', max_attempts=2, fail=True)
+        self.assertEqual(run_due_jobs(), ['queued'])
+        job.refresh_from_db()
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('upstream unavailable', job.last_error)
+        self.assertEqual(run_due_jobs(), [])
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        self.assertEqual(run_due_jobs(), ['dead'])
+        self.assertEqual(list(Job.objects.dead()), [job])
+
+        Job.objects.filter(pk=job.pk).update(payload={'fail': False})
+        call_command('dead_jobs', requeue=True, stdout=StringIO())
+        self.assertEqual(run_due_jobs(), ['done'])
+
+    def test_expired_lease_is_reclaimed(self):
+        job = enqueue('test_flaky', fail=False)
+        self.assertEqual(len(claim('crashed-worker', 10)), 1)
+        self.assertEqual(claim('other-worker', 10), [])
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(reclaim_expired(), 1)
+        self.assertEqual(run_due_jobs(), ['done'])
+
+    def test_renewed_lease_is_not_reclaimed(self):
+        job = enqueue('test_flaky', fail=False)
+        claim('busy-worker', 10)
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(renew_leases('other-worker'), 0)
+        self.assertEqual(renew_leases('busy-worker'), 1)
+        self.assertEqual(reclaim_expired(), 0)
+        self.assertEqual(Job.objects.get(pk=job.pk).locked_by, 'busy-worker')
+
+    def test_finished_jobs_are_purged_after_retention(self):
+        old = timezone.now() - timedelta(days=30)
+        stale_done = enqueue('test_flaky', fail=False)
+        stale_dead = enqueue('test_flaky', fail=True)
+        recent = enqueue('test_flaky', fail=False)
+        queued = enqueue('test_flaky', fail=False)
+        Job.objects.filter(pk=stale_done.pk).update(status='done', finished_at=old)
+        Job.objects.filter(pk=stale_dead.pk).update(status='dead', finished_at=old)
+        Job.objects.filter(pk=recent.pk).update(status='done', finished_at=timezone.now())
+        Job.objects.filter(pk=queued.pk).update(created_at=old)
+
+        self.assertEqual(purge_finished(retention_days=14, batch_size=1), 2)
+        self.assertEqual(set(Job.objects.values_list('pk', flat=True)), {recent.pk, queued.pk})
+
+    def test_paid_order_is_fulfilled_once(self):
+        user = create_user()
+        category = ProductCategory.objects.create(name='Crypto', slug='crypto')
+        bot = create_product(category, index=1, product_type='bot')
+        signal = create_product(category, index=2)
+        plan = ProductSubscriptionPlan.objects.create(
+            product=signal, name='Quarterly', price=Decimal('30.00'), billing_cycle='quarterly', features=[]
+        )
+        order = Order.objects.create(user=user, order_number='ORD-PAID', subtotal=10, total=10)
+        order.items.create(product=bot, quantity=2, price=5, subtotal=10)
+        order.items.create(product=signal, quantity=1, price=30, subtotal=30)
+        self.assertFalse(Job.objects.exists())
+
+        order.payment_status = 'paid'
+        order.save()
+        order.save()
+        self.assertEqual(Job.objects.filter(name='fulfil_order').count(), 1)
+        self.assertEqual(run_due_jobs(), ['done'])
+        self.assertEqual(run_due_jobs(), ['done'])
+
+        self.assertEqual(BotLicense.objects.filter(user=user, product=bot, status='active').count(), 2)
+        subscription = UserSubscription.objects.get(user=user)
+        self.assertEqual(subscription.subscription_plan, plan)
+        self.assertEqual(subscription.end_date, add_months(subscription.start_date, 3))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('ORD-PAID', mail.outbox[0].subject)
+
+        enqueue('fulfil_order', order_id=order.pk)
+        run_due_jobs()
+        self.assertEqual(BotLicense.objects.count(), 2)
+        self.assertEqual(Job.objects.filter(name='send_email').count(), 1)
+
+
+class JobWorkerCommandTests(TransactionTestCase):
+    def test_thread_pool_drains_queue(self):
+        for i in range(6):
+            enqueue('send_email', subject=f'Hello {i}', message='', recipient_list=['to@example.com'])
+        enqueue('test_flaky', max_attempts=1, fail=True)
+        out = StringIO()
+        call_command('run_workers', concurrency=3, once=True, stdout=out)
+        self.assertIn('1 dead, 6 done', out.getvalue())
+        self.assertEqual(len(mail.outbox), 6)
+
+
+class SubscriptionRenewalTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.user = create_user()
+        category = ProductCategory.objects.create(name='Crypto', slug='crypto')
+        self.bot = create_product(category, index=1, product_type='bot')
+        self.plan = ProductSubscriptionPlan.objects.create(
+            product=self.bot, name='Monthly', price=Decimal('20.00'), billing_cycle='monthly', features=[]
+        )
+
+    def subscribe(self, end_date, auto_renew=True, status='active'):
+        return UserSubscription.objects.create(
+            user=self.user, subscription_plan=self.plan, status=status, start_date=add_months(end_date, -1),
+            end_date=end_date, auto_renew=auto_renew, next_payment_date=end_date,
+        )
+
+    def process(self, batch_size=1000):
+        out = StringIO()
+        call_command('process_subscriptions', batch_size=batch_size, stdout=out)
+        return out.getvalue()
+
+    def test_due_subscriptions_are_renewed_and_ended_ones_expired(self):
+        due = self.subscribe(self.now - timedelta(days=1))
+        later = self.subscribe(self.now + timedelta(days=3))
+        ended = self.subscribe(self.now - timedelta(days=1), auto_renew=False)
+        cancelled = self.subscribe(self.now - timedelta(days=1), auto_renew=False, status='cancelled')
+        self.assertIn('Renewed 1 subscriptions with 1 new orders and expired 1', self.process())
+
+        order = Order.objects.get()
+        item = order.items.get()
+        self.assertEqual((order.user, order.payment_status, order.subtotal), (self.user, 'pending', Decimal('20.00')))
+        self.assertEqual(item.metadata['renews_subscription_id'], due.pk)
+        renewed = UserSubscription.objects.get(pk=due.pk)
+        self.assertEqual(renewed.next_payment_date, add_months(due.next_payment_date, 1))
+        self.assertEqual(renewed.end_date, add_months(due.end_date, 1))
+        self.assertEqual(UserSubscription.objects.get(pk=later.pk).next_payment_date, later.next_payment_date)
+        self.assertEqual(UserSubscription.objects.get(pk=ended.pk).status, 'expired')
+        self.assertEqual(UserSubscription.objects.get(pk=cancelled.pk).status, 'cancelled')
+
+        self.assertIn('Renewed 0 subscriptions with 0 new orders and expired 0', self.process())
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_renewal_moves_cached_entitlements_forward(self):
+        subscription = self.subscribe(self.now + timedelta(hours=1))
+        UserSubscription.objects.filter(pk=subscription.pk).update(next_payment_date=self.now - timedelta(minutes=1))
+        later = self.now + timedelta(hours=2)
+        self.assertFalse(has_access(self.user, self.bot, now=later))
+        with self.captureOnCommitCallbacks(execute=True):
+            renew_due(self.now)
+        self.assertTrue(has_access(self.user, self.bot, now=later))
+
+    def test_overdue_subscription_catches_up_one_cycle_per_order(self):
+        subscription = self.subscribe(add_months(self.now, -2) - timedelta(days=1))
+        for _ in range(3):
+            self.subscribe(self.now - timedelta(hours=1))
+        self.process(batch_size=2)
+        self.assertEqual(Order.objects.filter(order_number__startswith=f'RNW-{subscription.pk}-').count(), 3)
+        self.assertGreater(UserSubscription.objects.get(pk=subscription.pk).next_payment_date, self.now)
+        self.assertEqual(Order.objects.count(), 6)
+
+    def test_period_billed_before_an_interruption_is_not_billed_again(self):
+        subscription = self.subscribe(self.now - timedelta(days=1))
+        with transaction.atomic():
+            renew_due(self.now)
+            # The batch committed, but the run died before its dates were seen as moved
+            UserSubscription.objects.filter(pk=subscription.pk).update(
+                next_payment_date=subscription.next_payment_date, end_date=subscription.end_date
+            )
+        self.assertEqual(renew_due(self.now), (1, 0))
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertGreater(UserSubscription.objects.get(pk=subscription.pk).next_payment_date, self.now)
+
+    def test_failing_batches_are_retried_only_for_billing_conflicts(self):
+        subscription = self.subscribe(self.now - timedelta(days=1))
+        with mock.patch('api.subscriptions.renew_batch', side_effect=IntegrityError) as renew:
+            with self.assertRaises(IntegrityError):
+                renew_due(self.now)
+        self.assertEqual(renew.call_count, 1)
+
+        # An order for the period exists, but the batch keeps failing
+        Order.objects.create(user=self.user, order_number=renewal_order_number(subscription), subtotal=0, total=0)
+        with mock.patch('api.subscriptions.renew_batch', side_effect=IntegrityError) as renew:
+            with self.assertRaises(IntegrityError):
+                renew_due(self.now)
+        self.assertEqual(renew.call_count, RENEWAL_ATTEMPTS)
+
+    def test_paid_renewal_records_payment_without_new_subscription_or_license(self):
+        subscription = self.subscribe(self.now - timedelta(days=1))
+        self.process()
+        order = Order.objects.get()
+        order.payment_status = 'paid'
+        order.save()
+        self.assertEqual(run_due_jobs(), ['done'])
+
+        self.assertEqual(UserSubscription.objects.count(), 1)
+        self.assertFalse(BotLicense.objects.exists())
+        self.assertGreaterEqual(UserSubscription.objects.get(pk=subscription.pk).last_payment_date, self.now)
+
+
+@override_settings(ACTIVATION_LOG_BACKGROUND_FLUSH=False, LICENSE_TOKEN_PRIVATE_KEY=LICENSE_TOKEN_PRIVATE_KEY)
+class LicenseServiceTests(CacheIsolatedTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user()
+        category = ProductCategory.objects.create(name='Crypto', slug='crypto')
+        self.bot = create_product(category, index=1, product_type='bot')
+        self.other_bot = create_product(category, index=2, product_type='bot')
+        signal = create_product(category, index=3)
+        self.bundle = ProductBundle.objects.create(name='Starter', price=Decimal('150.00'))
+        self.bundle.products.add(self.other_bot, signal)
+
+    def tearDown(self):
+        activation_log.flush()
+        super().tearDown()
+
+    def create_license(self, **fields):
+        return BotLicense.objects.create(
+            user=self.user, product=self.bot, license_key=fields.pop('license_key', 'KEY-1'),
+            status=fields.pop('status', 'active'), **fields
+        )
+
+    def post(self, name, **data):
+        return self.client.post(reverse(name), data, format='json')
+
+    def test_bulk_issue_expands_bundles_and_skips_licensed_items(self):
+        order = Order.objects.create(user=self.user, order_number='ORD-1', status='completed', subtotal=0, total=0)
+        order.items.create(product=self.bot, quantity=2, price=0, subtotal=0)
+        order.items.create(product_bundle=self.bundle, quantity=1, price=0, subtotal=0)
+        pending = Order.objects.create(user=self.user, order_number='ORD-2', subtotal=0, total=0)
+        pending.items.create(product=self.bot, quantity=1, price=0, subtotal=0)
+
+        with self.assertNumQueries(3):
+            # items, bundle bots, insert
+            licenses = issue_licenses([order])
+        self.assertEqual(sorted(license.product_id for license in licenses), [self.bot.id] * 2 + [self.other_bot.id])
+        self.assertEqual(len({license.license_key for license in licenses}), 3)
+        self.assertEqual(issue_licenses([order]), [])
+
+        out = StringIO()
+        call_command('issue_licenses', stdout=out)
+        self.assertIn('Issued 0 licenses', out.getvalue())
+        self.assertEqual(BotLicense.objects.count(), 3)
+
+    def test_validation_is_served_from_cache_until_the_license_changes(self):
+        license = self.create_license(expiry_date=timezone.now() + timedelta(days=30))
+        response = self.post('license-validate', license_key='KEY-1')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['valid'])
+        self.assertEqual(response.data['product'], self.bot.slug)
+        self.post('license-validate', license_key='NO-SUCH-KEY')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.post('license-validate', license_key='KEY-1').status_code, 200)
+            self.assertEqual(self.post('license-validate', license_key='NO-SUCH-KEY').status_code, 404)
+
+        license.status = 'revoked'
+        with self.captureOnCommitCallbacks(execute=True):
+            license.save()
+        response = self.post('license-validate', license_key='KEY-1')
+        self.assertEqual((response.status_code, response.data['reason']), (403, 'revoked'))
+
+    def test_expiry_is_checked_against_cached_state(self):
+        now = timezone.now()
+        self.create_license(expiry_date=now + timedelta(minutes=1))
+        self.assertEqual(self.post('license-validate', license_key='KEY-1').status_code, 200)
+        # The cached state runs out while it is still cached, without a write to drop it
+        with mock.patch('api.licenses.timezone.now', return_value=now + timedelta(minutes=2)), \
+                self.assertNumQueries(0):
+            response = self.post('license-validate', license_key='KEY-1')
+        self.assertEqual((response.status_code, response.data['reason']), (403, 'expired'))
+
+    def test_expiry_sweep_expires_in_batches_and_drops_cached_state(self):
+        past, future = timezone.now() - timedelta(days=1), timezone.now() + timedelta(days=1)
+        for i in range(5):
+            self.create_license(license_key=f'KEY-{i}', expiry_date=past)
+        self.create_license(license_key='KEY-FUTURE', expiry_date=future)
+        self.create_license(license_key='KEY-FOREVER')
+        self.create_license(license_key='KEY-REVOKED', expiry_date=past, status='revoked')
+        self.assertEqual(get_license_state('KEY-0')['status'], 'active')
+
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('expire_licenses', batch_size=2, stdout=out)
+        self.assertIn('Expired 5 licenses in 3 batches', out.getvalue())
+        self.assertIn('UPDATE time per batch', out.getvalue())
+        self.assertEqual(
+            dict(BotLicense.objects.values_list('license_key', 'status')),
+            {**{f'KEY-{i}': 'expired' for i in range(5)}, 'KEY-FUTURE': 'active', 'KEY-FOREVER': 'active',
+             'KEY-REVOKED': 'revoked'}
+        )
+        self.assertEqual(get_license_state('KEY-0')['status'], 'expired')
+        self.assertFalse(LicenseRevocation.objects.exists())
+
+    def test_activations_never_exceed_the_limit(self):
+        self.create_license(activation_limit=2)
+        self.assertEqual(self.post('license-activate', license_key='KEY-1').status_code, 400)
+        for fingerprint in ['device-a', 'device-a', 'device-b']:
+            response = self.post('license-activate', license_key='KEY-1', fingerprint=fingerprint)
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['activation_count'], 2)
+
+        response = self.post('license-activate', license_key='KEY-1', fingerprint='device-c')
+        self.assertEqual((response.status_code, response.data['reason']), (409, 'limit_reached'))
+        self.assertFalse(BotLicenseActivation.objects.filter(fingerprint='device-c').exists())
+
+        response = self.post('license-deactivate', license_key='KEY-1', fingerprint='device-b')
+        self.assertEqual(response.data['activation_count'], 1)
+        self.assertEqual(self.post('license-deactivate', license_key='KEY-1', fingerprint='device-b').status_code, 404)
+        self.assertEqual(self.post('license-activate', license_key='KEY-1', fingerprint='device-c').status_code, 200)
+        self.assertEqual(BotLicense.objects.get().activation_count, 2)
+        activation_log.flush()
+        self.assertEqual(
+            list(BotDownloadActivationLog.objects.order_by('id').values_list('action_type', flat=True)),
+            ['activation_success'] * 2 + ['activation_failure', 'activation_success']
+        )
+
+    def test_activation_counter_is_the_guard(self):
+        # A seat taken by a concurrent request between the checks and the UPDATE
+        self.create_license(activation_limit=1, activation_count=1)
+        response = self.post('license-activate', license_key='KEY-1', fingerprint='device-a')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(BotLicense.objects.get().activation_count, 1)
+
+
+    def test_activated_device_gets_a_token_it_can_verify_offline(self):
+        self.create_license(activation_limit=1, expiry_date=timezone.now() + timedelta(days=30))
+        token = self.post('license-activate', license_key='KEY-1', fingerprint='device-a').data['token']
+        public_key = self.client.get(reverse('license-public-key')).data['public_key']
+        claims = verify_license_token(token, public_key, fingerprint='device-a')
+        self.assertEqual((claims['sub'], claims['prd']), ('KEY-1', self.bot.slug))
+        with self.assertRaises(jwt.InvalidTokenError):
+            verify_license_token(token, public_key, fingerprint='device-b')
+
+        self.assertEqual(self.post('license-token', license_key='KEY-1', fingerprint='device-a').status_code, 200)
+        response = self.post('license-token', license_key='KEY-1', fingerprint='device-b')
+        self.assertEqual((response.status_code, response.data['reason']), (403, 'not_activated'))
+
+    def test_revocation_feed_returns_deltas_after_cursor(self):
+        license = self.create_license(activation_limit=2)
+        self.post('license-activate', license_key='KEY-1', fingerprint='device-a')
+        feed = self.client.get(reverse('license-revocations')).data
+        self.assertEqual((feed['revocations'], feed['cursor']), ([], 0))
+        with self.assertNumQueries(0):
+            self.client.get(reverse('license-revocations'), {'since': feed['cursor']})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post('license-deactivate', license_key='KEY-1', fingerprint='device-a')
+        feed = self.client.get(reverse('license-revocations'), {'since': feed['cursor']}).data
+        self.assertEqual([row['digest'] for row in feed['revocations']], [revocation_digest('KEY-1', 'device-a')])
+        # Lower ids may still commit, so the cursor stays put until the entry is LICENSE_REVOCATION_LAG old
+        self.assertEqual(feed['cursor'], 0)
+
+        license.status = 'revoked'
+        with self.captureOnCommitCallbacks(execute=True):
+            license.save()
+        LicenseRevocation.objects.update(revoked_at=timezone.now() - timedelta(minutes=30))
+        delta = self.client.get(reverse('license-revocations'), {'since': feed['cursor']}).data
+        self.assertEqual(
+            [row['digest'] for row in delta['revocations']],
+            [revocation_digest('KEY-1', 'device-a'), revocation_digest('KEY-1')]
+        )
+        feed = self.client.get(reverse('license-revocations'), {'since': delta['cursor']}).data
+        self.assertEqual(feed['revocations'], [])
+
+        revoked = {row['digest']: row['revoked_at_us'] for row in delta['revocations']}
+        public_key = self.client.get(reverse('license-public-key')).data['public_key']
+        issued_before, _ = sign_license_token('KEY-1', self.bot.slug, 'device-b', now=timezone.now() - timedelta(hours=1))
+        issued_after, _ = sign_license_token('KEY-1', self.bot.slug, 'device-b')
+        with self.assertRaises(jwt.InvalidTokenError):
+            verify_license_token(issued_before, public_key, revoked=revoked)
+        verify_license_token(issued_after, public_key, revoked=revoked)
+
+    def test_token_minted_in_the_second_of_a_revocation_is_told_apart(self):
+        public_key = self.client.get(reverse('license-public-key')).data['public_key']
+        revoked_at = timezone.now().replace(microsecond=100000)
+        revoked = {revocation_digest('KEY-1'): timestamp_us(revoked_at)}
+        gap = timedelta(milliseconds=50)
+        before, _ = sign_license_token('KEY-1', self.bot.slug, 'device-a', now=revoked_at - gap)
+        reactivated, _ = sign_license_token('KEY-1', self.bot.slug, 'device-a', now=revoked_at + gap)
+        with self.assertRaises(jwt.InvalidTokenError):
+            verify_license_token(before, public_key, revoked=revoked)
+        self.assertEqual(verify_license_token(reactivated, public_key, revoked=revoked)['sub'], 'KEY-1')
+
+    def test_signing_key_must_be_configured_outside_debug(self):
+        with override_settings(LICENSE_TOKEN_PRIVATE_KEY=None):
+            with self.assertRaises(ImproperlyConfigured):
+                private_key()
+            with override_settings(DEBUG=True), self.assertLogs('api.license_tokens', 'WARNING'):
+                private_key()
+
+
+class EntitlementTests(CacheIsolatedTestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.user = create_user()
+        category = ProductCategory.objects.create(name='Crypto', slug='crypto')
+        self.bot = create_product(category, index=1, product_type='bot')
+        self.signal = create_product(category, index=2, product_type='signal')
+        self.course = create_product(category, index=3, product_type='course')
+        self.bundled_course = create_product(category, index=4, product_type='course')
+        self.bundled_bot = create_product(category, index=5, product_type='bot')
+        self.unbought = create_product(category, index=6, product_type='course')
+        self.bundle = ProductBundle.objects.create(name='Academy', price=Decimal('80.00'))
+        self.bundle.products.add(self.bundled_course, self.bundled_bot)
+
+        BotLicense.objects.create(user=self.user, product=self.bot, license_key='KEY-1', status='active')
+        BotLicense.objects.create(
+            user=self.user, product=self.bundled_bot, license_key='KEY-2', status='active',
+            expiry_date=self.now - timedelta(days=1)
+        )
+        plan = ProductSubscriptionPlan.objects.create(
+            product=self.signal, name='Monthly', price=Decimal('20.00'), billing_cycle='monthly', features=[]
+        )
+        self.subscription = UserSubscription.objects.create(
+            user=self.user, subscription_plan=plan, status='active', start_date=self.now,
+            end_date=self.now + timedelta(days=30),
+        )
+        order = Order.objects.create(user=self.user, order_number='ORD-1', status='completed', subtotal=0, total=0)
+        order.items.create(product=self.course, price=0, subtotal=0)
+        order.items.create(product_bundle=self.bundle, price=0, subtotal=0)
+        pending = Order.objects.create(user=self.user, order_number='ORD-2', subtotal=0, total=0)
+        pending.items.create(product=self.unbought, price=0, subtotal=0)
+
+    def test_entitlements_are_resolved_in_fixed_queries_and_cached(self):
+        with self.assertNumQueries(3):
+            entitlements = get_entitlements(self.user.pk)
+        self.assertEqual(set(entitlements), {self.bot.pk, self.signal.pk, self.course.pk, self.bundled_course.pk})
+        self.assertEqual(entitlements[self.signal.pk]['expires_at'], self.subscription.end_date)
+        self.assertEqual(entitlements[self.bundled_course.pk]['sources'], ['order'])
+        with self.assertNumQueries(0):
+            self.assertTrue(has_access(self.user, self.course))
+            self.assertFalse(has_access(self.user, self.unbought))
+            self.assertFalse(has_access(self.user.pk, self.bundled_bot.pk))
+            self.assertFalse(has_access(self.user, self.signal, now=self.now + timedelta(days=31)))
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        products = client.get(reverse('user-entitlements')).data['products']
+        self.assertEqual([product['slug'] for product in products], ['product-1', 'product-2', 'product-3', 'product-4'])
+        self.assertEqual(products[0]['sources'], ['license'])
+
+    def test_changes_to_sources_drop_cached_entitlements(self):
+        self.assertTrue(has_access(self.user, self.signal))
+        self.subscription.status = 'cancelled'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.subscription.save()
+        self.assertFalse(has_access(self.user, self.signal))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bundle.products.add(self.unbought)
+        self.assertTrue(has_access(self.user, self.unbought))
+
+        BotLicense.objects.filter(license_key='KEY-1').update(expiry_date=self.now - timedelta(minutes=1))
+        self.assertTrue(has_access(self.user, self.bot))
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('expire_licenses', stdout=StringIO())
+        self.assertFalse(has_access(self.user, self.bot))
+
+    def test_invalidations_reach_other_workers_through_the_version_file(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(ENTITLEMENT_VERSION_FILE=os.path.join(directory, 'entitlements.version')):
+            self.assertTrue(has_access(self.user, self.signal))
+            UserSubscription.objects.filter(pk=self.subscription.pk).update(status='cancelled')
+            # Another worker's invalidation deletes from its own per-process cache, not from this one
+            with mock.patch.object(cache, 'delete_many'):
+                invalidate_entitlements(self.user.pk)
+            self.assertFalse(has_access(self.user, self.signal))
+
+
+@override_settings(ROOT_URLCONF='core.urls_async', SIGNAL_HEARTBEAT_INTERVAL=0.05, SIGNAL_SUBSCRIBER_BUFFER=3)
+class SignalStreamTests(CacheIsolatedTestCase):
+    def setUp(self):
+        self.vendor = create_user(1)
+        self.subscriber = create_user(2)
+        self.outsider = create_user(3)
+        category = ProductCategory.objects.create(name='Crypto', slug='crypto')
+        self.product = create_product(category, vendor=self.vendor)
+        plan = ProductSubscriptionPlan.objects.create(
+            product=self.product, name='Monthly', price=Decimal('20.00'), billing_cycle='monthly', features=[]
+        )
+        self.subscription = UserSubscription.objects.create(
+            user=self.subscriber, subscription_plan=plan, status='active', start_date=timezone.now(),
+            end_date=timezone.now() + timedelta(days=30),
+        )
+        self.url = reverse('product-signal-list', kwargs={'slug': self.product.slug})
+        self.token = str(RefreshToken.for_user(self.subscriber).access_token)
+
+    def publish(self, **fields):
+        return Signal.objects.create(
+            product=self.product, vendor=self.vendor, asset_pair='BTC/USDT', side='buy', entry_price=Decimal('100'),
+            **fields
+        )
+
+    def test_vendor_publishes_and_subscribers_read(self):
+        client = APIClient()
+        client.force_authenticate(self.vendor)
+        signal = {'asset_pair': 'BTC/USDT', 'timeframe': '1h', 'side': 'buy', 'entry_price': '100', 'take_profit': '110'}
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = client.post(self.url, signal, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['product'], 'product-0')
+        self.assertEqual(callbacks, [signal_hub.notify])
+        response = client.post(self.url, {**signal, 'side': 'sell'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('take_profit', response.data)
+
+        client.force_authenticate(self.subscriber)
+        self.assertEqual(client.post(self.url, signal, format='json').status_code, 403)
+        response = client.get(self.url)
+        self.assertEqual([row['asset_pair'] for row in response.data['results']], ['BTC/USDT'])
+        client.force_authenticate(self.outsider)
+        self.assertEqual(client.get(self.url).status_code, 403)
+
+    async def test_server_sent_events_replay_then_deliver_live(self):
+        first = await sync_to_async(self.publish)()
+        url = reverse('signal-stream', kwargs={'slug': self.product.slug})
+        response = await self.async_client.get(url, {'token': str(RefreshToken.for_user(self.outsider).access_token)})
+        self.assertEqual(response.status_code, 403)
+
+        response = await self.async_client.get(url, {'token': self.token, 'last_id': first.pk - 1})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = aiter(response.streaming_content)
+        self.assertEqual(await anext(events), b'retry: 2000\n\n')
+        with override_settings(SIGNAL_STREAM_MAX_AGE=1):
+            replayed = await anext(events)
+        self.assertTrue(replayed.startswith(f'id: {first.pk}\nevent: signal\n'.encode()))
+        self.assertEqual(await anext(events), b': ping\n\n')
+
+        second = await sync_to_async(self.publish)(note='live')
+        signal_hub.notify()
+        frame = await anext(events)
+        while frame == b': ping\n\n':
+            frame = await anext(events)
+        self.assertEqual(json.loads(frame.split(b'data: ')[1])['id'], second.pk)
+        # Ends once SIGNAL_STREAM_MAX_AGE has passed, busy or not
+        self.assertEqual({chunk async for chunk in events}, {b': ping\n\n'})
+        self.assertEqual(signal_hub.channels, {})
+
+    async def test_websocket_delivery_and_slow_consumers(self):
+        received, sent = asyncio.Queue(), asyncio.Queue()
+
+        async def connect(query):
+            await received.put({'type': 'websocket.connect'})
+            scope = {'type': 'websocket', 'path': f'/ws/signals/{self.product.slug}/', 'query_string': query}
+            return asyncio.ensure_future(websocket_application(scope, received.get, sent.put))
+
+        await (await connect(b'token=invalid'))
+        self.assertEqual((await sent.get())['code'], 4401)
+
+        connection = await connect(f'token={self.token}'.encode())
+        self.assertEqual((await sent.get())['type'], 'websocket.accept')
+        # Without last_id, a connection gets what is published once it has joined
+        while self.product.pk not in signal_hub.channels:
+            await asyncio.sleep(0.01)
+        signal = await sync_to_async(self.publish)()
+        signal_hub.notify()
+        self.assertEqual(json.loads((await sent.get())['text'])['id'], signal.pk)
+        await received.put({'type': 'websocket.disconnect'})
+        await connection
+        self.assertEqual(signal_hub.channels, {})
+
+        with override_settings(SIGNAL_STREAM_MAX_AGE=0.1):
+            await received.put({'type': 'websocket.connect'})
+            scope = {'type': 'websocket', 'path': f'/ws/signals/{self.product.slug}/', 'query_string': b''}
+            scope['query_string'] = f'token={self.token}'.encode()
+            connection = asyncio.ensure_future(websocket_application(scope, received.get, sent.put))
+            self.assertEqual((await sent.get())['type'], 'websocket.accept')
+            self.assertEqual((await sent.get())['code'], 1013)
+            await received.put({'type': 'websocket.disconnect'})
+            await connection
+
+        subscriber = await signal_hub.subscribe(self.product.pk)
+        for _ in range(4):
+            await sync_to_async(self.publish)()
+        await signal_hub.poll()
+        with self.assertRaises(SlowConsumer):
+            await subscriber.next()
+        signal_hub.unsubscribe(subscriber)
+
+    async def test_busy_streams_end_when_access_is_lost(self):
+        frames = signal_frames(self.subscriber.pk, self.product.pk)
+        self.assertIsNone(await anext(frames))
+        await sync_to_async(UserSubscription.objects.filter(pk=self.subscription.pk).update)(status='cancelled')
+        await sync_to_async(invalidate_entitlements)(self.subscriber.pk)
+        # Signals arrive faster than the heartbeat, so no wait ever times out
+        with self.assertRaises(PermissionDenied):
+            for i in range(100):
+                signal_hub.publish(Frame(signal_hub.last_id + i + 1, self.product.pk, b'{}', b''))
+                frame = await anext(frames)
+                await asyncio.sleep(0.01)
+        self.assertEqual(signal_hub.channels, {})
+
+    async def test_signals_committed_out_of_order_are_delivered(self):
+        earlier, later = await sync_to_async(self.publish)(), await sync_to_async(self.publish)()
+        # A hub whose poller read `later` while `earlier` was still uncommitted
+        hub, subscriber = SignalHub(), Subscriber(self.product.pk, 10)
+        hub._loop, hub.channels[self.product.pk] = asyncio.get_running_loop(), {subscriber}
+        hub.settled_id, hub.last_id, hub.published = earlier.pk - 1, later.pk, {later.pk}
+        await hub.poll()
+        await hub.poll()
+        self.assertEqual((await subscriber.next(0)).id, earlier.pk)
+        self.assertIsNone(await subscriber.next(0))
+        with override_settings(SIGNAL_POLL_LAG=0):
+            await hub.poll()
+        self.assertEqual((hub.settled_id, hub.published), (later.pk, set()))
+
+        # A reconnect repeats the last few seconds below its last id
+        frames = signal_frames(self.subscriber.pk, self.product.pk, last_id=later.pk)
+        self.assertEqual([(await anext(frames)).id for _ in range(2)], [earlier.pk, later.pk])
+        await frames.aclose()
+        self.assertEqual(signal_hub.channels, {})
+
+
+class SignalHistoryTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.vendor = create_user(1)
+        category = ProductCategory.objects.create(name='Crypto', slug='crypto')
+        self.product = create_product(category, vendor=self.vendor)
+        self.detail = SignalDetail.objects.create(product=self.product, asset_pairs=['BTC/USDT'], timeframes=['1h'])
+
+    def publish(self, days_ago, asset_pair='BTC/USDT', side='buy', exit_price=None, cancel=False):
+        signal = Signal.objects.create(
+            product=self.product, asset_pair=asset_pair, timeframe='1h', side=side, entry_price=Decimal('100')
+        )
+        created_at = self.now - timedelta(days=days_ago)
+        Signal.objects.filter(pk=signal.pk).update(created_at=created_at)
+        signal.created_at = created_at
+        if exit_price is not None or cancel:
+            signal.close(exit_price, now=created_at + timedelta(hours=4))
+            signal.save()
+        return signal
+
+    def test_closing_signals_updates_track_record(self):
+        win, loss, cancelled = self.publish(1), self.publish(1, side='sell'), self.publish(1)
+        client = APIClient()
+        client.force_authenticate(create_user(2))
+        url = reverse('signal-close', kwargs={'slug': self.product.slug, 'pk': win.pk})
+        self.assertEqual(client.post(url, {'exit_price': '110'}).status_code, 403)
+
+        client.force_authenticate(self.vendor)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post(url, {'exit_price': '110'})
+            client.post(reverse('signal-close', kwargs={'slug': self.product.slug, 'pk': loss.pk}), {'exit_price': '104'})
+            client.post(reverse('signal-close', kwargs={'slug': self.product.slug, 'pk': cancelled.pk}))
+        self.assertEqual(response.data['status'], 'closed')
+        self.assertEqual(response.data['profit_percentage'], '10.0000')
+        self.assertEqual(client.post(url, {'exit_price': '120'}).status_code, 400)
+        self.detail.refresh_from_db()
+        # The cancelled signal counts for neither
+        self.assertEqual(self.detail.success_rate, Decimal('50.00'))
+        self.assertEqual(self.detail.average_profit_percentage, Decimal('3.00'))
+
+    def test_prices_must_be_positive(self):
+        client = APIClient()
+        client.force_authenticate(self.vendor)
+        url = reverse('product-signal-list', kwargs={'slug': self.product.slug})
+        signal = {'asset_pair': 'BTC/USDT', 'side': 'sell', 'entry_price': '0'}
+        response = client.post(url, signal, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('entry_price', response.data)
+        response = client.post(url, {**signal, 'entry_price': '100', 'take_profit': '-5'}, format='json')
+        self.assertIn('take_profit', response.data)
+
+        with self.assertRaises(ValueError):
+            Signal(product=self.product, side='buy', entry_price=Decimal('0')).close(Decimal('10'))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Signal.objects.create(product=self.product, asset_pair='BTC/USDT', side='buy', entry_price=Decimal('0'))
+
+    def test_compaction_moves_old_signals_into_columns(self):
+        old = [self.publish(days, exit_price=Decimal(price)) for days, price in [(200, '90'), (150, '120'), (100, '105')]]
+        self.publish(150, asset_pair='ETH/USDT', cancel=True)
+        still_open = self.publish(120)
+        recent = self.publish(10, exit_price=Decimal('101'))
+        performance = signal_performance(self.product)
+
+        call_command('compact_signal_history', keep_days=30, stdout=StringIO())
+        self.assertEqual(set(Signal.objects.values_list('id', flat=True)), {still_open.pk, recent.pk})
+        self.assertEqual(SignalHistoryChunk.objects.count(), 4)
+        self.assertEqual(signal_performance(self.product), performance)
+
+        with self.assertNumQueries(2):
+            series = signal_series(self.product, 'BTC/USDT', '1h', since=self.now - timedelta(days=160))
+        self.assertEqual(list(series['id']), [old[1].pk, still_open.pk, old[2].pk, recent.pk])
+        self.assertEqual(list(series['profit_percentage'][[0, 2, 3]]), [20.0, 5.0, 1.0])
+        self.assertTrue(np.isnat(series['closed_at'][1]))
+        self.assertEqual(series['status'][1], STATUSES['open'])
+        self.assertEqual(series['created_at'].dtype, np.dtype('datetime64[us]'))
+
+        series = signal_series(self.product)
+        self.assertEqual(len(series['id']), 6)
+        self.assertEqual(list(series['asset_pair']).count('ETH/USDT'), 1)
+
+
+@override_settings(
+    ACTIVATION_LOG_BACKGROUND_FLUSH=False, ACTIVATION_LOG_BATCH_SIZE=3, ACTIVATION_LOG_FLUSH_INTERVAL=3600
+)
+class ActivationLogTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        category = ProductCategory.objects.create(name='Crypto', slug='crypto')
+        bot = create_product(category, index=1, product_type='bot')
+        self.license = BotLicense.objects.create(user=self.user, product=bot, license_key='KEY-1', status='active')
+        self.writer = ActivationLogWriter()
+
+    def record(self, writer=None, action_type='download'):
+        (writer or self.writer).record(self.license.pk, self.user.pk, action_type, '10.0.0.1')
+
+    def test_events_are_written_in_batches(self):
+        self.record()
+        self.record()
+        self.assertFalse(BotDownloadActivationLog.objects.exists())
+        with self.assertNumQueries(1):
+            self.record()
+        self.assertEqual(BotDownloadActivationLog.objects.count(), 3)
+        self.assertEqual(self.writer.pending(), 0)
+
+    def test_spilled_events_survive_a_lost_buffer(self):
+        with tempfile.TemporaryDirectory() as spill_dir, self.settings(ACTIVATION_LOG_SPILL_DIR=spill_dir):
+            self.record()
+            self.record(action_type='activation_success')
+            self.assertEqual(len(os.listdir(spill_dir)), 1)
+            # The worker dies with both events still buffered
+            self.writer.discard()
+            self.assertEqual(replay_segments(older_than=0), 2)
+            self.assertEqual(os.listdir(spill_dir), [])
+            self.assertEqual(BotDownloadActivationLog.objects.count(), 2)
+
+            self.record()
+            self.assertEqual(self.writer.flush(), 1)
+            self.assertEqual(os.listdir(spill_dir), [])
+
+    def test_compaction_rolls_old_months_into_counts(self):
+        now = timezone.now()
+        old, older, recent = now - timedelta(days=200), now - timedelta(days=900), now - timedelta(days=1)
+        BotDownloadActivationLog.objects.bulk_create([
+            BotDownloadActivationLog(
+                bot_license=self.license, user=self.user, action_type=action, ip_address='', log_timestamp=timestamp
+            )
+            for timestamp, action in [
+                (old, 'download'), (old, 'download'), (old, 'activation_success'), (older, 'download'),
+                (recent, 'download'),
+            ]
+        ])
+        call_command('compact_activation_logs', keep_days=90, retain_months=0, batch_size=2, stdout=StringIO())
+        self.assertEqual(list(BotDownloadActivationLog.objects.values_list('log_timestamp', flat=True)), [recent])
+        counts = {
+            (summary.month, summary.action_type): summary.events for summary in BotActivationLogSummary.objects.all()
+        }
+        old_month = timezone.localtime(old).date().replace(day=1)
+        self.assertEqual(counts[(old_month, 'download')], 2)
+        self.assertEqual(counts[(old_month, 'activation_success')], 1)
+        self.assertEqual(len(counts), 3)
+
+        call_command('compact_activation_logs', keep_days=90, retain_months=24, stdout=StringIO())
+        self.assertEqual(BotActivationLogSummary.objects.count(), 2)
+        self.assertEqual(sum(BotActivationLogSummary.objects.values_list('events', flat=True)), 3)
+
+
+class BotFileTestCase(TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        settings_override = override_settings(
+            BOT_FILES_ROOT=self.root.name, BLOB_STORE_ROOT=os.path.join(self.root.name, 'blobs'),
+            ACTIVATION_LOG_BACKGROUND_FLUSH=False, ACTIVATION_LOG_FLUSH_INTERVAL=3600
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = create_user()
+        category = ProductCategory.objects.create(name='Crypto', slug='crypto')
+        bot = create_product(category, index=1, product_type='bot')
+        self.detail = BotDetail.objects.create(
+            product=bot, supported_exchanges=[], supported_assets=[], risk_level='low',
+            automation_type='fully_automated', version='1.0'
+        )
+        self.license = BotLicense.objects.create(user=self.user, product=bot, license_key='KEY-1', status='active')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        activation_log.discard()
+
+    def add_release(self, version, content):
+        os.makedirs(os.path.join(self.root.name, 'scalper'), exist_ok=True)
+        with open(os.path.join(self.root.name, 'scalper', f'scalper-{version}.zip'), 'wb') as f:
+            f.write(content)
+        return BotFile.objects.create(
+            bot_detail=self.detail, file_name=f'scalper-{version}.zip', file_path=f'scalper/scalper-{version}.zip',
+            file_size=0, file_type='application/zip', version=version
+        )
+
+    def fetch(self, url, **headers):
+        response = self.client.get(url, headers=headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+
+class BotFileDownloadTests(BotFileTestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = bytes(range(256)) * 40
+        self.file = self.add_release('1.0', self.content)
+        self.url = reverse('bot-file-download', args=[self.file.pk])
+
+    def download(self, **headers):
+        return self.fetch(self.url, **headers)
+
+    def test_full_download_streams_with_strong_etag(self):
+        self.file.refresh_from_db()
+        self.assertEqual(self.file.file_size, len(self.content))
+        response, body = self.download()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.content)
+        self.assertEqual(response['ETag'], f'"{hashlib.sha256(self.content).hexdigest()}"')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(self.download(If_None_Match=response['ETag'])[0].status_code, 304)
+
+    def test_ranges_resume_downloads(self):
+        etag = self.download()[0]['ETag']
+        response, body = self.download(Range='bytes=100-199', If_Range=etag)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.content[100:200])
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.content)}')
+        self.assertEqual(self.download(Range='bytes=-10')[1], self.content[-10:])
+
+        # The file changed since the client's first part: it gets the whole new file
+        self.assertEqual(self.download(Range='bytes=100-', If_Range='"stale"')[0].status_code, 200)
+        response, _ = self.download(Range=f'bytes={len(self.content)}-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, f'bytes */{len(self.content)}'))
+
+        # A file gone from disk is a 404, not a 206 with a broken body
+        os.unlink(os.path.join(self.root.name, 'scalper', 'scalper-1.0.zip'))
+        self.assertEqual(self.download(Range='bytes=100-199', If_Range=etag)[0].status_code, 404)
+        self.assertEqual(self.download()[0].status_code, 404)
+
+        # Only the requests starting at the first byte count as downloads
+        self.assertEqual(activation_log.flush(), 2)
+        self.assertEqual(BotDownloadActivationLog.objects.filter(bot_file=self.file, action_type='download').count(), 2)
+
+    def test_files_are_hashed_when_they_change_and_late_files_by_a_job(self):
+        with open(os.path.join(self.root.name, 'scalper', 'scalper-1.0.zip'), 'wb') as f:
+            f.write(b'replaced in place')
+        # Saves that leave file_path and blob alone do not read the file again
+        bot_file = BotFile.objects.get(pk=self.file.pk)
+        bot_file.version = '1.0.1'
+        bot_file.save()
+        self.assertEqual(bot_file.sha256, hashlib.sha256(self.content).hexdigest())
+
+        late = BotFile.objects.create(
+            bot_detail=self.detail, file_name='scalper-2.0.zip', file_path='scalper/scalper-2.0.zip',
+            file_size=0, file_type='application/zip', version='2.0'
+        )
+        self.assertEqual(late.sha256, '')
+        url = reverse('bot-file-download', args=[late.pk])
+        # Only licensed users get a file hashed
+        self.client.force_authenticate(create_user(1))
+        self.assertEqual(self.fetch(url)[0].status_code, 403)
+        self.assertFalse(Job.objects.filter(name='hash_bot_file').exists())
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.fetch(url)[0].status_code, 503)
+        self.assertEqual(self.fetch(url)[0].status_code, 503)
+        self.assertEqual(Job.objects.filter(name='hash_bot_file').count(), 1)
+        with open(os.path.join(self.root.name, 'scalper', 'scalper-2.0.zip'), 'wb') as f:
+            f.write(self.content)
+        run_due_jobs()
+        response, body = self.fetch(url)
+        self.assertEqual((response.status_code, body), (200, self.content))
+
+    def test_download_needs_a_usable_license(self):
+        BotLicense.objects.update(expiry_date=timezone.now() - timedelta(days=1))
+        self.assertEqual(self.download()[0].status_code, 403)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.download()[0].status_code, 401)
+
+    def test_accel_redirect_hands_transfer_to_nginx(self):
+        with self.settings(BOT_FILES_ACCEL_REDIRECT='/protected/bots/'):
+            response, body = self.download(Range='bytes=0-99')
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/bots/scalper/scalper-1.0.zip')
+        self.assertEqual(body, b'')
+        self.assertIn('ETag', response)
+
+        # Names are quoted, and held to BOT_FILES_ROOT as when Django sends the file
+        BotFile.objects.filter(pk=self.file.pk).update(file_path='scalper/../scalper/v1 ?%é.zip')
+        with self.settings(BOT_FILES_ACCEL_REDIRECT='/protected/bots/'):
+            response, _ = self.download()
+            self.assertEqual(response['X-Accel-Redirect'], '/protected/bots/scalper/v1%20%3F%25%C3%A9.zip')
+            BotFile.objects.filter(pk=self.file.pk).update(file_path='../outside.zip')
+            self.assertEqual(self.download()[0].status_code, 400)
+
+
+class BotFilePatchTests(BotFileTestCase):
+    def setUp(self):
+        super().setUp()
+        rng = random.Random(7)
+        self.releases = [rng.randbytes(64 * 1024)]
+        for _ in range(2):
+            data = bytearray(self.releases[-1])
+            offset = rng.randrange(len(data) - 512)
+            data[offset:offset + 512] = rng.randbytes(512)
+            self.releases.append(bytes(data))
+        self.files = [self.add_release(f'1.{i}', content) for i, content in enumerate(self.releases)]
+        run_due_jobs()
+
+    def test_patches_are_built_between_releases(self):
+        pairs = set(BotFilePatch.objects.values_list('source__version', 'target__version'))
+        self.assertEqual(pairs, {('1.0', '1.1'), ('1.0', '1.2'), ('1.1', '1.2')})
+        self.assertTrue(all(patch.file_size < 4096 for patch in BotFilePatch.objects.all()))
+        run_due_jobs()
+        self.assertEqual(BotFilePatch.objects.count(), 3)
+
+    def test_update_uses_cheapest_patches_and_they_apply(self):
+        data = self.client.get(reverse('bot-file-update', args=[self.files[2].pk]), {'from_version': '1.0'}).data
+        self.assertFalse(data['full_download'])
+        self.assertLess(data['download_size'], len(self.releases[2]) // 10)
+        self.assertEqual(data['patches'][0]['from_version'], '1.0')
+
+        content = self.releases[0]
+        for patch in data['patches']:
+            response, body = self.fetch(patch['download_url'])
+            self.assertEqual(response['ETag'], f'"{patch["sha256"]}"')
+            content = bsdiff4.patch(content, body)
+        self.assertEqual(hashlib.sha256(content).hexdigest(), data['sha256'])
+
+    def test_full_file_when_no_patch_is_cheaper(self):
+        unrelated = self.add_release('2.0', random.Random(8).randbytes(64 * 1024))
+        run_due_jobs()
+        data = self.client.get(reverse('bot-file-update', args=[unrelated.pk]), {'from_version': '1.2'}).data
+        self.assertEqual((data['full_download'], data['patches']), (True, []))
+        data = self.client.get(reverse('bot-file-update', args=[self.files[2].pk]), {'from_version': '0.9'}).data
+        self.assertTrue(data['full_download'])
+
+
+class BlobStoreTests(BotFileTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = create_user(index=1, is_staff=True)
+        self.content = random.Random(9).randbytes(200 * 1024)
+        self.sha256 = hashlib.sha256(self.content).hexdigest()
+
+    def upload_release(self, version, content=None):
+        self.client.force_authenticate(self.admin)
+        upload = SimpleUploadedFile(f'scalper-{version}.zip', content or self.content)
+        response = self.client.post(reverse('bot-file-upload'), {
+            'bot_detail': self.detail.pk, 'file': upload, 'file_type': 'application/zip', 'version': version,
+        }, format='multipart')
+        self.client.force_authenticate(self.user)
+        self.assertEqual(response.status_code, 201, response.data)
+        return BotFile.objects.get(pk=response.data['id'])
+
+    def gc(self, *args):
+        out = StringIO()
+        call_command('gc_blobs', *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_identical_uploads_are_stored_once(self):
+        first, second = self.upload_release('1.0'), self.upload_release('1.1')
+        response = self.client.post(reverse('user-kyc-documents'), {
+            'document_type': 'passport', 'file': SimpleUploadedFile('passport.zip', self.content),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+
+        self.assertEqual((first.blob_id, second.blob_id, first.sha256, first.file_size),
+                         (self.sha256, self.sha256, self.sha256, len(self.content)))
+        self.assertEqual(Blob.objects.get().refcount, 3)
+        self.assertEqual(self.user.kyc_documents.get().blob_id, self.sha256)
+        with open(blob_path(self.sha256), 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+        self.assertEqual(os.listdir(os.path.join(self.root.name, 'blobs', 'tmp')), [])
+
+        second.delete()
+        self.user.kyc_documents.get().delete()
+        self.assertEqual(Blob.objects.get().refcount, 1)
+
+    def test_blob_backed_release_downloads_and_patches(self):
+        release = self.upload_release('1.0')
+        response, body = self.fetch(reverse('bot-file-download', args=[release.pk]), Range='bytes=100-')
+        self.assertEqual((response.status_code, body), (206, self.content[100:]))
+        with self.settings(BLOB_STORE_ACCEL_REDIRECT='/internal/blobs/'):
+            response = self.client.get(reverse('bot-file-download', args=[release.pk]))
+        self.assertEqual(
+            response['X-Accel-Redirect'], f'/internal/blobs/{self.sha256[:2]}/{self.sha256[2:4]}/{self.sha256}'
+        )
+
+        changed = bytearray(self.content)
+        changed[1000:1100] = bytes(100)
+        self.upload_release('1.1', bytes(changed))
+        run_due_jobs()
+        patch = BotFilePatch.objects.get()
+        self.assertLess(patch.file_size, 4096)
+        self.assertTrue(os.path.isfile(os.path.join(self.root.name, patch.file_path)))
+
+    def test_gc_removes_unreferenced_blobs_and_stray_files(self):
+        kept = self.upload_release('1.0')
+        unreferenced = self.upload_release('1.1', b'old release')
+        unreferenced.delete()
+        fresh = self.upload_release('1.2', b'just released')
+        fresh.delete()
+        old = timezone.now() - timedelta(days=2)
+        Blob.objects.exclude(pk=fresh.blob_id).update(created_at=old)
+        stale = old.timestamp()
+        orphan = blob_path('ab' * 32)
+        orphan.parent.mkdir(parents=True)
+        orphan.write_bytes(b'no row')
+        partial = blob_path(self.sha256).parents[2] / 'tmp' / 'upload.part'
+        partial.write_bytes(b'interrupted')
+        for path in (orphan, partial, blob_path(unreferenced.blob_id)):
+            os.utime(path, (stale, stale))
+
+        self.assertIn('Would remove 1 unreferenced blobs, 1 orphan files and 1 partial uploads', self.gc('--dry-run'))
+        self.assertEqual(Blob.objects.count(), 3)
+        self.gc()
+        self.assertEqual(set(Blob.objects.values_list('pk', flat=True)), {kept.blob_id, fresh.blob_id})
+        self.assertFalse(blob_path(unreferenced.blob_id).exists())
+        self.assertFalse(orphan.exists() or partial.exists())
+        self.assertTrue(blob_path(kept.blob_id).exists() and blob_path(fresh.blob_id).exists())
+
+    def test_unreferenced_blob_reused_by_an_upload_is_kept(self):
+        self.upload_release('1.0').delete()
+        Blob.objects.update(created_at=timezone.now() - timedelta(days=2))
+        os.unlink(blob_path(self.sha256))
+        # The row outlived a collection that removed its file; the upload puts it back
+        release = self.upload_release('1.1')
+        self.gc()
+        self.assertEqual(Blob.objects.get().refcount, 1)
+        self.assertEqual(self.fetch(reverse('bot-file-download', args=[release.pk]))[1], self.content)
+
+    def test_reconcile_repairs_refcounts(self):
+        release = self.upload_release('1.0')
+        Blob.objects.update(refcount=0, created_at=timezone.now() - timedelta(days=2))
+        self.gc()
+        self.assertTrue(Blob.objects.filter(pk=release.blob_id).exists())
+        self.assertIn('Fixed 1 refcounts', self.gc('--reconcile'))
+        self.assertEqual(Blob.objects.get().refcount, 1)
+
+
+class QueryPlanAuditTests(TestCase):
+    def test_hot_querysets_avoid_full_scans(self):
+        # Raises CommandError naming any queryset whose plan scans a table
+        call_command('explain_queries', fixture_size=2000, stdout=StringIO())
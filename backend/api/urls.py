@@ -1,16 +1,32 @@
 from django.urls import path
 from api.views import (
-    ProductListView, ProductDetailView, 
+    ProductListView, ProductDetailView, ProductReviewListView, ProductSignalListView, SignalCloseView,
     CategoryListView, CategoryDetailView,
-    OrderCreateView, OrderListView, OrderDetailView
+    OrderCreateView, OrderListView, OrderDetailView,
+    LicenseValidateView, LicenseActivateView, LicenseDeactivateView, LicenseTokenView,
+    LicenseRevocationListView, LicensePublicKeyView, BotFileUploadView, BotFileDownloadView, BotFileUpdateView,
+    BotFilePatchDownloadView
 )
 
 urlpatterns = [
     path('products/', ProductListView.as_view(), name='product-list'),
     path('products/<slug:slug>/', ProductDetailView.as_view(), name='product-detail'),
+    path('products/<slug:slug>/reviews/', ProductReviewListView.as_view(), name='product-review-list'),
+    path('products/<slug:slug>/signals/', ProductSignalListView.as_view(), name='product-signal-list'),
+    path('products/<slug:slug>/signals/<int:pk>/close/', SignalCloseView.as_view(), name='signal-close'),
     path('categories/', CategoryListView.as_view(), name='category-list'),
     path('categories/<slug:slug>/', CategoryDetailView.as_view(), name='category-detail'),
     path('orders/', OrderListView.as_view(), name='order-list'),
     path('orders/create/', OrderCreateView.as_view(), name='order-create'),
     path('orders/<str:order_number>/', OrderDetailView.as_view(), name='order-detail'),
+    path('licenses/validate/', LicenseValidateView.as_view(), name='license-validate'),
+    path('licenses/activate/', LicenseActivateView.as_view(), name='license-activate'),
+    path('licenses/deactivate/', LicenseDeactivateView.as_view(), name='license-deactivate'),
+    path('licenses/token/', LicenseTokenView.as_view(), name='license-token'),
+    path('licenses/revocations/', LicenseRevocationListView.as_view(), name='license-revocations'),
+    path('licenses/public-key/', LicensePublicKeyView.as_view(), name='license-public-key'),
+    path('bot-files/', BotFileUploadView.as_view(), name='bot-file-upload'),
+    path('bot-files/<int:pk>/download/', BotFileDownloadView.as_view(), name='bot-file-download'),
+    path('bot-files/<int:pk>/update/', BotFileUpdateView.as_view(), name='bot-file-update'),
+    path('bot-file-patches/<int:pk>/download/', BotFilePatchDownloadView.as_view(), name='bot-file-patch-download'),
 ]
@@ -1,40 +1,99 @@
-from rest_framework import generics, permissions, status
+from rest_framework import exceptions, generics, permissions, status
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from api.models import (
-    ProductCategory, Product, ProductSubscriptionPlan, SignalDetail, BotDetail,
-    ProductReview, ProductBundle, Order, OrderItem, UserSubscription
+    ProductCategory, Product, ProductSubscriptionPlan, SignalDetail, Signal, BotDetail,
+    ProductReview, ProductBundle, Order, OrderItem, UserSubscription, BotFile, BotFilePatch
 )
 from api.serializers import (
-    ProductCategorySerializer, ProductSerializer, ProductBundleSerializer,
-    OrderSerializer, OrderCreateSerializer, UserSubscriptionSerializer
+    ProductCategorySerializer, ProductCategoryTreeSerializer, ProductSerializer, ProductListSerializer, ProductReviewSerializer,
+    ProductBundleSerializer, SignalSerializer, SignalCloseSerializer,
+    OrderSerializer, OrderCreateSerializer, UserSubscriptionSerializer,
+    LicenseRequestSerializer, LicenseStateSerializer, BotFilePatchSerializer, BotFileUploadSerializer
 )
+from api.activity_log import activation_log
+from api.blobs import BlobMultiPartParser
+from api.cache import CatalogCacheMixin
+from api.entitlements import has_access
+from api.downloads import download_license, file_response
+from api.jobs import enqueue
+from api.license_tokens import ALGORITHM as LICENSE_TOKEN_ALGORITHM, public_key_pem, timestamp_us
+from api.licenses import (
+    LicenseError, activate_license, deactivate_license, get_license_state, issue_license_token, revocations_since,
+    validate_license
+)
+from api.pagination import KeysetPagination
+from api.patches import plan_update
+from api.search import get_search_backend
+from api.signal_stream import signal_hub
+from api.snapshot import catalog_snapshot
+from django.core.cache import cache
+from django.db import transaction
+from django.http import Http404
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 
-class CategoryListView(generics.ListAPIView):
+class CategoryListView(CatalogCacheMixin, generics.ListAPIView):
     queryset = ProductCategory.objects.filter(is_active=True)
-    serializer_class = ProductCategorySerializer
+    serializer_class = ProductCategoryTreeSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = None
+    cache_response = False
+    
+    def list(self, request, *args, **kwargs):
+        # The whole active tree, nested, straight from the worker's snapshot
+        return Response(catalog_snapshot.get().category_tree)
 
 
-class CategoryDetailView(generics.RetrieveAPIView):
+class CategoryDetailView(CatalogCacheMixin, generics.RetrieveAPIView):
     queryset = ProductCategory.objects.filter(is_active=True)
     serializer_class = ProductCategorySerializer
     permission_classes = [permissions.AllowAny]
     lookup_field = 'slug'
+    cache_response = False
+    
+    def retrieve(self, request, *args, **kwargs):
+        category = catalog_snapshot.get().categories.get(self.kwargs['slug'])
+        if category is None:
+            raise Http404
+        return Response(category)
 
 
-class ProductListView(generics.ListAPIView):
-    serializer_class = ProductSerializer
+class ProductListView(CatalogCacheMixin, generics.ListAPIView):
+    serializer_class = ProductListSerializer
     permission_classes = [permissions.AllowAny]
     
+    @property
+    def pagination_class(self):
+        # Relevance and rating orderings have no stable (created_at, id) keyset
+        if self.request.query_params.get('search') or self.request.query_params.get('sort') == 'rating':
+            return PageNumberPagination
+        return KeysetPagination
+    
+    def list(self, request, *args, **kwargs):
+        page = self.snapshot_page(catalog_snapshot.get())
+        if page is not None:
+            return Response(page)
+        return super().list(request, *args, **kwargs)
+    
+    def snapshot_page(self, snapshot):
+        # The home page's featured strip fits on one page, so it comes from the snapshot
+        if dict(self.request.query_params) != {'featured': ['true']}:
+            return None
+        featured = snapshot.featured_products
+        if len(featured) > KeysetPagination.page_size:
+            return None
+        return {'next': None, 'previous': None, 'results': featured}
+    
     def get_queryset(self):
-        queryset = Product.objects.filter(is_active=True)
+        queryset = Product.objects.active().for_listing()
         
         # Filter by category
         category_slug = self.request.query_params.get('category', None)
         if category_slug:
-            queryset = queryset.filter(category__slug=category_slug)
+            # The category and everything below it, resolved inside the same query
+            queryset = queryset.filter(category__in=ProductCategory.objects.subtree(category_slug).values('id'))
         
         # Filter by product type
         product_type = self.request.query_params.get('type', None)
@@ -46,31 +105,119 @@ class ProductListView(generics.ListAPIView):
         if featured and featured.lower() == 'true':
             queryset = queryset.filter(is_featured=True)
         
-        # Search by name or description
+        # Full-text search over name and descriptions, best matches first
         search = self.request.query_params.get('search', None)
         if search:
-            queryset = queryset.filter(
-                models.Q(name__icontains=search) | 
-                models.Q(description__icontains=search) |
-                models.Q(short_description__icontains=search)
-            )
+            queryset = get_search_backend().search(queryset, search)
+        
+        # Sort by the precomputed rating aggregates
+        if self.request.query_params.get('sort') == 'rating':
+            queryset = queryset.order_by('-rating_average', '-rating_count', '-id')
         
         return queryset
 
 
-class ProductDetailView(generics.RetrieveAPIView):
-    queryset = Product.objects.filter(is_active=True)
+class ProductDetailView(CatalogCacheMixin, generics.RetrieveAPIView):
+    queryset = Product.objects.active().with_catalog_relations()
     serializer_class = ProductSerializer
     permission_classes = [permissions.AllowAny]
     lookup_field = 'slug'
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['subscription_plans'] = catalog_snapshot.get().plans
+        return context
+
+
+class ProductReviewListView(CatalogCacheMixin, generics.ListAPIView):
+    serializer_class = ProductReviewSerializer
+    permission_classes = [permissions.AllowAny]
+    pagination_class = KeysetPagination
+    orderings = {
+        'recent': ('-created_at', '-id'),
+        'rating': ('-rating', '-created_at', '-id'),
+        'rating_asc': ('rating', '-created_at', '-id'),
+    }
+    
+    @property
+    def keyset_ordering(self):
+        return self.orderings.get(self.request.query_params.get('sort'), self.orderings['recent'])
+    
+    def get_queryset(self):
+        product = get_object_or_404(Product.objects.active().only('id'), slug=self.kwargs['slug'])
+        queryset = ProductReview.objects.filter(product=product, is_approved=True).select_related('user')
+        
+        # Filter by verified purchase
+        verified = self.request.query_params.get('verified', None)
+        if verified and verified.lower() == 'true':
+            queryset = queryset.filter(is_verified_purchase=True)
+        
+        return queryset
+
+
+class SignalProductMixin:
+    """Looks up the signal product in the URL; its vendor and staff may publish to it."""
+    permission_classes = [permissions.IsAuthenticated]
+    publisher_required_message = 'Only the vendor of this product can publish signals.'
+    
+    def get_product(self):
+        if not hasattr(self, '_product'):
+            self._product = get_object_or_404(
+                Product.objects.filter(product_type='signal').only('id', 'slug', 'vendor_id'), slug=self.kwargs['slug']
+            )
+        return self._product
+    
+    def is_publisher(self, product):
+        return self.request.user.is_staff or product.vendor_id == self.request.user.pk
+
+
+class ProductSignalListView(SignalProductMixin, generics.ListCreateAPIView):
+    """
+    A signal product's published signals, newest first, for entitled users;
+    its vendor (or staff) publishes new ones here. Live delivery is
+    api.signal_stream's.
+    """
+    serializer_class = SignalSerializer
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-id',)
+    
+    def get_queryset(self):
+        product = self.get_product()
+        if not self.is_publisher(product) and not has_access(self.request.user, product):
+            raise exceptions.PermissionDenied('An active subscription to this product is required.')
+        return Signal.objects.filter(product=product).select_related('product')
+    
+    def perform_create(self, serializer):
+        product = self.get_product()
+        if not self.is_publisher(product):
+            raise exceptions.PermissionDenied(self.publisher_required_message)
+        serializer.save(product=product, vendor=self.request.user)
+        # Streams served by this process get it at once, other workers on their next poll
+        transaction.on_commit(signal_hub.notify)
+
+
+class SignalCloseView(SignalProductMixin, generics.GenericAPIView):
+    """The vendor closes a signal at its exit price, or cancels it; the product's track record follows."""
+    serializer_class = SignalCloseSerializer
+    
+    def post(self, request, slug, pk):
+        product = self.get_product()
+        if not self.is_publisher(product):
+            raise exceptions.PermissionDenied(self.publisher_required_message)
+        signal = get_object_or_404(Signal.objects.select_related('product'), product=product, pk=pk)
+        serializer = self.get_serializer(signal, data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(SignalSerializer(signal).data)
 
 
 class OrderListView(generics.ListAPIView):
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user).order_by('-created_at')
+        return Order.objects.filter(user=self.request.user).with_items().order_by('-created_at')
 
 
 class OrderDetailView(generics.RetrieveAPIView):
@@ -79,7 +226,7 @@ class OrderDetailView(generics.RetrieveAPIView):
     lookup_field = 'order_number'
     
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        return Order.objects.filter(user=self.request.user).with_items()
 
 
 class OrderCreateView(generics.CreateAPIView):
@@ -88,3 +235,206 @@ class OrderCreateView(generics.CreateAPIView):
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
+
+
+class LicenseView(APIView):
+    """
+    Base for the endpoints bots call with their license key. The key is the
+    credential, so no JWT authentication runs on these requests.
+    """
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+    fingerprint_required = False
+    error_statuses = {
+        'not_found': status.HTTP_404_NOT_FOUND,
+        'limit_reached': status.HTTP_409_CONFLICT,
+    }
+    
+    def post(self, request):
+        serializer = LicenseRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        if self.fingerprint_required and not data.get('fingerprint'):
+            return Response({'fingerprint': ['This field is required.']}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            return Response(self.perform(request, data))
+        except LicenseError as e:
+            return Response(
+                {'valid': False, 'reason': e.reason, 'detail': str(e)},
+                status=self.error_statuses.get(e.reason, status.HTTP_403_FORBIDDEN)
+            )
+    
+    def perform(self, request, data):
+        raise NotImplementedError
+    
+    def state_response(self, state):
+        return {'valid': True, **LicenseStateSerializer(state).data}
+    
+    def token_response(self, data):
+        token, expires_at = issue_license_token(data['license_key'], data['fingerprint'])
+        return {'token': token, 'token_expires_at': expires_at}
+
+
+class LicenseValidateView(LicenseView):
+    def perform(self, request, data):
+        return self.state_response(validate_license(data['license_key']))
+
+
+class LicenseActivateView(LicenseView):
+    fingerprint_required = True
+    
+    def perform(self, request, data):
+        state = activate_license(
+            data['license_key'], data['fingerprint'],
+            ip_address=request.META.get('REMOTE_ADDR', ''),
+            device_info=request.META.get('HTTP_USER_AGENT'),
+        )
+        return {**self.state_response(state), **self.token_response(data)}
+
+
+class LicenseDeactivateView(LicenseView):
+    fingerprint_required = True
+    
+    def perform(self, request, data):
+        if not deactivate_license(data['license_key'], data['fingerprint']):
+            raise LicenseError('not_found', 'This device holds no activation of the license.')
+        return self.state_response(get_license_state(data['license_key']))
+
+
+class LicenseTokenView(LicenseView):
+    """Fresh signed token for an activated device, fetched by bots before the old one expires."""
+    fingerprint_required = True
+    
+    def perform(self, request, data):
+        return self.token_response(data)
+
+
+class LicenseRevocationListView(APIView):
+    """
+    Revocation feed for offline token verification. Bots pass back the `cursor`
+    of their last fetch as `?since=` and get only what was revoked after it.
+    """
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+    
+    def get(self, request):
+        try:
+            since = max(int(request.query_params.get('since', 0)), 0)
+        except ValueError:
+            return Response({'since': ['A valid integer is required.']}, status=status.HTTP_400_BAD_REQUEST)
+        revocations, cursor, more = revocations_since(since)
+        return Response({
+            'revocations': [
+                {
+                    'digest': row['digest'], 'revoked_at': int(row['revoked_at'].timestamp()),
+                    'revoked_at_us': timestamp_us(row['revoked_at']),
+                }
+                for row in revocations
+            ],
+            'cursor': cursor,
+            'more': more,
+        })
+
+
+class LicensePublicKeyView(APIView):
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+    
+    def get(self, request):
+        return Response({'algorithm': LICENSE_TOKEN_ALGORITHM, 'public_key': public_key_pem()})
+
+
+class BotFileUploadView(generics.CreateAPIView):
+    """Admin upload of a bot release, streamed into the blob store so identical files are kept once."""
+    serializer_class = BotFileUploadSerializer
+    permission_classes = [permissions.IsAdminUser]
+    parser_classes = [BlobMultiPartParser]
+
+
+class FileNotReady(exceptions.APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'This file is still being prepared, try again shortly.'
+    default_code = 'file_not_ready'
+
+
+class BotFileAccessMixin:
+    """Looks up an active bot file and the requesting user's license for it."""
+    permission_classes = [permissions.IsAuthenticated]
+    license_required_message = 'An active license for this bot is required to download it.'
+    
+    def get_bot_file(self, pk):
+        return get_object_or_404(BotFile.objects.filter(is_active=True), pk=pk)
+    
+    def get_license(self, bot_file):
+        license = download_license(self.request.user, bot_file)
+        if license is None:
+            raise exceptions.PermissionDenied(self.license_required_message)
+        return license
+    
+    def check_hashed(self, bot_file):
+        """Call once the user's license is checked: files without a hash are hashed by a job."""
+        if not bot_file.sha256:
+            # Placed on disk after the row was saved; hashing it is a job, not a request's work
+            if cache.add(f'bot-file:hashing:{bot_file.pk}', True, 60):
+                enqueue('hash_bot_file', bot_file_id=bot_file.pk)
+            raise FileNotReady()
+    
+    def serve(self, request, download, bot_file, license):
+        try:
+            response, start = file_response(request, download)
+        except FileNotFoundError:
+            raise Http404
+        if start == 0 and request.method == 'GET':
+            activation_log.record(
+                license.pk, request.user.pk, 'download', request.META.get('REMOTE_ADDR', ''),
+                request.META.get('HTTP_USER_AGENT'), bot_file_id=bot_file.pk,
+            )
+        return response
+
+
+class BotFileDownloadView(BotFileAccessMixin, APIView):
+    """
+    Download of a bot release for users licensed for the bot. Supports Range and
+    If-Range for resuming; each download is logged once, on the request that
+    starts at the first byte.
+    """
+    def get(self, request, pk):
+        bot_file = self.get_bot_file(pk)
+        license = self.get_license(bot_file)
+        self.check_hashed(bot_file)
+        return self.serve(request, bot_file, bot_file, license)
+
+
+class BotFileUpdateView(BotFileAccessMixin, APIView):
+    """
+    How a client on `?from_version=` gets to this release: the cheapest chain of
+    patches, or the full file when that is smaller or no chain exists.
+    """
+    def get(self, request, pk):
+        target = self.get_bot_file(pk)
+        self.get_license(target)
+        self.check_hashed(target)
+        current = BotFile.objects.filter(
+            bot_detail_id=target.bot_detail_id, file_type=target.file_type, is_active=True,
+            version=request.query_params.get('from_version', ''),
+        ).order_by('-created_at', '-id').first()
+        patches = plan_update(current, target) if current is not None else None
+        data = {
+            'version': target.version,
+            'sha256': target.sha256,
+            'file_size': target.file_size,
+            'full_download': patches is None,
+            'download_url': request.build_absolute_uri(reverse('bot-file-download', args=[target.pk])),
+            'patches': BotFilePatchSerializer(patches or [], many=True, context={'request': request}).data,
+        }
+        data['download_size'] = target.file_size if patches is None else sum(patch.file_size for patch in patches)
+        return Response(data)
+
+
+class BotFilePatchDownloadView(BotFileAccessMixin, APIView):
+    def get(self, request, pk):
+        patch = get_object_or_404(
+            BotFilePatch.objects.select_related('source', 'target').filter(source__is_active=True, target__is_active=True),
+            pk=pk
+        )
+        return self.serve(request, patch, patch.target, self.get_license(patch.target))
@@ -12,5 +12,18 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+# Serve the read-heavy endpoints with async views (core.urls_async)
+os.environ.setdefault('DJANGO_ASYNC_API', '1')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up
+from api.signal_stream import websocket_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    # Django serves HTTP; WebSocket connections are live signal streams
+    if scope['type'] == 'websocket':
+        await websocket_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -3,6 +3,7 @@ Django settings for core project.
 """
 
 import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -46,7 +47,8 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'core.urls'
+# core.asgi sets DJANGO_ASYNC_API so uvicorn workers route reads to async views
+ROOT_URLCONF = 'core.urls_async' if os.environ.get('DJANGO_ASYNC_API') == '1' else 'core.urls'
 
 TEMPLATES = [
     {
@@ -93,6 +95,98 @@ DATABASES = {
 }
 """
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# locmem is per process, so multi-worker deployments should set REDIS_URL to
+# share catalog cache invalidation between workers.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sinyaltrading',
+    }
+}
+
+if os.environ.get('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+
+# Seconds a cached public catalog response is kept for a given catalog version
+CATALOG_CACHE_TIMEOUT = 300
+
+# Per-worker in-memory catalog snapshot (api.snapshot): how often each worker checks
+# the catalog version, and whether a stale snapshot is rebuilt off the request path.
+# Catalog writes also bump a counter in CATALOG_VERSION_FILE, which lets workers on one
+# host see each other's bumps with the per-process cache above; set it to '' to rely on
+# Redis alone. It lives in the temporary directory, which stays writable where the code is not.
+CATALOG_SNAPSHOT_CHECK_INTERVAL = 1.0
+CATALOG_SNAPSHOT_BACKGROUND_REBUILD = True
+CATALOG_VERSION_FILE = os.environ.get(
+    'CATALOG_VERSION_FILE', os.path.join(tempfile.gettempdir(), 'sinyaltrading-catalog.version')
+)
+
+# Checkout pricing: tax rate per order currency, and how long cached unit prices live
+PRICING_TAX_RATES = {
+    'USD': '0.10',
+}
+PRICING_DEFAULT_TAX_RATE = '0.10'
+PRICING_CACHE_TIMEOUT = 300
+
+# Seconds a bot license's state is cached for the validation endpoint (api.licenses);
+# license writes made through the service invalidate it immediately. The revocation feed's
+# cursor stays behind entries younger than LICENSE_REVOCATION_LAG seconds, which may still
+# be joined by lower ids committing late
+LICENSE_CACHE_TIMEOUT = 30
+LICENSE_REVOCATION_LAG = 30
+
+# Seconds a user's entitlements (api.entitlements) are cached; changes to their orders,
+# subscriptions and licenses drop the entry at once. Without Redis, those changes also bump
+# a counter in ENTITLEMENT_VERSION_FILE so the other workers on the host drop theirs
+ENTITLEMENT_CACHE_TIMEOUT = 300
+ENTITLEMENT_VERSION_FILE = os.environ.get('ENTITLEMENT_VERSION_FILE', '' if os.environ.get('REDIS_URL') else (
+    os.path.join(tempfile.gettempdir(), 'sinyaltrading-entitlements.version')
+))
+
+# Live signal streams (api.signal_stream): seconds between each worker's polls for new
+# signals, frames a connection may fall behind before it is dropped, signals replayed
+# per query on reconnect, seconds between access re-checks (and keep-alives), and seconds
+# an SSE or WebSocket connection stays open before the client is made to reconnect.
+# Signals committed up to SIGNAL_POLL_LAG seconds after a higher id was polled are still delivered
+SIGNAL_POLL_INTERVAL = 0.5
+SIGNAL_POLL_LAG = 5
+SIGNAL_SUBSCRIBER_BUFFER = 100
+SIGNAL_REPLAY_LIMIT = 500
+SIGNAL_HEARTBEAT_INTERVAL = 15
+SIGNAL_STREAM_MAX_AGE = 300
+
+# Signed license tokens bots verify offline (api.license_tokens): a PEM Ed25519 private
+# key, required unless DEBUG (which derives one from SECRET_KEY), and how long a token is
+# valid in seconds.
+# The lifetime bounds how long a revoked license keeps working on a bot that stops
+# polling the revocation feed.
+LICENSE_TOKEN_PRIVATE_KEY = os.environ.get('LICENSE_TOKEN_PRIVATE_KEY')
+LICENSE_TOKEN_LIFETIME = 7 * 24 * 3600
+
+# Bot download/activation log (api.activity_log): events are buffered per worker and
+# bulk inserted once BATCH_SIZE are waiting or the oldest is FLUSH_INTERVAL seconds old.
+# With a SPILL_DIR, buffered events are also appended to files there and survive a crash.
+ACTIVATION_LOG_BATCH_SIZE = 500
+ACTIVATION_LOG_FLUSH_INTERVAL = 2.0
+ACTIVATION_LOG_BACKGROUND_FLUSH = True
+ACTIVATION_LOG_SPILL_DIR = os.environ.get('ACTIVATION_LOG_SPILL_DIR')
+
+# Background jobs (api.jobs, run by `manage.py run_workers`): attempts before a job is
+# dead-lettered, exponential retry backoff in seconds, how long a job's lease lasts
+# without its worker renewing it (running workers renew theirs every quarter lease), and
+# days finished jobs are kept
+JOBS_MAX_ATTEMPTS = 5
+JOBS_RETRY_BACKOFF = 30
+JOBS_RETRY_BACKOFF_MAX = 3600
+JOBS_LEASE_SECONDS = 600
+JOBS_RETENTION_DAYS = 14
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -111,6 +205,10 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# MySQL skips partial indexes (models.W037); every partial index in this project
+# has a composite fallback covering the same lookups.
+SILENCED_SYSTEM_CHECKS = ['models.W037']
+
 # Custom user model
 AUTH_USER_MODEL = 'users.User'
 
@@ -134,6 +232,21 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = 'media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Bot downloads (api.downloads): BotFile.file_path is relative to BOT_FILES_ROOT. Set
+# BOT_FILES_ACCEL_REDIRECT to an nginx `internal` location aliasing that directory to
+# have nginx send the bytes instead of a gunicorn worker.
+BOT_FILES_ROOT = os.environ.get('BOT_FILES_ROOT', os.path.join(MEDIA_ROOT, 'bots'))
+BOT_FILES_ACCEL_REDIRECT = os.environ.get('BOT_FILES_ACCEL_REDIRECT')
+
+# Content-addressed uploads (api.blobs): stored once per SHA-256 under BLOB_STORE_ROOT.
+# BLOB_STORE_ACCEL_REDIRECT is the nginx `internal` location aliasing that directory.
+BLOB_STORE_ROOT = os.environ.get('BLOB_STORE_ROOT', os.path.join(MEDIA_ROOT, 'blobs'))
+BLOB_STORE_ACCEL_REDIRECT = os.environ.get('BLOB_STORE_ACCEL_REDIRECT')
+BLOB_MAX_UPLOAD_SIZE = 2 ** 30
+
+# Delta updates (api.patches): each release gets a patch from this many previous releases
+BOT_FILE_PATCH_HISTORY = 5
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,42 @@
+"""
+URLconf for the ASGI deployment (core.asgi). Same routes and names as core.urls,
+with the read-heavy endpoints served by async views, plus the live signal stream.
+"""
+from django.urls import URLPattern, URLResolver, include, path
+
+from api.async_views import (
+    AsyncCategoryListView, AsyncCategoryDetailView, AsyncProductListView, AsyncProductDetailView,
+    AsyncOrderListView, AsyncOrderDetailView, SignalStreamView
+)
+from core import urls
+from users.async_views import AsyncUserProfileView
+
+ASYNC_VIEWS = {
+    'category-list': AsyncCategoryListView,
+    'category-detail': AsyncCategoryDetailView,
+    'product-list': AsyncProductListView,
+    'product-detail': AsyncProductDetailView,
+    'order-list': AsyncOrderListView,
+    'order-detail': AsyncOrderDetailView,
+    'user-profile': AsyncUserProfileView,
+}
+
+
+def with_async_views(patterns):
+    # Swap views by URL name in place, so route order (e.g. orders/create/ before
+    # orders/<order_number>/) is exactly that of the sync URLconf
+    swapped = []
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            swapped.append(path(str(pattern.pattern), include(with_async_views(pattern.url_patterns))))
+        elif isinstance(pattern, URLPattern) and pattern.name in ASYNC_VIEWS:
+            swapped.append(path(str(pattern.pattern), ASYNC_VIEWS[pattern.name].as_view(), name=pattern.name))
+        else:
+            swapped.append(pattern)
+    return swapped
+
+
+urlpatterns = with_async_views(urls.urlpatterns) + [
+    # Held open for as long as the client listens, which only an async worker can afford
+    path('api/signals/<slug:slug>/stream/', SignalStreamView.as_view(), name='signal-stream'),
+]
@@ -0,0 +1,6 @@
+# ASGI deployment: gunicorn -c gunicorn_asgi_config.py core.asgi:application
+# Same process layout as gunicorn_config.py, with uvicorn workers running the
+# async views (core.urls_async) on an event loop instead of one request per worker.
+from gunicorn_config import *  # noqa: F401,F403
+
+worker_class = 'uvicorn.workers.UvicornWorker'
@@ -4,3 +4,15 @@ timeout = 120
 accesslog = '/var/log/gunicorn/access.log'
 errorlog = '/var/log/gunicorn/error.log'
 capture_output = True
+
+
+def post_worker_init(worker):
+    # Build this worker's catalog snapshot before it accepts requests
+    from api.snapshot import catalog_snapshot
+    catalog_snapshot.get()
+
+
+def worker_exit(server, worker):
+    # Write out buffered activation log events before the worker goes away
+    from api.activity_log import activation_log
+    activation_log.flush()
@@ -0,0 +1,11 @@
+from api.async_views import AsyncAPIView
+from users.views import UserProfileView
+
+
+class AsyncUserProfileView(AsyncAPIView):
+    # Reads are async; PUT/PATCH go to the DRF view
+    sync_view = UserProfileView
+    authenticated = True
+
+    async def get(self, request, *args, **kwargs):
+        return self.sync_view_for(request).get_serializer(request.user).data
@@ -126,12 +126,20 @@ class UserKYCDocument(models.Model):
     document_type = models.CharField(max_length=100)
     document_number = models.CharField(max_length=100, blank=True, null=True)
     file_path = models.CharField(max_length=255)
+    blob = models.ForeignKey('api.Blob', on_delete=models.PROTECT, blank=True, null=True, related_name='kyc_documents')
     verification_status = models.CharField(max_length=20, choices=VERIFICATION_STATUS_CHOICES, default='pending')
     admin_notes = models.TextField(blank=True, null=True)
     submitted_at = models.DateTimeField(auto_now_add=True)
     verified_at = models.DateTimeField(blank=True, null=True)
     verified_by_admin = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='verified_documents')
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'blob_id' in field_names:
+            instance._saved_blob_id = instance.blob_id
+        return instance
+    
     def __str__(self):
         return f"{self.user.email} - {self.document_type}"
 
@@ -1,5 +1,7 @@
+from django.db import transaction
 from rest_framework import serializers
-from users.models import User
+from users.models import User, UserKYCDocument
+from api.blobs import blob_name, store_upload
 from django.contrib.auth.password_validation import validate_password
 
 class UserSerializer(serializers.ModelSerializer):
@@ -64,3 +66,18 @@ class ForgotPasswordSerializer(serializers.Serializer):
         if not User.objects.filter(email=value).exists():
             raise serializers.ValidationError("No user found with this email address.")
         return value
+
+
+class KYCDocumentSerializer(serializers.ModelSerializer):
+    file = serializers.FileField(write_only=True)
+    
+    class Meta:
+        model = UserKYCDocument
+        fields = ['id', 'document_type', 'document_number', 'file', 'verification_status', 'submitted_at']
+        read_only_fields = ['verification_status', 'submitted_at']
+    
+    def create(self, validated_data):
+        # The blob stays locked until the reference to it is counted
+        with transaction.atomic():
+            blob = store_upload(validated_data.pop('file'))
+            return UserKYCDocument.objects.create(blob=blob, file_path=blob_name(blob.sha256), **validated_data)
@@ -1,3 +1,28 @@
+from django.core import mail
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from api.jobs import claim, run_job
+from api.models import Job
+from users.models import User
+
+
+class ForgotPasswordTests(TestCase):
+    def test_reset_email_is_queued_not_sent_in_request(self):
+        user = User.objects.create_user(
+            email='trader@example.com', username='trader', full_name='Trader', password=None
+        )
+        response = APIClient().post(reverse('user-forgot-password'), {'email': 'trader@example.com'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(mail.outbox), 0)
+
+        # Only the user is stored; the reset link is made when the mail is sent
+        job = Job.objects.get(name='send_password_reset')
+        self.assertEqual(job.payload, {'user_id': user.pk})
+        self.assertEqual([run_job(job.pk, 'worker') for job in claim('worker', 10)], ['done'])
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['trader@example.com'])
+        self.assertIn('reset-password?token=', mail.outbox[0].body)
+        job.refresh_from_db()
+        self.assertNotIn('token', str(job.payload))
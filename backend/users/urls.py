@@ -1,5 +1,8 @@
 from django.urls import path
-from users.views import UserRegistrationView, UserLoginView, UserProfileView, UserPasswordChangeView, ForgotPasswordView
+from users.views import (
+    UserRegistrationView, UserLoginView, UserProfileView, UserPasswordChangeView, ForgotPasswordView,
+    EntitlementListView, KYCDocumentListView
+)
 
 urlpatterns = [
     path('register/', UserRegistrationView.as_view(), name='user-register'),
@@ -7,4 +10,6 @@ urlpatterns = [
     path('profile/', UserProfileView.as_view(), name='user-profile'),
     path('change-password/', UserPasswordChangeView.as_view(), name='user-change-password'),
     path('forgot-password/', ForgotPasswordView.as_view(), name='user-forgot-password'),
+    path('entitlements/', EntitlementListView.as_view(), name='user-entitlements'),
+    path('kyc-documents/', KYCDocumentListView.as_view(), name='user-kyc-documents'),
 ]
@@ -5,11 +5,12 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
-from django.core.mail import send_mail
-from django.conf import settings
-from django.utils.crypto import get_random_string
 from users.models import User
-from users.serializers import UserSerializer, UserRegistrationSerializer, UserLoginSerializer, PasswordChangeSerializer, ForgotPasswordSerializer
+from api.blobs import BlobMultiPartParser
+from api.entitlements import get_entitlements
+from api.serializers import EntitlementSerializer
+from api.jobs import enqueue
+from users.serializers import UserSerializer, UserRegistrationSerializer, UserLoginSerializer, PasswordChangeSerializer, ForgotPasswordSerializer, KYCDocumentSerializer
 
 @method_decorator(csrf_exempt, name='dispatch')
 class UserRegistrationView(generics.CreateAPIView):
@@ -68,6 +69,27 @@ class UserPasswordChangeView(APIView):
             return Response({'message': 'Password changed successfully'}, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+class EntitlementListView(APIView):
+    """Products the user can use right now, with what grants each and until when."""
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request):
+        entitlements = sorted(get_entitlements(request.user.pk).values(), key=lambda entry: entry['product_id'])
+        return Response({'products': EntitlementSerializer(entitlements, many=True).data})
+
+class KYCDocumentListView(generics.ListCreateAPIView):
+    """The user's KYC documents; uploads go to the blob store, so a re-submitted file is stored once."""
+    serializer_class = KYCDocumentSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [BlobMultiPartParser]
+    pagination_class = None
+    
+    def get_queryset(self):
+        return self.request.user.kyc_documents.order_by('-submitted_at')
+    
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
 @method_decorator(csrf_exempt, name='dispatch')
 class ForgotPasswordView(APIView):
     permission_classes = [permissions.AllowAny]
@@ -79,31 +101,12 @@ class ForgotPasswordView(APIView):
             try:
                 user = User.objects.get(email=email)
                 
-                # Generate a random token
-                token = get_random_string(length=32)
-                
-                # In a real application, you would save this token to the database
-                # and associate it with the user, with an expiration time
-                # For this demo, we'll just simulate sending an email
-                
-                reset_link = f"https://pyscalp.com/reset-password?token={token}"
+                # Sent by a background worker, so SMTP latency and failures stay out of the request.
+                # The worker makes the reset link, which keeps it out of the stored job payload.
+                # In a real application, the token would be saved and associated with the user,
+                # with an expiration time; for this demo, we just simulate sending an email
+                enqueue('send_password_reset', user_id=user.pk)
                 
-                # Send email with reset link
-                try:
-                    send_mail(
-                        'Password Reset Request',
-                        f'Click the following link to reset your password: {reset_link}',
-                        settings.DEFAULT_FROM_EMAIL,
-                        [email],
-                        fail_silently=False,
-                    )
-                    return Response({'message': 'Password reset link has been sent to your email'}, status=status.HTTP_200_OK)
-                except Exception as e:
-                    # For demo purposes, we'll return success even if email sending fails
-                    # In a real application, you might want to handle this differently
-                    print(f"Email sending failed: {str(e)}")
-                    return Response({'message': 'Password reset link has been sent to your email'}, status=status.HTTP_200_OK)
-                    
             except User.DoesNotExist:
                 # We don't want to reveal if a user exists or not for security reasons
                 pass